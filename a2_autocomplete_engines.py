@@ -12,22 +12,202 @@ As usual, be sure not to change any parts of the given *public interface* in the
 starter code---and this includes the instance attributes, which we will be
 testing directly! You may, however, add new private attributes, methods, and
 top-level functions to this file.
+
+The modules that only some engines need are imported when they are first
+used, so that a process that only uses the text engines starts quickly:
+a2_melody (and the audio stack behind it) by the MelodyAutocompleteEngine,
+csv by the engines that read CSV files, concurrent.futures by reading with
+several workers, a2_snapshot and a2_frozen_tree by save and load, and
+a2_dawg, a2_cache, a2_vocabulary and a2_word_index by the config keys that
+ask for them. The annotations that mention their classes are strings that
+a2_validation resolves when it first checks them. (python_ta is likewise
+only imported by a2_validation when a contract is first checked.)
 """
 from __future__ import annotations
-import csv
 import time
-from typing import Any
-from python_ta.contracts import check_contracts
+from collections import deque
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Sequence, TextIO
 
-from a2_melody import Melody
+from a2_autocompleter import PrefixCursor
 from a2_prefix_tree import Autocompleter, SimplePrefixTree, CompressedPrefixTree
+from a2_validation import check_contracts, check_level
+
+
+################################################################################
+# Behaviour shared by all engines
+################################################################################
+@check_contracts
+class _AutocompleteEngine:
+    """An autocomplete engine, which answers queries using an Autocompleter.
+
+    Instance Attributes:
+    - autocompleter: An Autocompleter used by this engine.
+    - result_cache: The cache of this engine's autocomplete results, or None
+      if results are not cached. Values inserted into or removed from
+      self.autocompleter directly (rather than through this engine) are not
+      seen by the cache.
+    - vocabulary: The vocabulary that interns the elements of this engine's
+      prefix sequences, or None if self.autocompleter is given the prefix
+      sequences as they are. Prefix sequences given to self.autocompleter
+      directly must then be arrays from this vocabulary.
+    """
+    # Private Instance Attributes:
+    # - _validation_level:
+    #     The validation level chosen by this engine's config, or None to use
+    #     the process-wide level (see a2_validation).
+    autocompleter: Autocompleter
+    result_cache: 'a2_cache.PrefixResultCache | None'
+    vocabulary: 'a2_vocabulary.Vocabulary | None'
+    _validation_level: str | None = None
+
+    def _setup_validation(self, config: dict[str, Any]) -> None:
+        """Set up the validation level requested by the 'validation' key of
+        <config>.
+
+        Raise ValueError if that level cannot be chosen (see
+        a2_validation.check_level).
+        """
+        if 'validation' in config:
+            check_level(config['validation'])
+            self._validation_level = config['validation']
+
+    def _setup_vocabulary(self, config: dict[str, Any]) -> None:
+        """Set up the vocabulary requested by the 'intern_tokens' key of
+        <config>, before self.autocompleter is built. Only the prefix trees
+        take interned prefix sequences.
+        """
+        if config.get('intern_tokens') and config['autocompleter'] in ('simple', 'compressed'):
+            from a2_vocabulary import Vocabulary
+            self.vocabulary = Vocabulary()
+        else:
+            self.vocabulary = None
+
+    def _interned(self, items: Iterable[tuple[Any, float, list]]) -> Iterable[tuple]:
+        """Return the (value, weight, prefix) <items>, with each prefix
+        interned in self.vocabulary if there is one.
+        """
+        if self.vocabulary is None:
+            return items
+        return ((value, weight, self.vocabulary.intern(prefix)) for value, weight, prefix in items)
+
+    def _encode(self, prefix: list) -> Sequence:
+        """Return <prefix> as self.autocompleter takes it for a query: the
+        ids of its elements if this engine has a vocabulary.
+        """
+        return prefix if self.vocabulary is None else self.vocabulary.lookup(prefix)
+
+    def _setup_caches(self, config: dict[str, Any]) -> None:
+        """Set up the caches requested by the 'top_k_cache' and 'result_cache'
+        keys of <config>, once self.autocompleter has been built.
+        """
+        if config.get('top_k_cache') and isinstance(self.autocompleter, SimplePrefixTree):
+            self.autocompleter.enable_top_k_cache(config['top_k_cache'])
+        if config.get('result_cache'):
+            from a2_cache import PrefixResultCache
+            self.result_cache = PrefixResultCache(config['result_cache'])
+        else:
+            self.result_cache = None
+
+    def _autocomplete(self, prefix: list, limit: int | None) -> list[tuple[Any, float]]:
+        """Return self.autocompleter.autocomplete(prefix, limit), from the
+        result cache if possible.
+        """
+        if self.result_cache is None:
+            return self.autocompleter.autocomplete(self._encode(prefix), limit)
+
+        results = self.result_cache.get(prefix, limit)
+        if results is None:
+            results = self.autocompleter.autocomplete(self._encode(prefix), limit)
+            self.result_cache.put(prefix, limit, results)
+        return results
+
+    def _insert(self, value: Any, weight: float, prefix: list) -> None:
+        """Insert <value> into self.autocompleter, and forget the cached
+        results that it changes.
+        """
+        self.autocompleter.insert(value, weight, prefix if self.vocabulary is None
+                                  else self.vocabulary.intern(prefix))
+        if self.result_cache is not None:
+            self.result_cache.invalidate(prefix, extensions=False)
+
+    def _remove(self, prefix: list) -> None:
+        """Remove <prefix> from self.autocompleter, and forget the cached
+        results that it changes.
+        """
+        self.autocompleter.remove(self._encode(prefix))
+        if self.result_cache is not None:
+            self.result_cache.invalidate(prefix, extensions=True)
+
+    def session(self) -> PrefixCursor:
+        """Return a cursor over self.autocompleter for a user typing a
+        prefix one element at a time: each push or pop only takes one step
+        through the tree, instead of a lookup of the whole prefix.
+
+        The elements pushed are the elements of this engine's prefix
+        sequences (characters, words or intervals). The cursor does not use
+        the result cache, and stops working once this engine is modified.
+        """
+        if self.vocabulary is None:
+            return self.autocompleter.cursor()
+        return PrefixCursor(self.autocompleter, self.vocabulary.lookup_token)
+
+    def save(self, path: str) -> None:
+        """Write this engine to a snapshot file at <path>.
+
+        The snapshot can be loaded with the load method of this engine's
+        class, without reading this engine's input file again.
+
+        Raise ValueError if self.autocompleter is not a prefix tree (e.g., it
+        is a DawgAutocompleter or a MelodyStore), since snapshots only store
+        prefix trees.
+        """
+        from a2_frozen_tree import FrozenPrefixTree
+
+        tree = self.autocompleter
+        if not isinstance(tree, (SimplePrefixTree, FrozenPrefixTree)):
+            raise ValueError(f'only an engine whose autocompleter is a prefix tree can be '
+                             f'saved, not one with a {type(tree).__name__}')
+        if not isinstance(tree, FrozenPrefixTree):
+            tree = FrozenPrefixTree(tree)
+        from a2_snapshot import write_snapshot
+
+        meta = {'engine': type(self).__name__}
+        if self.vocabulary is not None:
+            meta['tokens'] = self.vocabulary.tokens()
+        write_snapshot(tree, path, meta)
+
+    @classmethod
+    def load(cls, path: str) -> _AutocompleteEngine:
+        """Return the engine stored in the snapshot file at <path>.
+
+        The engine's autocompleter is a read-only FrozenPrefixTree that is
+        memory-mapped from the file (see FrozenPrefixTree.load), so the
+        engine can answer queries immediately, but does not support remove.
+
+        Raise ValueError if the snapshot was not saved by an engine of this class.
+        """
+        from a2_snapshot import read_snapshot
+
+        tree, meta = read_snapshot(path)
+        if meta is None or meta.get('engine') != cls.__name__:
+            raise ValueError(f'{path} is not a snapshot of a {cls.__name__}')
+        engine = cls.__new__(cls)
+        engine.autocompleter = tree
+        engine.result_cache = None
+        if 'tokens' in meta:
+            from a2_vocabulary import Vocabulary
+            engine.vocabulary = Vocabulary(meta['tokens'])
+        else:
+            engine.vocabulary = None
+        return engine
 
 
 ################################################################################
 # Text-based Autocomplete Engines (Task 4)
 ################################################################################
 @check_contracts
-class LetterAutocompleteEngine:
+class LetterAutocompleteEngine(_AutocompleteEngine):
     """An autocomplete engine that suggests strings based on a few letters.
 
     The *prefix sequence* for a string is the list of characters in the string.
@@ -39,16 +219,39 @@ class LetterAutocompleteEngine:
 
     Instance Attributes:
     - autocompleter: An Autocompleter used by this engine.
+    - result_cache: The cache of this engine's autocomplete results, or None.
+    - vocabulary: The vocabulary of this engine's prefix sequences, or None.
     """
     autocompleter: Autocompleter
+    result_cache: 'a2_cache.PrefixResultCache | None'
+    vocabulary: 'a2_vocabulary.Vocabulary | None'
 
     def __init__(self, config: dict[str, Any]) -> None:
         """Initialize this engine with the given configuration.
 
         <config> is a dictionary consisting of the following keys:
         - 'file': the path to a text file
-        - 'autocompleter': either the string 'simple' or 'compressed',
-          specifying which subclass of Autocompleter to use.
+        - 'autocompleter': either the string 'simple', 'compressed' or
+          'dawg', specifying which subclass of Autocompleter to use. A
+          'dawg' (see a2_dawg) shares the common endings of words as well
+          as their prefixes, so it takes much less memory, but the engine
+          is then read-only.
+        - 'top_k_cache' (optional): a positive int K. If given, every prefix
+          keeps a cached list of its K heaviest completions, which makes
+          autocomplete with limit <= K a lookup. Ignored for a 'dawg'.
+        - 'validation' (optional): 'full', 'sampled' or 'off', the level at
+          which the contracts of this engine and of its autocompleter are
+          checked when this engine calls it (see a2_validation). Without
+          it, the process-wide level is used.
+        - 'workers' (optional): a positive int, the number of processes
+          that read the file in parallel (default 1: the file is read by
+          this process).
+        - 'result_cache' (optional): a positive int N. If given, the results
+          of the last N distinct (prefix, limit) queries are cached.
+        - 'intern_tokens' (optional): if True, the elements of the prefix
+          sequences are interned as ints (see a2_vocabulary), and the tree
+          stores and compares array('I') prefix sequences. Ignored for a
+          'dawg'.
 
         Each line of the specified file counts as one input string.
         Note that the line may or may not contain spaces.
@@ -65,18 +268,24 @@ class LetterAutocompleteEngine:
 
         Preconditions:
         - config['file'] is a valid path to a file as described above
-        - config['autocompleter'] in ['simple', 'compressed']
+        - config['autocompleter'] in ['simple', 'compressed', 'dawg']
         """
-        self.autocompleter = SimplePrefixTree() if config['autocompleter'] == 'simple' \
-            else CompressedPrefixTree()
+        self._setup_validation(config)
+        if config['autocompleter'] == 'dawg':
+            from a2_dawg import DawgAutocompleter
+            tree_class = DawgAutocompleter
+        else:
+            tree_class = SimplePrefixTree if config['autocompleter'] == 'simple' \
+                else CompressedPrefixTree
         # We've opened the file for you here. You should iterate over the
         # lines of the file and process them according to the description in
         # this method's docstring.
+        self._setup_vocabulary(config)
         with open(config['file'], encoding='utf8') as f:  # File: sample_words.txt
-            for line in f:
-                sanitized_line = text_sanitization(line)
-                if sanitized_line.strip():
-                    self.autocompleter.insert(sanitized_line, 1.0, list(line))
+            self.autocompleter = tree_class.from_items(
+                self._interned(_read_items(f, _letter_items, config.get('workers', 1))))
+
+        self._setup_caches(config)
 
     def autocomplete(self, prefix: str, limit: int | None = None) -> list[tuple[str, float]]:
         """Return up to <limit> matches for the given prefix string.
@@ -93,7 +302,30 @@ class LetterAutocompleteEngine:
         - limit is None or limit > 0
         - <prefix> is a sanitized string
         """
-        return self.autocompleter.autocomplete(list(prefix), limit)
+        return self._autocomplete(list(prefix), limit)
+
+    def autocomplete_fuzzy(self, prefix: str, max_edits: int,
+                           limit: int | None = None) -> list[tuple[str, float]]:
+        """Return up to <limit> strings that start with a string within
+        <max_edits> character edits of the given prefix string, sorted by
+        weight with a penalty for each edit (see
+        SimplePrefixTree.autocomplete_fuzzy).
+
+        Preconditions:
+        - max_edits >= 0
+        - limit is None or limit > 0
+        - <prefix> is a sanitized string
+        """
+        return self.autocompleter.autocomplete_fuzzy(self._encode(list(prefix)), max_edits, limit)
+
+    def insert(self, value: str, weight: float = 1.0) -> None:
+        """Insert the string <value> with the given weight.
+
+        Preconditions:
+        - <value> is a sanitized string with at least one non-space character
+        - weight > 0
+        """
+        self._insert(value, weight, list(value))
 
     def remove(self, prefix: str) -> None:
         """Remove all strings that match the given prefix string.
@@ -104,11 +336,11 @@ class LetterAutocompleteEngine:
         Preconditions:
         - <prefix> is a sanitized string
         """
-        self.autocompleter.remove(list(prefix))
+        self._remove(list(prefix))
 
 
 @check_contracts
-class SentenceAutocompleteEngine:
+class SentenceAutocompleteEngine(_AutocompleteEngine):
     """An autocomplete engine that suggests strings based on a few words.
 
     A *word* is a string containing only alphanumeric characters.
@@ -121,8 +353,15 @@ class SentenceAutocompleteEngine:
 
     Instance Attributes:
     - autocompleter: An Autocompleter used by this engine.
+    - result_cache: The cache of this engine's autocomplete results, or None.
+    - vocabulary: The vocabulary of this engine's prefix sequences, or None.
+    - word_index: An index of this engine's strings by the words they
+      contain, for autocomplete_anywhere, or None.
     """
     autocompleter: Autocompleter
+    result_cache: 'a2_cache.PrefixResultCache | None'
+    vocabulary: 'a2_vocabulary.Vocabulary | None'
+    word_index: 'a2_word_index.WordIndex | None'
 
     def __init__(self, config: dict[str, Any]) -> None:
         """Initialize this engine with the given configuration.
@@ -131,6 +370,24 @@ class SentenceAutocompleteEngine:
         - 'file': the path to a CSV file
         - 'autocompleter': either the string 'simple' or 'compressed',
           specifying which subclass of Autocompleter to use.
+        - 'top_k_cache' (optional): a positive int K. If given, every prefix
+          keeps a cached list of its K heaviest completions, which makes
+          autocomplete with limit <= K a lookup.
+        - 'validation' (optional): 'full', 'sampled' or 'off', the level at
+          which the contracts of this engine and of its autocompleter are
+          checked when this engine calls it (see a2_validation). Without
+          it, the process-wide level is used.
+        - 'workers' (optional): a positive int, the number of processes
+          that read the file in parallel (default 1: the file is read by
+          this process).
+        - 'result_cache' (optional): a positive int N. If given, the results
+          of the last N distinct (prefix, limit) queries are cached.
+        - 'intern_tokens' (optional): if True, the elements of the prefix
+          sequences are interned as ints (see a2_vocabulary), and the tree
+          stores and compares array('I') prefix sequences.
+        - 'word_index' (optional): if True, the strings are also indexed by
+          the words they contain (see a2_word_index), so that
+          autocomplete_anywhere can be used.
 
         Preconditions:
         - config['file'] is the path to a *CSV file* where each line has two entries:
@@ -152,17 +409,23 @@ class SentenceAutocompleteEngine:
         # We haven't given you any starter code here! You should review how
         # you processed CSV files on Assignment 1.
 
-        self.autocompleter = SimplePrefixTree() if config['autocompleter'] == 'simple' \
-            else CompressedPrefixTree()
+        self._setup_validation(config)
+        tree_class = SimplePrefixTree if config['autocompleter'] == 'simple' \
+            else CompressedPrefixTree
 
         with open(config['file'], encoding='utf8') as csvfile:
-            reader = csv.reader(csvfile)
-            for lines in reader:
-                sentence, weight = lines[0].strip(), float(lines[1].strip())
-                sanitized_sentence = text_sanitization(sentence)
-                words = sanitized_sentence.split()
-                if words:
-                    self.autocompleter.insert(sanitized_sentence, weight, words)
+            items = _read_items(csvfile, _sentence_items, config.get('workers', 1))
+            if config.get('word_index'):
+                items = list(items)
+            self._setup_vocabulary(config)
+            self.autocompleter = tree_class.from_items(self._interned(items))
+
+        if config.get('word_index'):
+            from a2_word_index import WordIndex
+            self.word_index = WordIndex(items)
+        else:
+            self.word_index = None
+        self._setup_caches(config)
 
     def autocomplete(self, prefix: str, limit: int | None = None) -> list[tuple[str, float]]:
         """Return up to <limit> matches for the given prefix string.
@@ -179,7 +442,50 @@ class SentenceAutocompleteEngine:
         - limit is None or limit > 0
         - <prefix> is a sanitized string
         """
-        return self.autocompleter.autocomplete(prefix.split(), limit)
+        return self._autocomplete(prefix.split(), limit)
+
+    def autocomplete_anywhere(self, prefix: str,
+                              limit: int | None = None) -> list[tuple[str, float]]:
+        """Return up to <limit> strings that contain the words of the given
+        prefix string as consecutive words anywhere in the string, where the
+        last word only has to be the start of a word (so 'tie a' matches
+        'to tie a tie'). They are sorted by non-increasing weight.
+
+        Raise ValueError if this engine was not configured with a word index.
+
+        Preconditions:
+        - limit is None or limit > 0
+        - <prefix> is a sanitized string
+        """
+        if self.word_index is None:
+            raise ValueError("this engine has no word index (see the 'word_index' config key)")
+        return self.word_index.search(prefix.split(), limit)
+
+    def autocomplete_fuzzy(self, prefix: str, max_edits: int,
+                           limit: int | None = None) -> list[tuple[str, float]]:
+        """Return up to <limit> strings that start with a sequence of words
+        within <max_edits> word edits of the given prefix string, sorted by
+        weight with a penalty for each edit (see
+        SimplePrefixTree.autocomplete_fuzzy).
+
+        Preconditions:
+        - max_edits >= 0
+        - limit is None or limit > 0
+        - <prefix> is a sanitized string
+        """
+        return self.autocompleter.autocomplete_fuzzy(self._encode(prefix.split()), max_edits,
+                                                     limit)
+
+    def insert(self, value: str, weight: float) -> None:
+        """Insert the string <value> with the given weight.
+
+        Preconditions:
+        - <value> is a sanitized string with at least one word
+        - weight > 0
+        """
+        self._insert(value, weight, value.split())
+        if self.word_index is not None:
+            self.word_index.insert(value, weight)
 
     def remove(self, prefix: str) -> None:
         """Remove all strings that match the given prefix.
@@ -190,7 +496,18 @@ class SentenceAutocompleteEngine:
         Preconditions:
         - <prefix> is a sanitized string
         """
-        self.autocompleter.remove(prefix.split())
+        self._remove(prefix.split())
+        if self.word_index is not None:
+            self.word_index.remove(prefix.split())
+
+    @classmethod
+    def load(cls, path: str) -> SentenceAutocompleteEngine:
+        """Return the engine stored in the snapshot file at <path>, as
+        _AutocompleteEngine.load does. The engine has no word index.
+        """
+        engine = super().load(path)
+        engine.word_index = None
+        return engine
 
 
 ################################################################################
@@ -204,13 +521,42 @@ def text_sanitization(line: str) -> str:
     In other words, keep only alphanumeric and space characters.
     Remove other forms of whitespace, such as the newline character '\n'.
     """
-    result = ''
-    for word in line:
-        if word.isalnum():
-            result += word.lower()
-        elif word == ' ':
-            result += word
-    return result
+    if line.isascii():
+        return line.encode('ascii').translate(_ASCII_LOWER, _ASCII_DELETE).decode('ascii')
+    return line.translate(_SANITIZATION_TABLE)
+
+
+def sanitize_many(lines: Iterable[str]) -> Iterator[str]:
+    """Yield text_sanitization(line) for each line in <lines>, in order."""
+    for line in lines:
+        yield text_sanitization(line)
+
+
+class _SanitizationTable(dict):
+    """A str.translate table that maps each character that text_sanitization
+    keeps to its lowercase form, and deletes every other character.
+
+    Entries are computed the first time each character is looked up.
+    """
+
+    def __missing__(self, code: int) -> str | None:
+        """Compute, store and return the entry for the character <code>."""
+        char = chr(code)
+        if char.isalnum():
+            self[code] = char.lower()
+        elif char == ' ':
+            self[code] = char
+        else:
+            self[code] = None
+        return self[code]
+
+
+# The tables used by text_sanitization: bytes.translate tables for ASCII
+# lines (which are most lines), and a str.translate table for the rest
+_ASCII_LOWER = bytes(range(256)).lower()
+_ASCII_DELETE = bytes(i for i in range(256)
+                      if not (chr(i).isascii() and chr(i).isalnum() or chr(i) == ' '))
+_SANITIZATION_TABLE = _SanitizationTable()
 
 
 def calculate_intervals(notes: list[tuple[int, int]]) -> list[int]:
@@ -222,11 +568,128 @@ def calculate_intervals(notes: list[tuple[int, int]]) -> list[int]:
     return intervals
 
 
+################################################################################
+# Helper functions for reading input files
+################################################################################
+def _letter_items(f: Iterable[str]) -> Iterator[tuple[str, float, list[str]]]:
+    """Yield the (value, weight, prefix) to insert for each line of the text
+    file <f>, as described in LetterAutocompleteEngine.__init__.
+    """
+    for sanitized_line in sanitize_many(f):
+        if sanitized_line.strip():
+            yield sanitized_line, 1.0, list(sanitized_line)
+
+
+def _sentence_items(csvfile: Iterable[str]) -> Iterator[tuple[str, float, list[str]]]:
+    """Yield the (value, weight, prefix) to insert for each row of the CSV
+    file <csvfile>, as described in SentenceAutocompleteEngine.__init__.
+    """
+    import csv
+
+    for row in csv.reader(csvfile):
+        sanitized_sentence = text_sanitization(row[0].strip())
+        words = sanitized_sentence.split()
+        if words:
+            yield sanitized_sentence, float(row[1].strip()), words
+
+
+def _melody_items(csvfile: Iterable[str]
+                  ) -> Iterator[tuple['a2_melody.Melody', float, list[int]]]:
+    """Yield the (value, weight, prefix) to insert for each row of the CSV
+    file <csvfile>, as described in MelodyAutocompleteEngine.__init__.
+    """
+    from a2_melody import Melody
+    for melody_name, notes in _melody_rows(csvfile):
+        yield Melody(melody_name, notes), 1.0, calculate_intervals(notes)
+
+
+def _melody_rows(csvfile: Iterable[str]) -> Iterator[tuple[str, list[tuple[int, int]]]]:
+    """Yield the (name, notes) of the melody in each row of the CSV file
+    <csvfile> that has at least one note.
+    """
+    for line in csvfile:
+        line = line.strip().split(',')
+        melody_name = line[0]
+        notes = []
+        for i in range(1, len(line), 2):
+            if line[i] == '' or i + 1 >= len(line) or line[i + 1] == '':
+                break  # Stop if there is a blank entry or incomplete note
+            pitch, duration = int(line[i]), int(line[i + 1])
+            notes.append((pitch, duration))
+
+        if notes:
+            yield melody_name, notes
+
+
+# The number of lines in each chunk of a file read by worker processes
+_CHUNK_LINES = 20000
+
+
+def _read_items(f: TextIO, read_items: Callable[[Iterable[str]], Iterator[tuple]],
+                workers: int) -> Iterator[tuple]:
+    """Yield the (value, weight, prefix) items that <read_items> reads from the
+    lines of <f>.
+
+    If <workers> > 1, the lines are read in chunks of _CHUNK_LINES, and each
+    chunk is read by one of <workers> worker processes, which also adds up
+    the weights of the values that are repeated within the chunk. This
+    process then adds up the weights of the values repeated across chunks.
+    The items are the same as with one worker, except that each value is
+    only yielded once, with its total weight.
+
+    Preconditions:
+    - no record of <f> (e.g., a CSV row) spans more than one line
+    """
+    if workers <= 1:
+        yield from read_items(f)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    totals = {}  # value -> [total weight, prefix]
+    with ProcessPoolExecutor(workers) as pool:
+        # Keep a bounded number of chunks in flight, so that the file is not
+        # read into memory all at once. Chunks are merged in file order.
+        pending = deque()
+        while chunk := list(islice(f, _CHUNK_LINES)):
+            pending.append(pool.submit(_aggregate_items, read_items, chunk))
+            if len(pending) >= 2 * workers:
+                _merge_totals(totals, pending.popleft().result())
+        while pending:
+            _merge_totals(totals, pending.popleft().result())
+
+    for value, (weight, prefix) in totals.items():
+        yield value, weight, prefix
+
+
+def _aggregate_items(read_items: Callable[[Iterable[str]], Iterator[tuple]],
+                     lines: list[str]) -> dict[Any, list]:
+    """Return a dict mapping each value that <read_items> reads from <lines>
+    to its total weight and its prefix.
+    """
+    totals = {}
+    for value, weight, prefix in read_items(lines):
+        if value in totals:
+            totals[value][0] += weight
+        else:
+            totals[value] = [weight, prefix]
+    return totals
+
+
+def _merge_totals(totals: dict[Any, list], chunk_totals: dict[Any, list]) -> None:
+    """Add the weights in <chunk_totals> to <totals>."""
+    for value, (weight, prefix) in chunk_totals.items():
+        if value in totals:
+            totals[value][0] += weight
+        else:
+            totals[value] = [weight, prefix]
+
+
 ################################################################################
 # Melody-based Autocomplete Engines (Task 5)
 ################################################################################
 @check_contracts
-class MelodyAutocompleteEngine:
+class MelodyAutocompleteEngine(_AutocompleteEngine):
     """An autocomplete engine that suggests melodies based on a few intervals.
 
     The values stored are Melody objects, and the corresponding
@@ -238,16 +701,40 @@ class MelodyAutocompleteEngine:
 
     Instance Attributes:
     - autocompleter: An Autocompleter used by this engine.
+    - result_cache: The cache of this engine's autocomplete results, or None.
+    - vocabulary: The vocabulary of this engine's prefix sequences, or None.
     """
     autocompleter: Autocompleter
+    result_cache: 'a2_cache.PrefixResultCache | None'
+    vocabulary: 'a2_vocabulary.Vocabulary | None'
 
     def __init__(self, config: dict[str, Any]) -> None:
         """Initialize this engine with the given configuration.
 
         <config> is a dictionary consisting of the following keys:
         - 'file': the path to a CSV file
-        - 'autocompleter': either the string 'simple' or 'compressed',
-          specifying which subclass of Autocompleter to use.
+        - 'autocompleter': either the string 'simple', 'compressed' or
+          'store', specifying which subclass of Autocompleter to use. A
+          'store' (see a2_melody_store) keeps the notes in NumPy arrays
+          instead of Melody objects, which takes far less memory for large
+          files, and supports autocomplete_within; but it is read-only, and
+          each query compares the prefix against every melody.
+        - 'top_k_cache' (optional): a positive int K. If given, every prefix
+          keeps a cached list of its K heaviest completions, which makes
+          autocomplete with limit <= K a lookup. Ignored for a 'store'.
+        - 'validation' (optional): 'full', 'sampled' or 'off', the level at
+          which the contracts of this engine and of its autocompleter are
+          checked when this engine calls it (see a2_validation). Without
+          it, the process-wide level is used.
+        - 'workers' (optional): a positive int, the number of processes
+          that read the file in parallel (default 1: the file is read by
+          this process).
+        - 'result_cache' (optional): a positive int N. If given, the results
+          of the last N distinct (prefix, limit) queries are cached.
+        - 'intern_tokens' (optional): if True, the elements of the prefix
+          sequences are interned as ints (see a2_vocabulary), and the tree
+          stores and compares array('I') prefix sequences. Ignored for a
+          'store'.
 
         Preconditions:
         - config['file'] is the path to a *CSV file* where each line has the following format:
@@ -255,7 +742,7 @@ class MelodyAutocompleteEngine:
             - The remaining entries are grouped into pairs of integers (as in Assignment 1)
               where the first number in each pair is a note pitch,
               and the second number is the corresponding duration.
-        - config['autocompleter'] in ['simple', 'compressed']
+        - config['autocompleter'] in ['simple', 'compressed', 'store']
 
         HOWEVER, there may be blank entries (stored as an empty string '').
         As soon as you encounter a blank entry, stop processing this line
@@ -265,28 +752,26 @@ class MelodyAutocompleteEngine:
         """
         # We haven't given you any starter code here! You should review how
         # you processed CSV files on Assignment 1.
-        self.autocompleter = SimplePrefixTree() if config['autocompleter'] == 'simple' \
-            else CompressedPrefixTree()
+        self._setup_validation(config)
+        self._setup_vocabulary(config)
 
         with open(config['file'], newline='', encoding='utf8') as csvfile:
-            for line in csvfile:
-                line = line.strip().split(',')
-                melody_name = line[0]
-                notes = []
-                for i in range(1, len(line), 2):
-                    if line[i] == '' or i + 1 >= len(line) or line[i + 1] == '':
-                        break  # Stop if there is a blank entry or incomplete note
-                    pitch, duration = int(line[i]), int(line[i + 1])
-                    notes.append((pitch, duration))
-
-                if notes:
-                    melody = Melody(melody_name, notes)
-                    interval_sequence = calculate_intervals(notes)
-                    self.autocompleter.insert(melody, 1.0, interval_sequence)
+            if config['autocompleter'] == 'store':
+                # Imported here so that NumPy is only needed for a 'store'
+                from a2_melody_store import MelodyStore
+                self.autocompleter = MelodyStore.from_rows(
+                    (name, notes, 1.0) for name, notes in _melody_rows(csvfile))
+            else:
+                tree_class = SimplePrefixTree if config['autocompleter'] == 'simple' \
+                    else CompressedPrefixTree
+                self.autocompleter = tree_class.from_items(self._interned(
+                    _read_items(csvfile, _melody_items, config.get('workers', 1))))
+
+        self._setup_caches(config)
 
     def autocomplete(
             self, prefix: list[int], limit: int | None = None
-    ) -> list[tuple[Melody, float]]:
+    ) -> list[tuple['a2_melody.Melody', float]]:
         """Return up to <limit> matches for the given interval sequence.
 
         The return value is a list of tuples (melody, weight), and must be
@@ -297,11 +782,50 @@ class MelodyAutocompleteEngine:
         Preconditions:
         - limit is None or limit > 0
         """
-        return self.autocompleter.autocomplete(prefix, limit)
+        return self._autocomplete(prefix, limit)
+
+    def autocomplete_fuzzy(self, prefix: list[int], max_edits: int,
+                           limit: int | None = None) -> list[tuple['a2_melody.Melody', float]]:
+        """Return up to <limit> melodies whose interval sequence starts with
+        a sequence within <max_edits> interval edits of the given one, sorted
+        by weight with a penalty for each edit (see
+        SimplePrefixTree.autocomplete_fuzzy).
+
+        Preconditions:
+        - max_edits >= 0
+        - limit is None or limit > 0
+        """
+        return self.autocompleter.autocomplete_fuzzy(self._encode(prefix), max_edits, limit)
+
+    def autocomplete_within(self, prefix: list[int], tolerance: int | list[int],
+                            limit: int | None = None) -> list[tuple['a2_melody.Melody', float]]:
+        """Return up to <limit> melodies whose first len(prefix) intervals
+        are each within <tolerance> semitones of those of the given interval
+        sequence, sorted by non-increasing weight (see
+        MelodyStore.autocomplete_within).
+
+        Raise ValueError if this engine's autocompleter is not a 'store'.
+
+        Preconditions:
+        - tolerance >= 0, or every element of tolerance >= 0
+        - limit is None or limit > 0
+        """
+        if not hasattr(self.autocompleter, 'autocomplete_within'):
+            raise ValueError("autocomplete_within needs a 'store' autocompleter")
+        return self.autocompleter.autocomplete_within(prefix, tolerance, limit)
+
+    def insert(self, melody: 'a2_melody.Melody', weight: float = 1.0) -> None:
+        """Insert <melody> with the given weight.
+
+        Preconditions:
+        - <melody> has at least one note
+        - weight > 0
+        """
+        self._insert(melody, weight, calculate_intervals(melody.notes))
 
     def remove(self, prefix: list[int]) -> None:
         """Remove all melodies that match the given interval sequence."""
-        self.autocompleter.remove(prefix)
+        self._remove(prefix)
 
 
 ###############################################################################
@@ -313,10 +837,9 @@ def example_letter_autocomplete() -> list[tuple[str, float]]:
     Notes:
     - You can open .txt files directly in PyCharm to see their contents.
     - You can try out the larger ".txt" datasets under data/texts. If you do so,
-      we recommend TEMPORARILY commenting out the @check_contracts decorator for
-      the SimpleTreePrefix/CompressedTreePrefix classes to help speed up the
-      computation. Just make sure to uncomment the decorator before your final
-      submission.
+      we recommend adding 'validation': 'off' (or 'sampled') to the config, or
+      setting the A2_VALIDATION environment variable, to help speed up the
+      computation.
     - For lotr.txt, try the prefix 'frodo' or 'gandalf' 🧙
       Make sure to put in a limit!
     """
@@ -345,14 +868,14 @@ def example_sentence_autocomplete() -> list[tuple[str, float]]:
     return engine.autocomplete('a star')
 
 
-def example_melody_autocomplete(play: bool = False) -> list[tuple[Melody, float]]:
+def example_melody_autocomplete(play: bool = False) -> list[tuple['a2_melody.Melody', float]]:
     """A sample run of the melody autocomplete engine.
 
     If <play> is True, also play each melody using Pygame.
 
     Notes:
-    - You may wish to comment out the @check_contracts decorator for the prefix tree classes
-      and Melody for this example.
+    - You may wish to turn validation off for this example (see
+      example_letter_autocomplete).
     - You can try the other datasets under data/melodies.
     - Remember, you can open csv files in PyCharm, too!
     """
@@ -373,11 +896,9 @@ def example_melody_autocomplete(play: bool = False) -> list[tuple[Melody, float]
 
 
 if __name__ == '__main__':
-    # This is used to increase the recursion limit so that your autocomplete engines work
-    # even for tall SimplePrefixTrees.
-    import sys
+    import doctest
 
-    sys.setrecursionlimit(5000)
+    doctest.testmod()
 
     # print(example_letter_autocomplete())
     # print(example_sentence_autocomplete())
@@ -401,7 +922,11 @@ if __name__ == '__main__':
     #             'SentenceAutocompleteEngine.__init__',
     #             'MelodyAutocompleteEngine.__init__'
     #         ],
-    #         'extra-imports': ['csv', 'time', 'sys', 'a2_prefix_tree', 'a2_melody'],
+    #         'extra-imports': ['csv', 'time', 'collections', 'concurrent.futures',
+    #                           'itertools', 'a2_autocompleter', 'a2_prefix_tree',
+    #                           'a2_frozen_tree', 'a2_melody',
+    #                           'a2_snapshot', 'a2_validation', 'a2_cache', 'a2_dawg',
+    #                           'a2_word_index', 'a2_melody_store', 'a2_vocabulary'],
     #         'max-line-length': 100,
     #     }
     # )
@@ -0,0 +1,276 @@
+"""CSC148 Assignment 2: The Autocompleter ADT
+
+=== Module Description ===
+This file contains the definition of the Autocompleter Abstract Data Type,
+which a2_prefix_tree implements (and from which it can still be imported),
+and the parts shared by its implementations: PrefixCursor, and the helpers
+that search for typo-tolerant matches.
+"""
+from __future__ import annotations
+import heapq
+from typing import Any, Callable, Iterable, Iterator, Sequence
+
+from a2_validation import check_contracts
+
+# The default factor by which autocomplete_fuzzy scales the weight of a value
+# for each edit needed to match it
+FUZZY_PENALTY = 0.5
+
+
+################################################################################
+# The Autocompleter ADT
+################################################################################
+class Autocompleter:
+    """An abstract class representing the Autocompleter Abstract Data Type.
+
+    A prefix sequence is usually a list, but the prefix trees accept any
+    sequence whose slices have its type and compare with ==, such as the
+    array('I') prefix sequences of a2_vocabulary.
+    """
+    __slots__: tuple[str, ...] = ()
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this Autocompleter."""
+        raise NotImplementedError
+
+    def insert(self, value: Any, weight: float, prefix: Sequence) -> None:
+        """Insert the given value into this Autocompleter.
+
+        The value is inserted with the given weight, and is associated with
+        the prefix sequence <prefix>.
+
+        If the value has already been inserted into this autocompleter
+        (compare values using ==), then the given weight should be *added* to
+        the existing weight of this value.
+
+        Preconditions:
+        - weight > 0
+        - the given value is either:
+            1) not in this Autocompleter, or
+            2) was previously inserted with the SAME prefix sequence
+        """
+        raise NotImplementedError
+
+    def autocomplete(self, prefix: Sequence,
+                     limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        The return value is a list of tuples (value, weight), and must be
+        sorted by non-increasing weight. You can decide how to break ties.
+
+        If limit is None, return *every* match for the given prefix.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        raise NotImplementedError
+
+    def iter_autocomplete(self, prefix: Sequence) -> Iterator[tuple[Any, float]]:
+        """Yield (value, weight) for every match for the given prefix, in
+        non-increasing order of weight.
+
+        The prefix trees find each match only when it is asked for, so taking
+        the first few matches costs about as much as autocomplete with a
+        limit; by default, every match is found first.
+        """
+        return iter(self.autocomplete(prefix))
+
+    def remove(self, prefix: Sequence) -> None:
+        """Remove all values that match the given prefix.
+        """
+        raise NotImplementedError
+
+    def cursor_version(self) -> int:
+        """Return a number that changes whenever this Autocompleter is
+        modified, so that a PrefixCursor over it can tell that it has stopped
+        working.
+
+        By default it is always 0, for an Autocompleter that is never
+        modified once it is built.
+        """
+        return 0
+
+
+################################################################################
+# Typo-tolerant autocompletion
+################################################################################
+def _fuzzy_roots(start: Any, label: list, prefix: list, max_edits: int,
+                 children: Callable[[Any], Iterable[tuple[list, Any]]]) -> list[tuple[int, Any]]:
+    """Return (edits, tree) for the trees whose values' prefix sequences all
+    start with a sequence within <max_edits> edits of <prefix>, where edits
+    is the fewest such edits, and the tree is the highest one that needs
+    only that many.
+
+    The trees are searched from the tree <start>, whose root is <label>;
+    children(tree) returns (label, subtree) for each non-leaf subtree of a
+    tree, where label is the elements of the subtree's root that are not in
+    the tree's root.
+
+    The search carries one row of the Levenshtein table down each path: the
+    edit distance between the path so far and each prefix of <prefix>. A
+    path is abandoned once every entry of its row is more than <max_edits>,
+    since appending elements cannot make any of them smaller.
+    """
+    row = list(range(len(prefix) + 1))
+    roots = [(row[-1], start)] if row[-1] <= max_edits else []
+    # Entries are (row, fewest edits on the path, label, tree)
+    stack = [(row, row[-1], label, start)]
+    while stack:
+        row, fewest, label, tree = stack.pop()
+        closest, pruned = fewest, False
+        for token in label:
+            row = _next_row(row, token, prefix)
+            closest = min(closest, row[-1])
+            if min(row) > max_edits:
+                pruned = True
+                break
+
+        if closest < fewest and closest <= max_edits:
+            roots.append((closest, tree))
+        if not pruned and closest > 0:
+            stack.extend((row, closest, child_label, child)
+                         for child_label, child in children(tree))
+    return roots
+
+
+def _next_row(row: list[int], token: Any, prefix: list) -> list[int]:
+    """Return the row of the Levenshtein table after <row> for appending
+    <token> to the path: entry j is the edit distance between the path and
+    prefix[:j].
+    """
+    # This is min(substitute, delete, insert), unrolled since it runs for
+    # every element of every label the search visits
+    previous = row[0] + 1
+    new_row = [previous]
+    for j, element in enumerate(prefix):
+        distance = row[j] if element == token else row[j] + 1
+        if row[j + 1] < distance:
+            distance = row[j + 1] + 1
+        if previous < distance:
+            distance = previous + 1
+        new_row.append(distance)
+        previous = distance
+    return new_row
+
+
+def _merge_fuzzy(streams: list[tuple[int, Iterator[tuple[Any, Any, float]]]],
+                 penalty: float, limit: int | None) -> list[tuple[Any, float]]:
+    """Return up to <limit> (value, weight) tuples from <streams>, sorted by
+    non-increasing weight * penalty ** edits.
+
+    Each stream is (edits, leaves), where leaves yields (key, value, weight)
+    in non-increasing order of weight, and key identifies the leaf. A leaf
+    may be in several streams; only its first (highest-scoring) occurrence
+    is returned.
+    """
+    def scored(edits: int, leaves: Iterator[tuple[Any, Any, float]]) -> Iterator[tuple]:
+        factor = penalty ** edits
+        return ((weight * factor, key, value, weight) for key, value, weight in leaves)
+
+    merged = heapq.merge(*(scored(edits, leaves) for edits, leaves in streams),
+                         key=lambda match: match[0], reverse=True)
+    seen = set()
+    results = []
+    for _, key, value, weight in merged:
+        if key not in seen:
+            seen.add(key)
+            results.append((value, weight))
+            if len(results) == limit:
+                break
+    return results
+
+
+################################################################################
+# Cursors
+################################################################################
+@check_contracts
+class PrefixCursor:
+    """A cursor over a prefix tree, which remembers where its prefix is in
+    the tree, so that each element added to or removed from the prefix only
+    takes one step through the tree.
+
+    A cursor stops working once its tree is modified; every method then
+    raises RuntimeError.
+
+    Instance Attributes:
+    - prefix: the current prefix of this cursor
+
+    Representation Invariants:
+    - len(self._positions) == len(self.prefix) + 1
+    """
+    # Private Instance Attributes:
+    # - _tree:
+    #     The tree this cursor is over.
+    # - _positions:
+    #     The position in _tree (see _tree.cursor_start) of each prefix of
+    #     self.prefix, from the empty prefix to self.prefix; a position is
+    #     None if no value matches that prefix.
+    # - _version:
+    #     The cursor_version() of _tree when this cursor was created.
+    # - _encode:
+    #     The function that turns each element of self.prefix into the
+    #     element of _tree's prefix sequences that it stands for (e.g.
+    #     Vocabulary.lookup_token), or None if they are the same.
+    prefix: list
+    _tree: Autocompleter
+    _positions: list[Any]
+    _version: int
+    _encode: Callable[[Any], Any] | None
+
+    def __init__(self, tree: Autocompleter,
+                 encode: Callable[[Any], Any] | None = None) -> None:
+        """Initialize a cursor over <tree>, at the empty prefix.
+
+        If <encode> is given, each element pushed is passed through it before
+        the cursor steps through <tree> (but self.prefix keeps the elements
+        as they were pushed).
+
+        Preconditions:
+        - <tree> has cursor_start, cursor_step and cursor_complete methods
+        """
+        self.prefix = []
+        self._tree = tree
+        self._positions = [tree.cursor_start()]
+        self._version = tree.cursor_version()
+        self._encode = encode
+
+    def push(self, token: Any) -> None:
+        """Add <token> to the end of this cursor's prefix."""
+        self._check_version()
+        position = self._positions[-1]
+        if position is not None:
+            step = token if self._encode is None else self._encode(token)
+            position = self._tree.cursor_step(position, step)
+        self._positions.append(position)
+        self.prefix.append(token)
+
+    def pop(self) -> Any:
+        """Remove and return the last element of this cursor's prefix.
+
+        Raise IndexError if the prefix is empty.
+        """
+        self._check_version()
+        if not self.prefix:
+            raise IndexError('pop from a cursor with an empty prefix')
+        self._positions.pop()
+        return self.prefix.pop()
+
+    def suggestions(self, limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for this cursor's prefix, as the
+        tree's autocomplete method does.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        self._check_version()
+        position = self._positions[-1]
+        if position is None:
+            return []
+        return self._tree.cursor_complete(position, limit)
+
+    def _check_version(self) -> None:
+        """Raise RuntimeError if this cursor's tree has been modified since
+        this cursor was created.
+        """
+        if self._tree.cursor_version() != self._version:
+            raise RuntimeError('the tree was modified after this cursor was created')
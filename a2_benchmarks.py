@@ -0,0 +1,1027 @@
+"""CSC148 Assignment 2: Benchmarks
+
+=== Module Description ===
+This file contains benchmarks for the Autocompleter implementations in
+a2_prefix_tree. The corpora used here are generated synthetically (with a
+fixed random seed), so every benchmark runs offline and is reproducible.
+
+Run this module to print every report, with validation turned off (see
+a2_validation). Pass --json PATH to also write the results to PATH as JSON
+(so that runs can be compared), and --quick to run every report on smaller
+inputs.
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from a2_dawg import DawgAutocompleter
+from a2_autocompleter import FUZZY_PENALTY
+from a2_frozen_tree import FrozenPrefixTree
+from a2_prefix_tree import SimplePrefixTree, CompressedPrefixTree
+from a2_validation import set_validation_level
+from a2_word_index import WordIndex
+
+_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+_ENDINGS = ('', 's', 'ed', 'er', 'ers', 'ing', 'ings', 'ly', 'ness', 'tion', 'tions', 'able')
+
+# The files whose allocations count as a tree's memory
+_TREE_FILES = ('a2_prefix_tree.py', 'a2_frozen_tree.py')
+
+
+################################################################################
+# Synthetic corpora
+################################################################################
+def zipf_words(n: int, vocab_size: int = 5000, seed: int = 148) -> list[str]:
+    """Return <n> words drawn from a random vocabulary of <vocab_size> words,
+    where the i-th most common word is drawn with probability proportional
+    to 1 / i (Zipf's law).
+    """
+    rng = random.Random(seed)
+    vocab = set()
+    while len(vocab) < vocab_size:
+        length = max(1, min(12, int(rng.gauss(6, 2))))
+        vocab.add(''.join(rng.choice(_LETTERS) for _ in range(length)))
+    vocab = sorted(vocab)
+    rng.shuffle(vocab)
+    cum_weights = []
+    total = 0.0
+    for i in range(1, vocab_size + 1):
+        total += 1 / i
+        cum_weights.append(total)
+    return rng.choices(vocab, cum_weights=cum_weights, k=n)
+
+
+def inflected_words(n_stems: int, seed: int = 148) -> list[str]:
+    """Return the words formed by adding each of a few common English
+    endings to <n_stems> random stems, so that many words share their
+    endings as well as their beginnings.
+    """
+    rng = random.Random(seed)
+    stems = {''.join(rng.choice(_LETTERS) for _ in range(rng.randint(3, 8)))
+             for _ in range(n_stems)}
+    return [stem + ending for stem in sorted(stems)
+            for ending in _ENDINGS if ending == '' or rng.random() < 0.6]
+
+
+def zipf_sentences(n: int, vocab_size: int = 5000,
+                   seed: int = 148) -> list[tuple[str, float]]:
+    """Return <n> (sentence, weight) pairs. Each sentence has between 1 and 8
+    words drawn from zipf_words, and each weight is between 1 and 1000.
+    """
+    rng = random.Random(seed)
+    words = zipf_words(n * 4, vocab_size, seed)
+    sentences = []
+    for _ in range(n):
+        length = rng.randint(1, 8)
+        sentence = ' '.join(rng.choice(words) for _ in range(length))
+        sentences.append((sentence, float(rng.randint(1, 1000))))
+    return sentences
+
+
+def random_melodies(n: int, seed: int = 148) -> list[tuple[str, list[tuple[int, int]]]]:
+    """Return <n> (name, notes) pairs. Each melody is a random walk of
+    between 2 and 16 notes, with small steps between MIDI pitches 48 and 84.
+    """
+    rng = random.Random(seed)
+    melodies = []
+    for i in range(n):
+        pitch = rng.randint(60, 72)
+        notes = []
+        for _ in range(rng.randint(2, 16)):
+            notes.append((pitch, rng.choice((250, 500, 1000))))
+            pitch = max(48, min(84, pitch + rng.choice((-4, -2, -1, 0, 0, 1, 2, 3, 5))))
+        melodies.append((f'Melody {i}', notes))
+    return melodies
+
+
+def write_letter_file(path: str, n: int, seed: int = 148) -> list[str]:
+    """Write <n> Zipfian words to a LetterAutocompleteEngine input file at
+    <path>, one per line, and return them.
+    """
+    words = zipf_words(n, seed=seed)
+    with open(path, 'w', encoding='utf8') as f:
+        f.writelines(word + '\n' for word in words)
+    return words
+
+
+def write_sentence_file(path: str, n: int, seed: int = 148) -> list[str]:
+    """Write <n> weighted sentences to a SentenceAutocompleteEngine input file
+    at <path>, and return the sentences.
+    """
+    sentences = zipf_sentences(n, seed=seed)
+    with open(path, 'w', encoding='utf8', newline='') as f:
+        csv.writer(f).writerows(sentences)
+    return [sentence for sentence, _ in sentences]
+
+
+def write_melody_file(path: str, n: int, seed: int = 148) -> list[list[int]]:
+    """Write <n> random melodies to a MelodyAutocompleteEngine input file at
+    <path>, and return their interval sequences.
+    """
+    melodies = random_melodies(n, seed)
+    with open(path, 'w', encoding='utf8', newline='') as f:
+        csv.writer(f).writerows([name] + [n for note in notes for n in note]
+                                for name, notes in melodies)
+    return [[b[0] - a[0] for a, b in zip(notes, notes[1:])] for _, notes in melodies]
+
+
+def build_letter_tree(tree_class: type, words: list[str]) -> SimplePrefixTree:
+    """Return a tree of the given class containing every word in <words>,
+    inserted the way LetterAutocompleteEngine does (weight 1.0 per word).
+    """
+    tree = tree_class()
+    for word in words:
+        tree.insert(word, 1.0, list(word))
+    return tree
+
+
+def deep_words(n: int, depth: int, seed: int = 148) -> list[str]:
+    """Return <n> distinct words of <depth> letters each, which all start
+    with the same <depth> // 2 letters, so that a tree of them is deep.
+    """
+    rng = random.Random(seed)
+    stem = ''.join(rng.choice(_LETTERS) for _ in range(depth // 2))
+    words = set()
+    while len(words) < n:
+        words.add(stem + ''.join(rng.choice(_LETTERS) for _ in range(depth - len(stem))))
+    return sorted(words)
+
+
+################################################################################
+# Helpers
+################################################################################
+def _time_per_call(func: Callable[[], Any], repeat: int) -> float:
+    """Return the average number of seconds taken by one call to <func>."""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def _hot_prefixes(words: list[str], length: int) -> list[list[str]]:
+    """Return the distinct prefixes of the given length among <words>."""
+    return [list(p) for p in sorted({word[:length] for word in words if len(word) >= length})]
+
+
+def _recursive_autocomplete(tree: SimplePrefixTree, prefix: list,
+                            limit: int) -> list[tuple[Any, float]]:
+    """Return the result of tree.autocomplete(prefix, limit), computed the
+    way the recursive implementation did: by recursing down to the tree for
+    <prefix>, then recursively collecting and sorting every match.
+    """
+    def look_up(subtree: SimplePrefixTree, rest: list) -> SimplePrefixTree | None:
+        if not rest:
+            return subtree
+        child = subtree._child(rest[0])
+        return None if child is None else look_up(child, rest[1:])
+
+    def collect(subtree: SimplePrefixTree) -> list[tuple[Any, float]]:
+        if subtree.is_leaf():
+            return [(subtree.root, subtree.weight)]
+        return [match for child in subtree.subtrees for match in collect(child)]
+
+    found = look_up(tree, prefix)
+    if found is None:
+        return []
+    return sorted(collect(found), key=lambda match: match[1], reverse=True)[:limit]
+
+
+def _latencies(func: Callable[[Any], Any], args: list) -> list[float]:
+    """Return the number of seconds taken by each call func(arg), for each
+    arg in <args>.
+    """
+    times = []
+    for arg in args:
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def _percentile(samples: list[float], q: float) -> float:
+    """Return the <q>-th percentile of the non-empty list <samples>, using
+    the nearest-rank method.
+    """
+    ordered = sorted(samples)
+    return ordered[max(0, min(len(ordered) - 1, round(q / 100 * len(ordered)) - 1))]
+
+
+def _latency_row(op: str, times: list[float], **columns: Any) -> dict[str, Any]:
+    """Return a result row for the operation <op>, whose calls took <times>."""
+    return {**columns, 'op': op, 'calls': len(times),
+            'ops_per_s': len(times) / sum(times) if sum(times) else float('inf'),
+            'p50_us': _percentile(times, 50) * 1e6, 'p99_us': _percentile(times, 99) * 1e6}
+
+
+def _print_table(rows: list[dict[str, Any]]) -> None:
+    """Print <rows> as an aligned table."""
+    if not rows:
+        return
+    columns = list(dict.fromkeys(c for row in rows for c in row))
+    cells = [[f'{row.get(c):.3f}' if isinstance(row.get(c), float) else str(row.get(c, ''))
+              for c in columns] for row in rows]
+    widths = [max(len(c), *(len(r[i]) for r in cells)) for i, c in enumerate(columns)]
+    print('  '.join(c.rjust(w) for c, w in zip(columns, widths)))
+    for r in cells:
+        print('  '.join(v.rjust(w) for v, w in zip(r, widths)))
+
+
+################################################################################
+# Reports
+################################################################################
+def top_k_cache_report(ks: tuple[int, ...] = (1, 5, 10, 25, 50),
+                       n_words: int = 50000,
+                       limit: int = 5) -> list[dict[str, Any]]:
+    """Compare the memory used by the cached top-k completion lists against
+    the latency of short-prefix queries, for each cache size K in <ks>.
+
+    Each row reports, for one tree class and one K, the memory taken by the
+    caches, and the average time of an autocomplete call with the given
+    limit over every 1- and 2-letter prefix. Queries with limit > K fall back
+    to the best-first search, so K < limit rows show the uncached latency.
+    """
+    words = zipf_words(n_words)
+    prefixes = _hot_prefixes(words, 1) + _hot_prefixes(words, 2)
+    rows = []
+    for tree_class in (SimplePrefixTree, CompressedPrefixTree):
+        tree = build_letter_tree(tree_class, words)
+        uncached = _time_per_call(
+            lambda: [tree.autocomplete(p, limit) for p in prefixes], 20) / len(prefixes)
+
+        for k in ks:
+            tracemalloc.start()
+            tree.enable_top_k_cache(k)
+            cache_bytes, _ = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            cached = _time_per_call(
+                lambda: [tree.autocomplete(p, limit) for p in prefixes], 20) / len(prefixes)
+            rows.append({
+                'tree': tree_class.__name__,
+                'K': k,
+                'cache_KiB': cache_bytes / 1024,
+                'uncached_us': uncached * 1e6,
+                'cached_us': cached * 1e6,
+            })
+            tree.disable_top_k_cache()
+    return rows
+
+
+def bulk_build_report(sizes: tuple[int, ...] = (10000, 50000, 200000)) -> list[dict[str, Any]]:
+    """Compare building a tree by inserting one word at a time against
+    building it with from_items, for word lists of each of the given sizes.
+    """
+    rows = []
+    for n in sizes:
+        words = zipf_words(n)
+        items = [(word, 1.0, list(word)) for word in words]
+        for tree_class in (SimplePrefixTree, CompressedPrefixTree):
+            start = time.perf_counter()
+            build_letter_tree(tree_class, words)
+            insert_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            tree_class.from_items(items)
+            bulk_time = time.perf_counter() - start
+            rows.append({
+                'tree': tree_class.__name__,
+                'words': n,
+                'insert_s': insert_time,
+                'from_items_s': bulk_time,
+                'speedup': insert_time / bulk_time,
+            })
+    return rows
+
+
+def _held_memory(build: Callable[[], Any],
+                 files: tuple[str, ...] = _TREE_FILES) -> tuple[Any, int, int]:
+    """Call <build> and return its result, together with the number of bytes
+    and of memory blocks allocated by the code in the given files (by
+    default, a2_prefix_tree and a2_frozen_tree) that are still held once it
+    returns.
+    """
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = build()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    stats = [stat for stat in after.compare_to(before, 'filename')
+             if stat.traceback[0].filename.endswith(files)]
+    return result, sum(stat.size_diff for stat in stats), sum(stat.count_diff for stat in stats)
+
+
+def tree_memory_report(n_words: int = 100000) -> list[dict[str, Any]]:
+    """Report the memory allocated to store a letter-level tree of <n_words>
+    words, for each tree class and for a FrozenPrefixTree built from it,
+    and the median latency of autocomplete with limit 10 for every
+    two-letter prefix. The memory taken by the values themselves is not
+    counted.
+    """
+    words = zipf_words(n_words)
+    items = [(word, 1.0, list(word)) for word in words]
+    prefixes = _hot_prefixes(words, 2)
+    rows = []
+    for tree_class in (SimplePrefixTree, CompressedPrefixTree):
+        tree, size, blocks = _held_memory(lambda: tree_class.from_items(items))
+        frozen, frozen_size, frozen_blocks = _held_memory(lambda: FrozenPrefixTree(tree))
+        for name, stored, nbytes, nblocks in ((tree_class.__name__, tree, size, blocks),
+                                              ('Frozen' + tree_class.__name__, frozen,
+                                               frozen_size, frozen_blocks)):
+            rows.append({
+                'tree': name,
+                'values': len(stored),
+                'KiB': nbytes / 1024,
+                'bytes_per_value': nbytes / len(stored),
+                'allocations': nblocks,
+                'p50_us': _percentile(_latencies(lambda p: stored.autocomplete(p, 10), prefixes),
+                                      50) * 1e6,
+            })
+    return rows
+
+
+def deep_tree_report(depths: tuple[int, ...] = (100, 500, 2000),
+                     n_words: int = 200, limit: int = 5) -> list[dict[str, Any]]:
+    """Compare the latency of autocomplete queries on deep SimplePrefixTrees
+    against the recursive implementation it replaced, for words of each of
+    the given lengths. Each query is a prefix of a word with 3 / 4 of its
+    letters.
+    """
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, 2 * max(depths) + 100))
+    rows = []
+    try:
+        for depth in depths:
+            words = deep_words(n_words, depth)
+            tree = build_letter_tree(SimplePrefixTree, words)
+            queries = [list(word[:depth * 3 // 4]) for word in words[::10]]
+            iterative = _time_per_call(
+                lambda: [tree.autocomplete(q, limit) for q in queries], 5) / len(queries)
+            recursive = _time_per_call(
+                lambda: [_recursive_autocomplete(tree, q, limit) for q in queries],
+                5) / len(queries)
+            rows.append({
+                'depth': depth,
+                'recursive_us': recursive * 1e6,
+                'iterative_us': iterative * 1e6,
+                'speedup': recursive / iterative,
+            })
+    finally:
+        sys.setrecursionlimit(old_limit)
+    return rows
+
+
+def adversarial_insert_report(n_stems: int = 50, words_per_stem: int = 1000,
+                              stem_length: int = 20) -> list[dict[str, Any]]:
+    """Time inserting the same values one at a time in two orders.
+
+    The values are <words_per_stem> words for each of <n_stems> random stems
+    of <stem_length> letters (each word is its stem plus 10 random letters),
+    and every proper prefix of each stem. In the 'short_first' order the stem
+    prefixes are inserted shortest first, before the words; in the
+    'long_first' order the words are inserted first, then the stem prefixes
+    longest first, so that in a CompressedPrefixTree each of those inserts
+    splits a tree holding every word with that stem.
+    """
+    rng = random.Random(148)
+    stems = [''.join(rng.choice(_LETTERS) for _ in range(stem_length)) for _ in range(n_stems)]
+    words = [stem + ''.join(rng.choice(_LETTERS) for _ in range(10))
+             for stem in stems for _ in range(words_per_stem)]
+    stem_prefixes = sorted({stem[:i] for stem in stems for i in range(1, stem_length)}, key=len)
+    orders = {
+        'short_first': stem_prefixes + words,
+        'long_first': words + stem_prefixes[::-1],
+    }
+    rows = []
+    for tree_class in (SimplePrefixTree, CompressedPrefixTree):
+        for order, values in orders.items():
+            tree = tree_class()
+            times = _latencies(lambda value: tree.insert(value, 1.0, list(value)), values)
+            rows.append(_latency_row('insert', times, tree=tree_class.__name__, order=order))
+    return rows
+
+
+def _engine_corpora() -> list[tuple[str, Callable, Callable[[Any, int], Any]]]:
+    """Return, for each engine, its class name, the function that writes an
+    input file for it, and a function that turns an inserted value's prefix
+    sequence and a length into a query for the engine.
+    """
+    return [
+        ('LetterAutocompleteEngine', write_letter_file, lambda word, n: word[:n]),
+        ('SentenceAutocompleteEngine', write_sentence_file,
+         lambda sentence, n: ' '.join(sentence.split()[:n])),
+        ('MelodyAutocompleteEngine', write_melody_file, lambda intervals, n: intervals[:n]),
+    ]
+
+
+def engine_report(sizes: tuple[int, ...] = (1000, 10000, 50000),
+                  prefix_lengths: tuple[int, ...] = (1, 2, 4),
+                  limits: tuple[int | None, ...] = (1, 10, None),
+                  n_queries: int = 200, n_removes: int = 100,
+                  seed: int = 148) -> list[dict[str, Any]]:
+    """Time building each engine with each tree class from a synthetic input
+    file of each of the given sizes, then querying it with prefixes of each
+    of the given lengths and limits, then removing prefixes from it.
+
+    Build rows report the build time and the peak memory allocated while
+    building. Query and remove rows report throughput and the p50 and p99
+    latency over <n_queries> (or <n_removes>) prefixes of values in the input.
+    Contract checking is turned off for the engines.
+    """
+    import a2_autocomplete_engines
+
+    rng = random.Random(seed)
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for engine_name, write_file, make_prefix in _engine_corpora():
+            engine_class = getattr(a2_autocomplete_engines, engine_name)
+            for size in sizes:
+                path = os.path.join(directory, f'{engine_name}_{size}.csv')
+                sequences = write_file(path, size, seed)
+                for tree in ('simple', 'compressed'):
+                    config = {'file': path, 'autocompleter': tree, 'validation': 'off'}
+                    columns = {'engine': engine_name, 'tree': tree, 'size': size}
+
+                    start = time.perf_counter()
+                    engine = engine_class(config)
+                    build_time = time.perf_counter() - start
+                    tracemalloc.start()
+                    engine_class(config)
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    rows.append({**columns, 'op': 'build', 'calls': 1,
+                                 'ops_per_s': size / build_time,
+                                 'build_s': build_time, 'peak_MiB': peak / 2 ** 20})
+
+                    for length in prefix_lengths:
+                        queries = [make_prefix(rng.choice(sequences), length)
+                                   for _ in range(n_queries)]
+                        for limit in limits:
+                            times = _latencies(lambda q: engine.autocomplete(q, limit), queries)
+                            rows.append(_latency_row('autocomplete', times, **columns,
+                                                     prefix_len=length, limit=limit))
+
+                    removes = [make_prefix(rng.choice(sequences), max(prefix_lengths))
+                               for _ in range(n_removes)]
+                    times = _latencies(engine.remove, removes)
+                    rows.append(_latency_row('remove', times, **columns,
+                                             prefix_len=max(prefix_lengths)))
+    return rows
+
+
+def parallel_build_report(size: int = 200000,
+                          workers: tuple[int, ...] = (1, 2, 4)) -> list[dict[str, Any]]:
+    """Time building each engine (with a CompressedPrefixTree) from a
+    synthetic input file of <size> records, with each of the given numbers of
+    worker processes reading the file.
+    """
+    import a2_autocomplete_engines
+
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for engine_name, write_file, _ in _engine_corpora():
+            engine_class = getattr(a2_autocomplete_engines, engine_name)
+            path = os.path.join(directory, f'{engine_name}.csv')
+            write_file(path, size)
+            base_time = None
+            for n in workers:
+                config = {'file': path, 'autocompleter': 'compressed',
+                          'validation': 'off', 'workers': n}
+                start = time.perf_counter()
+                engine_class(config)
+                build_time = time.perf_counter() - start
+                base_time = base_time or build_time
+                rows.append({
+                    'engine': engine_name,
+                    'workers': n,
+                    'cpus': os.cpu_count(),
+                    'build_s': build_time,
+                    'records_per_s': size / build_time,
+                    'speedup': base_time / build_time,
+                })
+    return rows
+
+
+def sharded_report(n_words: int = 100000, shards: tuple[int, ...] = (1, 2, 4),
+                   n_queries: int = 500) -> list[dict[str, Any]]:
+    """Time building a ShardedAutocompleter of letter-level words with each
+    of the given numbers of shards (with insert_many), then querying it with
+    1-letter prefixes (which every shard answers) and 3-letter prefixes
+    (which one shard answers), with limit 10.
+    """
+    from a2_sharded import ShardedAutocompleter
+
+    rng = random.Random(148)
+    words = zipf_words(n_words)
+    items = [(word, 1.0, list(word)) for word in words]
+    rows = []
+    for n in shards:
+        with ShardedAutocompleter(n, key_length=2) as sharded:
+            start = time.perf_counter()
+            sharded.insert_many(items)
+            build_time = time.perf_counter() - start
+            for length in (1, 3):
+                queries = [list(rng.choice(words)[:length]) for _ in range(n_queries)]
+                times = _latencies(lambda q: sharded.autocomplete(q, 10), queries)
+                rows.append(_latency_row('autocomplete', times, shards=n, prefix_len=length,
+                                         build_s=build_time))
+    return rows
+
+
+def result_cache_report(n_words: int = 50000, n_queries: int = 20000,
+                        capacities: tuple[int, ...] = (0, 100, 1000)) -> list[dict[str, Any]]:
+    """Time a LetterAutocompleteEngine answering <n_queries> queries with
+    limit 10 for prefixes of Zipfian words (so popular prefixes repeat), with
+    a result cache of each of the given capacities (0 for no cache), and one
+    insert after every 100 queries.
+    """
+    import a2_autocomplete_engines
+
+    rng = random.Random(148)
+    words = zipf_words(n_words)
+    queries = [word[:rng.randint(1, 3)] for word in zipf_words(n_queries, seed=149)]
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'words.txt')
+        write_letter_file(path, n_words)
+        for capacity in capacities:
+            engine = a2_autocomplete_engines.LetterAutocompleteEngine(
+                {'file': path, 'autocompleter': 'compressed', 'validation': 'off',
+                 'result_cache': capacity})
+            times = []
+            for i, query in enumerate(queries):
+                if i % 100 == 99:
+                    engine.insert(rng.choice(words), 1.0)
+                start = time.perf_counter()
+                engine.autocomplete(query, 10)
+                times.append(time.perf_counter() - start)
+            row = _latency_row('autocomplete', times, capacity=capacity)
+            if engine.result_cache is not None:
+                stats = engine.result_cache.stats()
+                row['hit_rate'] = stats['hits'] / (stats['hits'] + stats['misses'])
+                row['evictions'] = stats['evictions']
+                row['invalidations'] = stats['invalidations']
+            rows.append(row)
+    return rows
+
+
+def keystroke_report(n_words: int = 50000, n_sessions: int = 2000) -> list[dict[str, Any]]:
+    """Time <n_sessions> users typing Zipfian words one character at a time
+    (with a backspace and a retype after every third character), asking for
+    10 suggestions after each keystroke: once with a full autocomplete call
+    per keystroke, and once with a session cursor.
+    """
+    rows = []
+    for name, tree_class in [('simple', SimplePrefixTree), ('compressed', CompressedPrefixTree)]:
+        tree = build_letter_tree(tree_class, zipf_words(n_words))
+        typed = zipf_words(n_sessions, seed=150)
+        for method in ('autocomplete', 'cursor'):
+            times = []
+            for word in typed:
+                prefix, cursor = [], tree.cursor()
+                for i, char in enumerate(word):
+                    keys = [char, None, char] if i % 3 == 2 else [char]
+                    for key in keys:
+                        start = time.perf_counter()
+                        if method == 'autocomplete':
+                            if key is None:
+                                prefix.pop()
+                            else:
+                                prefix.append(key)
+                            tree.autocomplete(prefix, 10)
+                        else:
+                            if key is None:
+                                cursor.pop()
+                            else:
+                                cursor.push(key)
+                            cursor.suggestions(10)
+                        times.append(time.perf_counter() - start)
+            rows.append(_latency_row('keystroke', times, tree=name, method=method))
+    return rows
+
+
+def dawg_report(n_stems: int = 20000, word_file: str | None = None) -> list[dict[str, Any]]:
+    """Report the memory allocated to store a letter-level autocompleter of
+    the words in <word_file> (one per line, sanitized), or of
+    inflected_words(n_stems) if it is None, as a CompressedPrefixTree, a
+    FrozenPrefixTree and a DawgAutocompleter, and the median latency of
+    autocomplete with limit 10 for every two-letter prefix. Unlike
+    tree_memory_report, this counts the memory taken by the values, since a
+    DAWG does not store them.
+    """
+    from a2_autocomplete_engines import sanitize_many
+
+    if word_file is None:
+        words = inflected_words(n_stems)
+    else:
+        with open(word_file, encoding='utf8') as f:
+            words = [word for word in sanitize_many(f) if word.strip()]
+    items = [(word, 1.0, list(word)) for word in words]
+    prefixes = _hot_prefixes(words, 2)
+
+    # The values are copied as the trees are built, so that the memory they
+    # take is counted
+    files = ('a2_prefix_tree.py', 'a2_frozen_tree.py', 'a2_dawg.py', 'a2_benchmarks.py')
+    builds = [
+        ('CompressedPrefixTree', lambda: CompressedPrefixTree.from_items(
+            (''.join(word), weight, prefix) for word, weight, prefix in items)),
+        ('FrozenPrefixTree', lambda: FrozenPrefixTree(CompressedPrefixTree.from_items(
+            (''.join(word), weight, prefix) for word, weight, prefix in items))),
+        ('DawgAutocompleter', lambda: DawgAutocompleter.from_items(items)),
+    ]
+    rows = []
+    for name, build in builds:
+        stored, nbytes, _ = _held_memory(build, files)
+        rows.append({
+            'autocompleter': name,
+            'values': len(stored),
+            'KiB': nbytes / 1024,
+            'bytes_per_value': nbytes / len(stored),
+            'p50_us': _percentile(_latencies(lambda p: stored.autocomplete(p, 10), prefixes),
+                                  50) * 1e6,
+        })
+    return rows
+
+
+def _brute_force_fuzzy(items: list[tuple[str, float]], prefix: str, max_edits: int,
+                       limit: int) -> list[tuple[str, float]]:
+    """Return the result of autocomplete_fuzzy(list(prefix), max_edits, limit)
+    for a tree of the given (word, weight) items, computed by finding the
+    edit distance between <prefix> and the start of every word.
+    """
+    matches = []
+    for word, weight in items:
+        row = list(range(len(prefix) + 1))
+        fewest = row[-1]
+        for char in word[:len(prefix) + max_edits]:
+            new_row = [row[0] + 1]
+            for j in range(1, len(row)):
+                new_row.append(min(row[j] + 1, new_row[j - 1] + 1,
+                                   row[j - 1] + (prefix[j - 1] != char)))
+            row = new_row
+            fewest = min(fewest, row[-1])
+        if fewest <= max_edits:
+            matches.append((word, weight, weight * FUZZY_PENALTY ** fewest))
+    matches.sort(key=lambda match: match[2], reverse=True)
+    return [(word, weight) for word, weight, _ in matches[:limit]]
+
+
+def fuzzy_report(n_words: int = 200000, vocab_size: int = 50000,
+                 n_queries: int = 200) -> list[dict[str, Any]]:
+    """Time autocomplete_fuzzy with limit 10 on a CompressedPrefixTree of
+    <n_words> Zipfian words from a vocabulary of <vocab_size>, for <n_queries>
+    prefixes of 4 to 6 letters with one random typo each, and for each
+    max_edits from 0 to 2; and compare it with computing the edit distance to
+    every distinct word.
+    """
+    rng = random.Random(148)
+    words = zipf_words(n_words, vocab_size)
+    tree = CompressedPrefixTree.from_items((word, 1.0, list(word)) for word in words)
+    totals = {}
+    for word in words:
+        totals[word] = totals.get(word, 0.0) + 1.0
+
+    queries = []
+    for word in rng.sample(sorted(totals), n_queries):
+        prefix = list(word[:rng.randint(4, 6)])
+        prefix[rng.randrange(len(prefix))] = rng.choice(_LETTERS)
+        queries.append(''.join(prefix))
+
+    rows = []
+    for max_edits in (0, 1, 2):
+        times = _latencies(lambda q: tree.autocomplete_fuzzy(list(q), max_edits, 10), queries)
+        rows.append(_latency_row('autocomplete_fuzzy', times, max_edits=max_edits))
+    times = _latencies(lambda q: _brute_force_fuzzy(list(totals.items()), q, 1, 10),
+                       queries[:max(1, n_queries // 20)])
+    rows.append(_latency_row('brute force', times, max_edits=1))
+    return rows
+
+
+def word_index_report(n_sentences: int = 100000, n_queries: int = 500) -> list[dict[str, Any]]:
+    """Compare three ways of storing <n_sentences> Zipfian sentences (about
+    the size of google_searches.csv): a CompressedPrefixTree of the
+    sentences, which only matches from the first word; a WordIndex of
+    them; and a CompressedPrefixTree of every suffix of every sentence,
+    which matches anywhere. Report the memory each takes (not counting the
+    sentences themselves) and its median and 99th percentile latency for
+    <n_queries> queries with limit 10: one or two consecutive words from a
+    random position of a random sentence, the last cut to 1 to 3 letters.
+    A linear scan of every sentence is timed for comparison.
+    """
+    rng = random.Random(148)
+    sentences = zipf_sentences(n_sentences)
+    items = [(sentence, weight, sentence.split()) for sentence, weight in sentences]
+    queries = []
+    for sentence, _ in rng.sample(sentences, n_queries):
+        words = sentence.split()
+        start = rng.randrange(len(words))
+        query = words[start:start + rng.randint(1, 2)]
+        query[-1] = query[-1][:rng.randint(1, 3)]
+        queries.append(query)
+
+    files = ('a2_prefix_tree.py', 'a2_word_index.py')
+    tree, tree_size, _ = _held_memory(lambda: CompressedPrefixTree.from_items(items), files)
+    index, index_size, _ = _held_memory(lambda: WordIndex(items), files)
+    suffixes, suffixes_size, _ = _held_memory(lambda: CompressedPrefixTree.from_items(
+        ((sentence, i), weight, words[i:]) for sentence, weight, words in items
+        for i in range(len(words))), files)
+
+    def scan(query: list[str]) -> list[tuple[str, float]]:
+        *whole, last = query
+        matches = [(sentence, weight) for sentence, weight, words in items
+                   if any(words[i:i + len(whole)] == whole
+                          and words[i + len(whole)].startswith(last)
+                          for i in range(len(words) - len(whole)))]
+        return sorted(matches, key=lambda match: match[1], reverse=True)[:10]
+
+    rows = []
+    for name, search, nbytes, matches in (
+            ('prefix tree (first word only)', lambda q: tree.autocomplete(q, 10), tree_size,
+             'start'),
+            ('word index', lambda q: index.search(q, 10), index_size, 'anywhere'),
+            ('suffix tree', lambda q: suffixes.autocomplete(q, 10), suffixes_size, 'anywhere'),
+            ('linear scan', scan, 0, 'anywhere')):
+        times = _latencies(search, queries if name != 'linear scan' else queries[:20])
+        rows.append(_latency_row('query', times, structure=name, matches=matches,
+                                 KiB=nbytes / 1024))
+    return rows
+
+
+def melody_store_report(n_melodies: int = 100000, n_queries: int = 500) -> list[dict[str, Any]]:
+    """Report the memory held by a MelodyAutocompleteEngine for a file of
+    <n_melodies> random melodies, Melody objects included, with each kind of
+    autocompleter, and the median and 99th percentile latency of <n_queries>
+    queries with limit 10 for the first 3 intervals of a random melody. The
+    'store' is also timed with a tolerance of 1 and 2 semitones per
+    interval, as is a loop over the interval lists for comparison.
+    """
+    import a2_autocomplete_engines
+
+    rng = random.Random(148)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'melodies.csv')
+        intervals = write_melody_file(path, n_melodies)
+        queries = [sequence[:3] for sequence in rng.sample(intervals, n_queries)]
+        files = ('a2_prefix_tree.py', 'a2_autocomplete_engines.py', 'a2_melody.py',
+                 'a2_melody_store.py')
+        rows = []
+        for kind in ('simple', 'compressed', 'store'):
+            engine, nbytes, _ = _held_memory(
+                lambda: a2_autocomplete_engines.MelodyAutocompleteEngine(
+                    {'file': path, 'autocompleter': kind}), files)
+            times = _latencies(lambda q: engine.autocomplete(q, 10), queries)
+            rows.append(_latency_row('autocomplete', times, autocompleter=kind,
+                                     KiB=nbytes / 1024, bytes_per_melody=nbytes / n_melodies))
+        for tolerance in (1, 2):
+            times = _latencies(lambda q: engine.autocomplete_within(q, tolerance, 10), queries)
+            rows.append(_latency_row('autocomplete_within', times, autocompleter='store',
+                                     tolerance=tolerance))
+
+    def scan(query: list[int]) -> list[int]:
+        return [i for i, sequence in enumerate(intervals)
+                if len(sequence) >= len(query)
+                and all(abs(a - b) <= 1 for a, b in zip(sequence, query))][:10]
+
+    times = _latencies(scan, queries[:max(1, n_queries // 10)])
+    rows.append(_latency_row('loop over lists', times, tolerance=1))
+    return rows
+
+
+def interning_report(size: int = 100000, n_queries: int = 1000,
+                     seed: int = 148) -> list[dict[str, Any]]:
+    """Report the memory held by each engine, with each tree class, for a
+    synthetic input file of <size> records, with and without the
+    'intern_tokens' config key, and the median and 99th percentile latency
+    of <n_queries> queries with limit 10 for the first 1 to 3 elements of a
+    random value's prefix sequence.
+    """
+    import a2_autocomplete_engines
+
+    rng = random.Random(seed)
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        for engine_name, write_file, make_prefix in _engine_corpora():
+            engine_class = getattr(a2_autocomplete_engines, engine_name)
+            path = os.path.join(directory, f'{engine_name}.csv')
+            sequences = write_file(path, size, seed)
+            queries = [make_prefix(rng.choice(sequences), rng.randint(1, 3))
+                       for _ in range(n_queries)]
+            for tree in ('simple', 'compressed'):
+                for interned in (False, True):
+                    tracemalloc.start()
+                    engine = engine_class({'file': path, 'autocompleter': tree,
+                                           'intern_tokens': interned})
+                    held, _ = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    times = _latencies(lambda q: engine.autocomplete(q, 10), queries)
+                    rows.append(_latency_row('autocomplete', times, engine=engine_name,
+                                             tree=tree, interned=interned,
+                                             held_MiB=held / 2 ** 20))
+    return rows
+
+
+def federated_report(n_words: int = 200000, n_sources: int = 50,
+                     n_queries: int = 500) -> list[dict[str, Any]]:
+    """Split <n_words> Zipfian words between <n_sources> sources, alternately
+    SimplePrefixTrees and CompressedPrefixTrees with random multipliers
+    (words repeat across sources), and time <n_queries> queries with limit
+    10 for 1 and 3 letter prefixes: from a FederatedAutocompleteEngine of
+    the sources; by taking every match from every source and sorting them;
+    and from one CompressedPrefixTree of every word with its multiplied
+    weight. Also time rebuilding one source and swapping it in, against
+    rebuilding the single tree.
+    """
+    from a2_federated import FederatedAutocompleteEngine
+
+    rng = random.Random(148)
+    words = zipf_words(n_words)
+    chunks = [words[i::n_sources] for i in range(n_sources)]
+    multipliers = [rng.uniform(0.5, 2) for _ in range(n_sources)]
+    engine = FederatedAutocompleteEngine()
+    for i, chunk in enumerate(chunks):
+        tree_class = SimplePrefixTree if i % 2 == 0 else CompressedPrefixTree
+        engine.add_source(f'source{i}', build_letter_tree(tree_class, chunk), multipliers[i])
+
+    def build_single() -> CompressedPrefixTree:
+        return CompressedPrefixTree.from_items(
+            (word, multiplier, list(word))
+            for chunk, multiplier in zip(chunks, multipliers) for word in chunk)
+
+    def every_match(prefix: list[str]) -> list[tuple[str, float]]:
+        best = {}
+        for name in engine.source_names():
+            tree, multiplier = engine.source(name)
+            for word, weight in tree.autocomplete(prefix):
+                best[word] = max(best.get(word, 0.0), weight * multiplier)
+        return sorted(best.items(), key=lambda match: match[1], reverse=True)[:10]
+
+    single = build_single()
+    rows = []
+    for length in (1, 3):
+        queries = [list(rng.choice(words)[:length]) for _ in range(n_queries)]
+        for name, search in (('federated', lambda q: engine.autocomplete(q, 10)),
+                             ('every match, sorted', every_match),
+                             ('single tree', lambda q: single.autocomplete(q, 10))):
+            times = _latencies(search, queries)
+            rows.append(_latency_row('autocomplete', times, structure=name,
+                                     prefix_len=length))
+
+    rebuild = _latencies(lambda chunk: engine.replace_source(
+        'source1', build_letter_tree(CompressedPrefixTree, chunk)), [chunks[1]] * 3)
+    rows.append(_latency_row('rebuild', rebuild, structure='federated (one source)',
+                             prefix_len=None))
+    rows.append(_latency_row('rebuild', _latencies(lambda _: build_single(), [None] * 3),
+                             structure='single tree', prefix_len=None))
+    return rows
+
+
+def _import_times(code: str) -> dict[str, float]:
+    """Run <code> in a new Python process with -X importtime, and return the
+    cumulative import time in seconds of each module that the process
+    imported directly (not through another module).
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        # Lines are "import time: <self us> | <cumulative us> | <indented name>"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def startup_report(repeat: int = 7) -> list[dict[str, Any]]:
+    """Report the time a new Python process takes to import
+    a2_autocomplete_engines, which is all a process serving only the text
+    engines imports, and what each engine or feature that imports more on
+    first use adds to it. The 'eager' row imports everything that the module
+    used to import up front.
+
+    Each row is the median over <repeat> processes (after one to warm the
+    bytecode caches) of the total import time, as reported by
+    python -X importtime, and the heaviest modules imported directly.
+    Python's own startup imports (e.g. site) are not counted.
+    """
+    features = ['a2_dawg', 'a2_cache', 'a2_vocabulary', 'a2_word_index']
+    lazy = ['a2_melody', 'csv', 'concurrent.futures.process', 'a2_snapshot'] + features
+    scenarios = [
+        ('text engines', ['a2_autocomplete_engines']),
+        ('+ CSV files (sentence engine)', ['a2_autocomplete_engines', 'csv']),
+        ('+ melody engine', ['a2_autocomplete_engines', 'a2_melody']),
+        ('+ workers', ['a2_autocomplete_engines', 'concurrent.futures.process']),
+        ('+ snapshots', ['a2_autocomplete_engines', 'a2_snapshot']),
+        ('+ dawg, caches, vocabulary, word index', ['a2_autocomplete_engines'] + features),
+        ('+ first contract check', ['a2_autocomplete_engines', 'python_ta.contracts']),
+        ('eager (everything up front)', lazy + ['a2_autocomplete_engines']),
+    ]
+    baseline = set(_import_times('pass'))
+    rows = []
+    for name, modules in scenarios:
+        code = ''.join(f'import {module}\n' for module in modules)
+        try:
+            _import_times(code)
+        except subprocess.CalledProcessError:
+            rows.append({'scenario': name, 'ms': None, 'heaviest': 'not installed'})
+            continue
+        runs = [{module: seconds for module, seconds in _import_times(code).items()
+                 if module not in baseline} for _ in range(repeat)]
+        totals = sorted(sum(run.values()) for run in runs)
+        heaviest = sorted(runs[-1].items(), key=lambda item: item[1], reverse=True)[:3]
+        rows.append({'scenario': name, 'ms': totals[len(totals) // 2] * 1e3,
+                     'heaviest': ' '.join(f'{module}={seconds * 1e3:.1f}'
+                                          for module, seconds in heaviest)})
+
+    eager = rows[-1]['ms']
+    for row in rows:
+        if row['ms'] is not None and eager:
+            row['vs_eager'] = row['ms'] / eager
+    return rows
+
+
+def write_results(path: str, reports: dict[str, list[dict[str, Any]]]) -> None:
+    """Write <reports>, a mapping from report names to their rows, to a JSON
+    file at <path>, together with a description of the machine they ran on.
+    """
+    results = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version,
+        'platform': platform.platform(),
+        'reports': reports,
+    }
+    with open(path, 'w', encoding='utf8') as f:
+        json.dump(results, f, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the autocompleter benchmarks.')
+    parser.add_argument('--json', metavar='PATH', help='also write the results to PATH')
+    parser.add_argument('--quick', action='store_true', help='use smaller inputs')
+    parser.add_argument('--words', metavar='PATH',
+                        help='a word list (one word per line) for the DAWG report')
+    args = parser.parse_args()
+
+    # The reports time the trees and engines, not their contract checks
+    set_validation_level('off')
+
+    if args.quick:
+        all_reports = {
+            'Top-k completion cache (limit=5)': lambda: top_k_cache_report(n_words=10000),
+            'Bulk loading': lambda: bulk_build_report((10000,)),
+            'Tree memory': lambda: tree_memory_report(10000),
+            'Deep trees: recursive vs iterative autocomplete': lambda: deep_tree_report((100, 500)),
+            'Adversarial insertion orders': lambda: adversarial_insert_report(20, 500),
+            'Engines': lambda: engine_report((1000, 5000)),
+            'Parallel ingestion': lambda: parallel_build_report(20000),
+            'Sharded autocompleter': lambda: sharded_report(20000),
+            'Result cache': lambda: result_cache_report(10000, 5000),
+            'Keystroke sessions': lambda: keystroke_report(10000, 500),
+            'DAWG vs prefix trees': lambda: dawg_report(2000, args.words),
+            'Typo-tolerant autocomplete': lambda: fuzzy_report(20000, 5000, 50),
+            'Mid-sentence matching': lambda: word_index_report(10000, 200),
+            'Columnar melody store': lambda: melody_store_report(10000, 200),
+            'Token interning': lambda: interning_report(10000, 200),
+            'Startup imports': lambda: startup_report(3),
+            'Federated sources': lambda: federated_report(20000, 10, 200),
+        }
+    else:
+        all_reports = {
+            'Top-k completion cache (limit=5)': top_k_cache_report,
+            'Bulk loading': bulk_build_report,
+            'Tree memory': tree_memory_report,
+            'Deep trees: recursive vs iterative autocomplete': deep_tree_report,
+            'Adversarial insertion orders': adversarial_insert_report,
+            'Engines': engine_report,
+            'Parallel ingestion': parallel_build_report,
+            'Sharded autocompleter': sharded_report,
+            'Result cache': result_cache_report,
+            'Keystroke sessions': keystroke_report,
+            'DAWG vs prefix trees': lambda: dawg_report(word_file=args.words),
+            'Typo-tolerant autocomplete': fuzzy_report,
+            'Mid-sentence matching': word_index_report,
+            'Columnar melody store': melody_store_report,
+            'Token interning': interning_report,
+            'Startup imports': startup_report,
+            'Federated sources': federated_report,
+        }
+
+    results = {}
+    for title, report in all_reports.items():
+        print(title)
+        results[title] = report()
+        _print_table(results[title])
+        print()
+    if args.json:
+        write_results(args.json, results)
@@ -0,0 +1,144 @@
+"""CSC148 Assignment 2: Result cache
+
+=== Module Description ===
+This file contains PrefixResultCache, a bounded least-recently-used cache of
+autocomplete results that the engines can use (see the 'result_cache' config
+key of each engine).
+
+When values are inserted or removed, the cache only forgets the results
+that can have changed: the results for the prefixes of the inserted value's
+prefix sequence, and for the prefixes and the extensions of a removed
+prefix sequence.
+"""
+from __future__ import annotations
+from collections import OrderedDict
+from typing import Any
+
+from a2_validation import check_contracts
+
+
+@check_contracts
+class PrefixResultCache:
+    """A bounded LRU cache of autocomplete results, keyed by prefix sequence
+    and limit.
+
+    Instance Attributes:
+    - capacity: the maximum number of results stored
+    - hits: the number of lookups that found a result
+    - misses: the number of lookups that did not find a result
+    - evictions: the number of results forgotten to make room for others
+    - invalidations: the number of results forgotten because of an insert
+      or a remove
+
+    Representation Invariants:
+    - self.capacity >= 1
+    - len(self._results) <= self.capacity
+    """
+    # Private Instance Attributes:
+    # - _results:
+    #     The cached results, keyed by (prefix, limit), with the prefix as a
+    #     tuple. Ordered from least to most recently used.
+    # - _limits:
+    #     The limits of the cached results for each prefix.
+    # - _extensions:
+    #     For each prefix of a prefix in _limits, the prefixes in _limits
+    #     that start with it (including itself, if it is in _limits).
+    capacity: int
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    _results: OrderedDict[tuple[tuple, int | None], list[tuple[Any, float]]]
+    _limits: dict[tuple, set[int | None]]
+    _extensions: dict[tuple, set[tuple]]
+
+    def __init__(self, capacity: int) -> None:
+        """Initialize an empty cache that stores up to <capacity> results.
+
+        Preconditions:
+        - capacity >= 1
+        """
+        self.capacity = capacity
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+        self._results = OrderedDict()
+        self._limits = {}
+        self._extensions = {}
+
+    def __len__(self) -> int:
+        """Return the number of results in this cache."""
+        return len(self._results)
+
+    def get(self, prefix: list, limit: int | None) -> list[tuple[Any, float]] | None:
+        """Return a copy of the cached result for <prefix> and <limit>, or None
+        if there is none.
+        """
+        key = (tuple(prefix), limit)
+        results = self._results.get(key)
+        if results is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._results.move_to_end(key)
+        return list(results)
+
+    def put(self, prefix: list, limit: int | None, results: list[tuple[Any, float]]) -> None:
+        """Store a copy of <results> as the result for <prefix> and <limit>,
+        forgetting the least recently used result if this cache is full.
+        """
+        key = (tuple(prefix), limit)
+        if key not in self._results and len(self._results) >= self.capacity:
+            self._forget(*self._results.popitem(last=False)[0], popped=True)
+            self.evictions += 1
+
+        self._results[key] = list(results)
+        self._results.move_to_end(key)
+        if key[0] not in self._limits:
+            self._limits[key[0]] = set()
+            for i in range(len(key[0]) + 1):
+                self._extensions.setdefault(key[0][:i], set()).add(key[0])
+        self._limits[key[0]].add(limit)
+
+    def invalidate(self, prefix: list, extensions: bool) -> None:
+        """Forget the results for every prefix of <prefix> (including itself),
+        and, if <extensions> is True, for every prefix sequence that starts
+        with <prefix>.
+
+        Call this with extensions=False after inserting a value with prefix
+        sequence <prefix>, and with extensions=True after removing <prefix>.
+        """
+        prefix = tuple(prefix)
+        stale = {prefix[:i] for i in range(len(prefix) + 1) if prefix[:i] in self._limits}
+        if extensions:
+            stale.update(self._extensions.get(prefix, ()))
+        for cached_prefix in stale:
+            for limit in list(self._limits[cached_prefix]):
+                self._forget(cached_prefix, limit)
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        """Forget every result (without counting them as invalidations)."""
+        self._results.clear()
+        self._limits.clear()
+        self._extensions.clear()
+
+    def stats(self) -> dict[str, int]:
+        """Return the counters of this cache, and its size."""
+        return {'size': len(self._results), 'capacity': self.capacity, 'hits': self.hits,
+                'misses': self.misses, 'evictions': self.evictions,
+                'invalidations': self.invalidations}
+
+    def _forget(self, prefix: tuple, limit: int | None, popped: bool = False) -> None:
+        """Forget the result for <prefix> and <limit>, which is cached.
+        If <popped> is True, it has already been removed from self._results.
+        """
+        if not popped:
+            del self._results[(prefix, limit)]
+        limits = self._limits[prefix]
+        limits.discard(limit)
+        if not limits:
+            del self._limits[prefix]
+            for i in range(len(prefix) + 1):
+                extensions = self._extensions[prefix[:i]]
+                extensions.discard(prefix)
+                if not extensions:
+                    del self._extensions[prefix[:i]]
@@ -0,0 +1,390 @@
+"""CSC148 Assignment 2: Word graphs
+
+=== Module Description ===
+This file contains DawgAutocompleter, a read-only Autocompleter for strings
+whose prefix sequence is their list of characters (as in the
+LetterAutocompleteEngine). It stores the strings in a minimized directed
+acyclic word graph (DAWG): like a prefix tree, but the strings that end the
+same way also share the states for their common ending, so endings such as
+"ing" or "tion" are stored once instead of once per word.
+
+Because a state is shared by many strings, weights cannot be stored in the
+graph. Instead, each string is numbered by its position in sorted order (its
+ordinal), which can be computed while walking the graph, and the weights are
+stored in an array indexed by ordinal. The strings that start with a prefix
+have consecutive ordinals, so their top-k completions are found with a
+best-first search over a max segment tree of that array.
+"""
+from __future__ import annotations
+import heapq
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import islice
+from typing import Any, Iterable, Iterator
+
+from a2_autocompleter import FUZZY_PENALTY, Autocompleter, PrefixCursor, _fuzzy_roots, \
+    _merge_fuzzy
+from a2_validation import check_contracts
+
+
+@check_contracts
+class DawgAutocompleter(Autocompleter):
+    """A read-only Autocompleter that stores strings in a minimized DAWG.
+
+    Each value must be the string formed by joining its prefix sequence,
+    e.g. the value 'cat' with the prefix sequence ['c', 'a', 't'].
+
+    The states of the graph are numbered from 0 (the start state), and the
+    edges of each state are stored consecutively, in sorted order of label.
+
+    Representation Invariants:
+    - len(self._edge_starts) == len(self._counts) + 1
+    - len(self._edge_labels) == len(self._edge_targets) == len(self._edge_offsets)
+    - len(self._max_weights) == 2 * self._counts[0]
+    """
+    # Private Instance Attributes:
+    # - _tokens:
+    #     The distinct prefix elements (characters). Edge labels are stored
+    #     as indexes into this list.
+    # - _token_ids:
+    #     Maps each element of _tokens to its index.
+    # - _edge_starts:
+    #     The edges of state s are _edge_starts[s] to _edge_starts[s + 1] - 1.
+    # - _edge_labels, _edge_targets:
+    #     The label (token index) and the target state of each edge.
+    # - _edge_offsets:
+    #     For each edge of a state, the number of strings accepted from that
+    #     state that come before the strings through this edge in sorted
+    #     order: 1 if the state is accepting, plus the strings through the
+    #     state's earlier edges.
+    # - _counts:
+    #     The number of strings accepted from each state.
+    # - _max_weights:
+    #     A segment tree of the weights by ordinal: the weight of the string
+    #     with ordinal i is at _counts[0] + i, and node j < _counts[0] holds
+    #     the larger of nodes 2j and 2j + 1.
+    _tokens: list
+    _token_ids: dict[Any, int]
+    _edge_starts: array
+    _edge_labels: array
+    _edge_targets: array
+    _edge_offsets: array
+    _counts: array
+    _max_weights: array
+
+    def __init__(self) -> None:
+        """Initialize an empty DawgAutocompleter."""
+        self._tokens, self._token_ids = [], {}
+        self._edge_starts = array('I', [0, 0])
+        self._edge_labels, self._edge_targets = array('I'), array('I')
+        self._edge_offsets = array('I')
+        self._counts = array('I', [0])
+        self._max_weights = array('d')
+
+    @classmethod
+    def from_items(cls, items: Iterable[tuple[str, float, list]]) -> DawgAutocompleter:
+        """Return a DawgAutocompleter containing the given (value, weight,
+        prefix) items. The weights of repeated values are added together.
+
+        Every item must satisfy the preconditions of insert, and every value
+        must be ''.join of its prefix.
+        """
+        totals = {}
+        for value, weight, _ in items:
+            totals[value] = totals.get(value, 0.0) + weight
+        words = sorted(totals)
+
+        dawg = cls()
+        dawg._flatten(_build_graph(words))
+        dawg._build_weights([totals[word] for word in words])
+        return dawg
+
+    def _flatten(self, start: _State) -> None:
+        """Store the graph with start state <start> in this autocompleter's
+        arrays.
+        """
+        # Number the states in breadth-first order
+        numbers = {id(start): 0}
+        states = [start]
+        queue = deque([start])
+        while queue:
+            state = queue.popleft()
+            for child in state.edges.values():
+                if id(child) not in numbers:
+                    numbers[id(child)] = len(states)
+                    states.append(child)
+                    queue.append(child)
+
+        # Count the strings accepted from each state, children first
+        counts = [0] * len(states)
+        for state in _postorder(start):
+            counts[numbers[id(state)]] = int(state.final) + sum(
+                counts[numbers[id(target)]] for target in state.edges.values())
+
+        # Number the tokens in sorted order, so that the edges of each state
+        # are sorted by label
+        self._tokens = sorted({label for node in states for label in node.edges})
+        self._token_ids = {label: i for i, label in enumerate(self._tokens)}
+
+        self._edge_starts = array('I', [0])
+        self._counts = array('I', counts)
+        for state in states:
+            offset = int(state.final)
+            for token, child in state.edges.items():
+                self._edge_labels.append(self._token_ids[token])
+                self._edge_targets.append(numbers[id(child)])
+                self._edge_offsets.append(offset)
+                offset += counts[numbers[id(child)]]
+            self._edge_starts.append(len(self._edge_labels))
+
+    def _build_weights(self, weights: list[float]) -> None:
+        """Build the segment tree of <weights>, the weights of the strings
+        in sorted order.
+        """
+        n = len(weights)
+        self._max_weights = array('d', [0.0] * n + weights)
+        for node in range(n - 1, 0, -1):
+            self._max_weights[node] = max(self._max_weights[2 * node],
+                                          self._max_weights[2 * node + 1])
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this Autocompleter."""
+        return self._counts[0]
+
+    def insert(self, value: Any, weight: float, prefix: list) -> None:
+        """Raise NotImplementedError, since a DawgAutocompleter is read-only."""
+        raise NotImplementedError('DawgAutocompleter is read-only')
+
+    def remove(self, prefix: list) -> None:
+        """Raise NotImplementedError, since a DawgAutocompleter is read-only."""
+        raise NotImplementedError('DawgAutocompleter is read-only')
+
+    def autocomplete(self, prefix: list,
+                     limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        The return value is a list of tuples (value, weight), and must be
+        sorted by non-increasing weight. You can decide how to break ties.
+
+        If limit is None, return *every* match for the given prefix.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        position = self.cursor_start()
+        for token in prefix:
+            position = self.cursor_step(position, token)
+            if position is None:
+                return []
+        return self.cursor_complete(position, limit)
+
+    def autocomplete_fuzzy(self, prefix: list, max_edits: int, limit: int | None = None,
+                           penalty: float = FUZZY_PENALTY) -> list[tuple[Any, float]]:
+        """Return up to <limit> values whose prefix sequence starts with a
+        sequence within <max_edits> edits of <prefix>, as
+        SimplePrefixTree.autocomplete_fuzzy does.
+
+        Preconditions:
+        - max_edits >= 0
+        - limit is None or limit > 0
+        - 0 < penalty <= 1
+        """
+        # The search walks every path through the graph (not every state),
+        # so each position is a (state, first ordinal) pair, as for cursors
+        def children(position: tuple[int, int]) -> Iterator[tuple[list, tuple[int, int]]]:
+            state, first = position
+            return (([self._edge_labels[edge]],
+                     (self._edge_targets[edge], first + self._edge_offsets[edge]))
+                    for edge in range(self._edge_starts[state], self._edge_starts[state + 1]))
+
+        def leaves(position: tuple[int, int]) -> Iterator[tuple[int, Any, float]]:
+            state, first = position
+            n = self._counts[0]
+            return ((ordinal, self._string_of(ordinal), self._max_weights[n + ordinal])
+                    for ordinal in self._iter_best_first(first, first + self._counts[state]))
+
+        if len(self) == 0:
+            return []
+        ids = [self._token_ids.get(token, -1) for token in prefix]
+        roots = _fuzzy_roots(self.cursor_start(), [], ids, max_edits, children)
+        return _merge_fuzzy([(edits, leaves(position)) for edits, position in roots],
+                            penalty, limit)
+
+    def _iter_best_first(self, lo: int, hi: int) -> Iterator[int]:
+        """Yield the ordinals from <lo> to <hi> - 1, in non-increasing order
+        of weight.
+        """
+        n, max_weights = self._counts[0], self._max_weights
+        # Entries are (-weight, -node): among nodes of equal weight, deeper
+        # nodes (which have larger numbers) come first, so that ties lead
+        # straight down to a leaf instead of expanding the whole range.
+        # Start from the segment tree nodes that exactly cover lo to hi - 1.
+        heap = []
+        lo, hi = lo + n, hi + n
+        while lo < hi:
+            if lo % 2 == 1:
+                heap.append((-max_weights[lo], -lo))
+                lo += 1
+            if hi % 2 == 1:
+                hi -= 1
+                heap.append((-max_weights[hi], -hi))
+            lo, hi = lo // 2, hi // 2
+        heapq.heapify(heap)
+
+        while heap:
+            _, node = heapq.heappop(heap)
+            node = -node
+            if node >= n:
+                yield node - n
+            else:
+                heapq.heappush(heap, (-max_weights[2 * node], -2 * node))
+                heapq.heappush(heap, (-max_weights[2 * node + 1], -2 * node - 1))
+
+    def _string_of(self, ordinal: int) -> str:
+        """Return the string with the given ordinal, by walking down from
+        the start state to the edge whose strings include it.
+        """
+        state, rank, tokens = 0, ordinal, []
+        while True:
+            start, end = self._edge_starts[state], self._edge_starts[state + 1]
+            # A state is accepting if its first string comes before its edges
+            if rank == 0 and (start == end or self._edge_offsets[start] == 1):
+                return ''.join(tokens)
+
+            edge = bisect_right(self._edge_offsets, rank, start, end) - 1
+            rank -= self._edge_offsets[edge]
+            tokens.append(self._tokens[self._edge_labels[edge]])
+            state = self._edge_targets[edge]
+
+    ###########################################################################
+    # Cursors
+    ###########################################################################
+    def cursor(self) -> PrefixCursor:
+        """Return a cursor over this autocompleter, at the empty prefix."""
+        return PrefixCursor(self)
+
+    def cursor_start(self) -> tuple[int, int]:
+        """Return the position of a cursor at the empty prefix.
+
+        A cursor position is (state, ordinal): the state reached by the
+        cursor's prefix, and the ordinal of the first string that starts
+        with the prefix.
+        """
+        return 0, 0
+
+    def cursor_step(self, position: tuple[int, int],
+                    token: Any) -> tuple[int, int] | None:
+        """Return the position of a cursor at <position> after <token> is
+        appended to its prefix, or None if no value matches the new prefix.
+        """
+        if token not in self._token_ids:
+            return None
+        token_id = self._token_ids[token]
+        state, first = position
+        start, end = self._edge_starts[state], self._edge_starts[state + 1]
+        edge = bisect_left(self._edge_labels, token_id, start, end)
+        if edge == end or self._edge_labels[edge] != token_id:
+            return None
+        return self._edge_targets[edge], first + self._edge_offsets[edge]
+
+    def cursor_complete(self, position: tuple[int, int],
+                        limit: int | None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the prefix of a cursor at
+        <position>, as autocomplete does.
+        """
+        state, first = position
+        n = self._counts[0]
+        return [(self._string_of(ordinal), self._max_weights[n + ordinal])
+                for ordinal in islice(self._iter_best_first(first, first + self._counts[state]),
+                                      limit)]
+
+
+class _State:
+    """A state of a DAWG while it is being built.
+
+    Instance Attributes:
+    - edges: the states reached from this state, keyed by label, in sorted
+      order of label
+    - final: whether this state is accepting
+    """
+    edges: dict[Any, _State]
+    final: bool
+
+    __slots__: tuple[str, ...] = ('edges', 'final')
+
+    def __init__(self) -> None:
+        """Initialize a non-accepting state with no edges."""
+        self.edges = {}
+        self.final = False
+
+
+def _build_graph(words: list[str]) -> _State:
+    """Return the start state of a minimized DAWG that accepts exactly the
+    strings in <words>, which are distinct and in sorted order.
+
+    The graph is built with the incremental algorithm of Daciuk et al. for
+    sorted input: each string is added to the graph, and the states that no
+    later string can reach are replaced by an equivalent registered state,
+    if there is one, as soon as the string is added.
+    """
+    start = _State()
+    register = {}
+    # The edges to the states of the previous word that are not yet
+    # registered, from the start state downwards
+    unchecked = []
+    previous = ''
+    for word in words:
+        common = 0
+        while common < min(len(word), len(previous)) and word[common] == previous[common]:
+            common += 1
+        _replace_or_register(unchecked, register, common)
+
+        state = unchecked[-1][2] if unchecked else start
+        for token in word[common:]:
+            child = _State()
+            state.edges[token] = child
+            unchecked.append((state, token, child))
+            state = child
+        state.final = True
+        previous = word
+    _replace_or_register(unchecked, register, 0)
+    return start
+
+
+def _replace_or_register(unchecked: list[tuple[_State, Any, _State]],
+                         register: dict[tuple, _State], down_to: int) -> None:
+    """Replace each state at the end of the edges in <unchecked>, from the
+    last one back to the one at index <down_to>, by the equivalent state in
+    <register> if there is one, and register it otherwise.
+
+    Two states are equivalent if they are both accepting or both not, and
+    their edges have the same labels and targets. Since the deeper states are
+    replaced first, this finds every pair of states that accept the same
+    strings.
+    """
+    while len(unchecked) > down_to:
+        parent, token, child = unchecked.pop()
+        key = (child.final, tuple((label, id(target)) for label, target in child.edges.items()))
+        if key in register:
+            parent.edges[token] = register[key]
+        else:
+            register[key] = child
+
+
+def _postorder(start: _State) -> Iterator[_State]:
+    """Yield each state reachable from <start> once, after every state
+    reachable from it.
+    """
+    seen = {id(start)}
+    stack = [(start, iter(start.edges.values()))]
+    while stack:
+        state, children = stack[-1]
+        for child in children:
+            if id(child) not in seen:
+                seen.add(id(child))
+                stack.append((child, iter(child.edges.values())))
+                break
+        else:
+            stack.pop()
+            yield state
@@ -0,0 +1,153 @@
+"""CSC148 Assignment 2: Federated autocomplete engine
+
+=== Module Description ===
+This file contains FederatedAutocompleteEngine, which answers autocomplete
+queries from several named sources, each an Autocompleter (for example, one
+prefix tree per data source) whose weights are scaled by its own multiplier.
+
+A query asks every source for its matches in order of weight, and merges
+these streams with a heap, so each source only finds as many matches as
+make it into the overall top <limit> (plus one each). Since every source is
+a separate Autocompleter, one source can be rebuilt and swapped in with
+replace_source without touching the others.
+"""
+from __future__ import annotations
+import heapq
+from typing import Any, Iterator, Sequence
+
+from a2_prefix_tree import Autocompleter
+from a2_validation import check_contracts
+
+
+@check_contracts
+class FederatedAutocompleteEngine:
+    """An autocomplete engine whose matches come from several named sources.
+
+    Each source is an Autocompleter and a weight multiplier; the weight of
+    each match from a source is multiplied by that source's multiplier. All
+    sources must use the same kind of prefix sequence (e.g., lists of
+    letters). A value found in several sources is returned once, with its
+    highest multiplied weight, so values must be hashable.
+
+    SimplePrefixTree, CompressedPrefixTree and FrozenPrefixTree sources find
+    their matches lazily (see Autocompleter.iter_autocomplete); any other
+    Autocompleter finds all of its matches for each query.
+
+    Representation Invariants:
+    - all(multiplier > 0 for _, multiplier in self._sources.values())
+    """
+    # Private Instance Attributes:
+    # - _sources:
+    #     Maps the name of each source to its autocompleter and weight
+    #     multiplier, in the order the sources were added.
+    _sources: dict[str, tuple[Autocompleter, float]]
+
+    def __init__(self) -> None:
+        """Initialize an engine with no sources."""
+        self._sources = {}
+
+    def __len__(self) -> int:
+        """Return the total number of values stored in the sources of this
+        engine (counting a value once for each source it is in).
+        """
+        return sum(len(autocompleter) for autocompleter, _ in self._sources.values())
+
+    def source_names(self) -> list[str]:
+        """Return the names of the sources of this engine, in the order they
+        were added.
+        """
+        return list(self._sources)
+
+    def source(self, name: str) -> tuple[Autocompleter, float]:
+        """Return the autocompleter and weight multiplier of source <name>.
+
+        Raise KeyError if this engine has no source named <name>.
+        """
+        return self._sources[name]
+
+    def add_source(self, name: str, autocompleter: Autocompleter,
+                   multiplier: float = 1.0) -> None:
+        """Add a source named <name> to this engine.
+
+        Raise ValueError if this engine already has a source named <name>.
+
+        Preconditions:
+        - multiplier > 0
+        """
+        if name in self._sources:
+            raise ValueError(f'there is already a source named {name!r}')
+        self._sources[name] = (autocompleter, multiplier)
+
+    def replace_source(self, name: str, autocompleter: Autocompleter,
+                       multiplier: float | None = None) -> Autocompleter:
+        """Replace the autocompleter of source <name> with <autocompleter>, and
+        return the autocompleter it replaces. The source keeps its multiplier
+        unless a new one is given.
+
+        The new autocompleter should be fully built before it is swapped in:
+        the swap is one assignment, so a query sees either the old
+        autocompleter or the new one, and the other sources are unaffected.
+
+        Raise KeyError if this engine has no source named <name>.
+
+        Preconditions:
+        - multiplier is None or multiplier > 0
+        """
+        old, old_multiplier = self._sources[name]
+        self._sources[name] = (autocompleter,
+                               old_multiplier if multiplier is None else multiplier)
+        return old
+
+    def set_multiplier(self, name: str, multiplier: float) -> None:
+        """Set the weight multiplier of source <name> to <multiplier>.
+
+        Raise KeyError if this engine has no source named <name>.
+
+        Preconditions:
+        - multiplier > 0
+        """
+        self._sources[name] = (self._sources[name][0], multiplier)
+
+    def remove_source(self, name: str) -> Autocompleter:
+        """Remove source <name> from this engine, and return its autocompleter.
+
+        Raise KeyError if this engine has no source named <name>.
+        """
+        return self._sources.pop(name)[0]
+
+    def autocomplete(self, prefix: Sequence,
+                     limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix from the sources
+        of this engine.
+
+        The return value is a list of tuples (value, weight), where weight is
+        the value's weight in a source times that source's multiplier, sorted
+        by non-increasing weight. Each value is returned once, with its
+        highest weight.
+
+        If limit is None, return *every* match for the given prefix.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        # Scaling by a positive multiplier keeps each stream in order
+        streams = [_scaled(autocompleter.iter_autocomplete(prefix), multiplier)
+                   for autocompleter, multiplier in list(self._sources.values())]
+        seen = set()
+        results = []
+        for value, weight in heapq.merge(*streams, key=lambda match: match[1],
+                                         reverse=True):
+            if value not in seen:
+                seen.add(value)
+                results.append((value, weight))
+                if len(results) == limit:
+                    break
+        return results
+
+
+def _scaled(matches: Iterator[tuple[Any, float]],
+            multiplier: float) -> Iterator[tuple[Any, float]]:
+    """Yield each of <matches> with its weight multiplied by <multiplier>."""
+    if multiplier == 1:
+        return matches
+    return ((value, weight * multiplier) for value, weight in matches)
@@ -0,0 +1,444 @@
+"""CSC148 Assignment 2: Frozen prefix trees
+
+=== Module Description ===
+This file contains FrozenPrefixTree, a read-only copy of a SimplePrefixTree
+or CompressedPrefixTree that stores the whole tree in a few flat arrays, and
+the LOUDS bit vector that stores its shape. FrozenPrefixTrees can be saved
+to and loaded from snapshot files (see a2_snapshot).
+"""
+from __future__ import annotations
+import heapq
+from array import array
+from bisect import bisect_right
+from collections import deque
+from itertools import islice
+from typing import Any, Iterator, Sequence
+
+from a2_autocompleter import FUZZY_PENALTY, Autocompleter, PrefixCursor, _fuzzy_roots, \
+    _merge_fuzzy
+from a2_prefix_tree import SimplePrefixTree
+from a2_validation import check_contracts
+
+# The words of a FrozenPrefixTree's LOUDS bit vector
+_WORD_BITS = 64
+_WORD_MASK = (1 << _WORD_BITS) - 1
+
+# The number of 0 bits in each byte, and the position of its kth 0 bit (at
+# index byte * 8 + k), so that select0 can skip a byte at a time
+_BYTE_ZEROS = bytes(8 - byte.bit_count() for byte in range(256))
+_BYTE_SELECT0 = bytes(position for byte in range(256) for position in
+                      [i for i in range(8) if not byte >> i & 1] + [0] * byte.bit_count())
+
+
+@check_contracts
+class FrozenPrefixTree(Autocompleter):
+    """A read-only copy of a SimplePrefixTree or CompressedPrefixTree, stored
+    in a few flat arrays instead of one Python object per tree.
+
+    autocomplete returns the same matches as the tree this was built from;
+    insert and remove are not supported.
+
+    The trees of the original tree are numbered in breadth-first order: the
+    whole tree is number 0, and the subtrees of each tree get consecutive
+    numbers, heaviest leaf first (see _best).
+
+    The shape of the tree is stored as a LOUDS bit vector (level-order unary
+    degree sequence): for each tree in order, one 1 bit per subtree followed
+    by a 0 bit. The subtrees of tree i are then found with select0 on the
+    bit vector, which takes about 3 bits per tree instead of two ints.
+
+    Representation Invariants:
+    - len(self._best) == len(self._value_ids) == len(self._label_starts) - 1
+    - len(self._zero_ranks) == len(self._louds) + 1
+    """
+    # Private Instance Attributes:
+    # - _tokens:
+    #     The distinct prefix elements in the tree. Edge labels are stored as
+    #     indexes into this list.
+    # - _token_ids:
+    #     Maps each element of _tokens to its index.
+    # - _values:
+    #     The values stored in the tree.
+    # - _labels, _label_starts:
+    #     The label of tree i (the elements of its root that are not in the
+    #     root of its parent; empty for leaves) is stored in
+    #     _labels[_label_starts[i]:_label_starts[i + 1]].
+    # - _best:
+    #     The weight of the heaviest leaf in tree i (so the weight of tree i,
+    #     if it is a leaf). The subtrees of each tree are numbered in
+    #     non-increasing order of _best, and the best-first search is
+    #     ordered by it.
+    # - _value_ids:
+    #     The index in _values of the value of tree i if it is a leaf, else -1.
+    # - _louds:
+    #     The LOUDS bit vector, 64 bits per word, lowest bit first.
+    # - _zero_ranks:
+    #     The number of 0 bits in _louds before each word (and in all of
+    #     _louds, last), used by select0.
+    #
+    # _values and the arrays are lists and arrays in a tree built from another
+    # tree, but an EncodedSequence and memoryviews of the file in a tree loaded
+    # from a snapshot (see a2_snapshot).
+    _tokens: list
+    _token_ids: dict[Any, int]
+    _values: Sequence
+    _labels: Sequence
+    _label_starts: Sequence
+    _best: Sequence
+    _value_ids: Sequence
+    _louds: Sequence
+    _zero_ranks: Sequence
+
+    __slots__: tuple[str, ...] = ('_tokens', '_token_ids', '_values', '_labels',
+                                  '_label_starts', '_best', '_value_ids', '_louds',
+                                  '_zero_ranks')
+
+    def __init__(self, tree: SimplePrefixTree) -> None:
+        """Initialize a frozen copy of <tree>.
+        """
+        self._tokens, self._token_ids, self._values = [], {}, []
+        self._labels, self._label_starts = array('I'), array('I', [0])
+        self._best = array('d')
+        self._value_ids = array('i')
+
+        best = _best_leaf_weights(tree)
+        bits = _BitVectorBuilder()
+        # Entries are (tree, label)
+        queue = deque([(tree, tree.root)])
+        while queue:
+            node, label = queue.popleft()
+            self._best.append(best[id(node)])
+            for token in label:
+                if token not in self._token_ids:
+                    self._token_ids[token] = len(self._tokens)
+                    self._tokens.append(token)
+                self._labels.append(self._token_ids[token])
+            self._label_starts.append(len(self._labels))
+
+            if node.is_leaf():
+                self._value_ids.append(len(self._values))
+                self._values.append(node.root)
+                bits.append_degree(0)
+                continue
+
+            self._value_ids.append(-1)
+            bits.append_degree(len(node.subtrees))
+            for subtree in sorted(node.subtrees, key=lambda t: best[id(t)], reverse=True):
+                queue.append((subtree, [] if subtree.is_leaf() else node._label_of(subtree)))
+
+        self._louds, self._zero_ranks = bits.finish()
+
+    @classmethod
+    def _from_columns(cls, columns: dict[str, Any]) -> FrozenPrefixTree:
+        """Return a FrozenPrefixTree with the given private attributes (keyed
+        by name, without the leading underscore). The arrays may be any
+        sequences of ints/floats that support slicing, such as memoryviews.
+        """
+        tree = cls.__new__(cls)
+        for name in cls.__slots__:
+            setattr(tree, name, columns[name[1:]])
+        return tree
+
+    def _columns(self) -> dict[str, Any]:
+        """Return the private attributes of this tree, keyed by name without
+        the leading underscore. The inverse of _from_columns.
+        """
+        return {name[1:]: getattr(self, name) for name in self.__slots__}
+
+    ###########################################################################
+    # Snapshots
+    ###########################################################################
+    def save(self, path: str) -> None:
+        """Write this tree to a snapshot file at <path>.
+
+        The snapshot can be loaded back with FrozenPrefixTree.load.
+        """
+        from a2_snapshot import write_snapshot
+        write_snapshot(self, path)
+
+    @staticmethod
+    def load(path: str) -> FrozenPrefixTree:
+        """Return the tree stored in the snapshot file at <path>.
+
+        The file is memory-mapped rather than read: the tree's arrays are
+        views of the file, and each value is only decoded when it is returned
+        by autocomplete.
+        """
+        from a2_snapshot import read_snapshot
+        return read_snapshot(path)[0]
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this Autocompleter."""
+        return len(self._values)
+
+    def insert(self, value: Any, weight: float, prefix: Sequence) -> None:
+        """Raise NotImplementedError, since a FrozenPrefixTree is read-only."""
+        raise NotImplementedError('FrozenPrefixTree is read-only')
+
+    def remove(self, prefix: Sequence) -> None:
+        """Raise NotImplementedError, since a FrozenPrefixTree is read-only."""
+        raise NotImplementedError('FrozenPrefixTree is read-only')
+
+    def autocomplete(self, prefix: Sequence,
+                     limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        The return value is a list of tuples (value, weight), and must be
+        sorted by non-increasing weight. You can decide how to break ties.
+
+        If limit is None, return *every* match for the given prefix.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        number = self._look_up_prefix(prefix)
+        if number == -1:
+            return []
+        return list(islice(self._iter_best_first(number), limit))
+
+    def iter_autocomplete(self, prefix: Sequence) -> Iterator[tuple[Any, float]]:
+        """Yield (value, weight) for every match for the given prefix, in
+        non-increasing order of weight, finding each one only when it is
+        asked for.
+        """
+        number = self._look_up_prefix(prefix)
+        return iter(()) if number == -1 else self._iter_best_first(number)
+
+    def autocomplete_fuzzy(self, prefix: Sequence, max_edits: int, limit: int | None = None,
+                           penalty: float = FUZZY_PENALTY) -> list[tuple[Any, float]]:
+        """Return up to <limit> values whose prefix sequence starts with a
+        sequence within <max_edits> edits of <prefix>, as
+        SimplePrefixTree.autocomplete_fuzzy does.
+
+        Preconditions:
+        - max_edits >= 0
+        - limit is None or limit > 0
+        - 0 < penalty <= 1
+        """
+        labels, starts, value_ids = self._labels, self._label_starts, self._value_ids
+
+        def children(number: int) -> Iterator[tuple[array, int]]:
+            return ((labels[starts[child]:starts[child + 1]], child)
+                    for child in self._children(number) if value_ids[child] == -1)
+
+        def leaves(number: int) -> Iterator[tuple[int, Any, float]]:
+            return ((leaf, self._values[value_ids[leaf]], self._best[leaf])
+                    for leaf in self._iter_best_leaves(number))
+
+        if not self._values:
+            return []
+        # Labels are token ids; elements of <prefix> that are not in this tree
+        # match no label
+        ids = [self._token_ids.get(token, -1) for token in prefix]
+        roots = _fuzzy_roots(0, labels[starts[0]:starts[1]], ids, max_edits, children)
+        return _merge_fuzzy([(edits, leaves(number)) for edits, number in roots],
+                            penalty, limit)
+
+    def cursor(self) -> PrefixCursor:
+        """Return a cursor over this tree, at the empty prefix."""
+        return PrefixCursor(self)
+
+    def cursor_start(self) -> tuple[int, int]:
+        """Return the position of a cursor over this tree at the empty prefix.
+
+        A cursor position in this tree is (number, matched): the number of
+        the highest tree whose root starts with the cursor's prefix, and how
+        many elements of that tree's label are in the prefix.
+        """
+        return 0, 0
+
+    def cursor_step(self, position: tuple[int, int],
+                    token: Any) -> tuple[int, int] | None:
+        """Return the position of a cursor at <position> after <token> is
+        appended to its prefix, or None if no value matches the new prefix.
+        """
+        if token not in self._token_ids:
+            return None
+        token_id = self._token_ids[token]
+        number, matched = position
+        start = self._label_starts[number]
+        if matched < self._label_starts[number + 1] - start:
+            return (number, matched + 1) if self._labels[start + matched] == token_id else None
+
+        child = self._child(number, token_id)
+        return None if child == -1 else (child, 1)
+
+    def cursor_complete(self, position: tuple[int, int],
+                        limit: int | None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the prefix of a cursor at
+        <position>, as autocomplete does.
+        """
+        return list(islice(self._iter_best_first(position[0]), limit))
+
+    def _look_up_prefix(self, prefix: list) -> int:
+        """Return the number of the highest tree whose root starts with
+        <prefix>, or -1 if no value matches <prefix>.
+        """
+        ids = array('I')
+        for token in prefix:
+            if token not in self._token_ids:
+                return -1
+            ids.append(self._token_ids[token])
+
+        labels, starts = self._labels, self._label_starts
+        number, matched = 0, 0
+        while True:
+            start = starts[number]
+            n = min(starts[number + 1] - start, len(ids) - matched)
+            if labels[start:start + n] != ids[matched:matched + n]:
+                return -1
+            matched += n
+            if matched == len(ids):
+                return number
+
+            number = self._child(number, ids[matched])
+            if number == -1:
+                return -1
+
+    def _children(self, number: int) -> range:
+        """Return the numbers of the subtrees of tree <number>."""
+        # The subtrees of tree i are the 1 bits between the (i - 1)th and the
+        # ith 0 bit, and the 1 bits before them stand for trees 1, 2, ...
+        start = 0 if number == 0 else self._select0(number - 1) + 1
+
+        # The ith 0 bit is the first 0 bit from start
+        word, offset = divmod(start, _WORD_BITS)
+        zeros = (~self._louds[word] & _WORD_MASK) >> offset
+        while not zeros:
+            word, offset = word + 1, 0
+            zeros = ~self._louds[word] & _WORD_MASK
+        end = word * _WORD_BITS + offset + (zeros & -zeros).bit_length() - 1
+
+        first = start - number + 1
+        return range(first, first + end - start)
+
+    def _child(self, number: int, token_id: int) -> int:
+        """Return the number of the non-leaf subtree of tree <number> whose
+        label starts with the token <token_id>, or -1 if there is none.
+        """
+        labels, starts, value_ids = self._labels, self._label_starts, self._value_ids
+        for child in self._children(number):
+            if value_ids[child] == -1 and labels[starts[child]] == token_id:
+                return child
+        return -1
+
+    def _select0(self, k: int) -> int:
+        """Return the position in self._louds of its 0 bit number <k>
+        (counting from 0).
+        """
+        # The last word whose preceding 0 bits number at most k holds it
+        word = bisect_right(self._zero_ranks, k) - 1
+        k -= self._zero_ranks[word]
+        bits = self._louds[word]
+        for shift in range(0, _WORD_BITS, 8):
+            byte = (bits >> shift) & 0xFF
+            if k < _BYTE_ZEROS[byte]:
+                return word * _WORD_BITS + shift + _BYTE_SELECT0[byte * 8 + k]
+            k -= _BYTE_ZEROS[byte]
+        raise IndexError('select0 index out of range')
+
+    def _iter_best_first(self, number: int) -> Iterator[tuple[Any, float]]:
+        """Yield (value, weight) for every leaf in tree <number>, in
+        non-increasing order of weight.
+        """
+        for leaf in self._iter_best_leaves(number):
+            yield self._values[self._value_ids[leaf]], self._best[leaf]
+
+    def _iter_best_leaves(self, number: int) -> Iterator[int]:
+        """Yield the number of every leaf in tree <number>, in non-increasing
+        order of weight.
+
+        Like SimplePrefixTree._iter_best_first, but ordered by the weight of
+        each tree's heaviest leaf, which is exact: every tree that is popped
+        yields a leaf or leads to one that is yielded next.
+        """
+        best, value_ids = self._best, self._value_ids
+        if value_ids[number] != -1:
+            yield number
+            return
+
+        # Entries are (-best weight, -tree, last tree in its siblings): among
+        # trees with equal best weights, deeper trees (which have larger
+        # numbers) come first, so that ties lead straight down to a leaf
+        heap = []
+        children = self._children(number)
+        if children:
+            heap.append((-best[children.start], -children.start, children.stop - 1))
+        while heap:
+            _, number, last = heapq.heappop(heap)
+            number = -number
+            if number != last:
+                heapq.heappush(heap, (-best[number + 1], -number - 1, last))
+
+            if value_ids[number] != -1:
+                yield number
+            else:
+                children = self._children(number)
+                if children:
+                    heapq.heappush(heap, (-best[children.start], -children.start,
+                                          children.stop - 1))
+
+
+def _best_leaf_weights(tree: SimplePrefixTree) -> dict[int, float]:
+    """Return the weight of the heaviest leaf in each tree in <tree>, keyed
+    by the id of the tree.
+    """
+    best = {}
+    stack = [(tree, False)]
+    while stack:
+        tree, closing = stack.pop()
+        if tree.is_leaf():
+            best[id(tree)] = tree.weight
+        elif closing:
+            best[id(tree)] = max((best[id(subtree)] for subtree in tree.subtrees), default=0.0)
+        else:
+            stack.append((tree, True))
+            stack.extend((subtree, False) for subtree in tree.subtrees)
+    return best
+
+
+class _BitVectorBuilder:
+    """Builds a LOUDS bit vector and its select0 directory from the degrees
+    of the trees, in order (see FrozenPrefixTree).
+    """
+    # Private Instance Attributes:
+    # - _words: the finished words of the bit vector
+    # - _zero_ranks: the number of 0 bits before each finished word
+    # - _word: the unfinished word, and _used: how many bits of it are used
+    # - _zeros: the number of 0 bits appended so far
+    _words: array
+    _zero_ranks: array
+    _word: int
+    _used: int
+    _zeros: int
+
+    def __init__(self) -> None:
+        """Initialize an empty bit vector."""
+        self._words, self._zero_ranks = array('Q'), array('I')
+        self._word = self._used = self._zeros = 0
+
+    def append_degree(self, degree: int) -> None:
+        """Append <degree> 1 bits and a 0 bit."""
+        for bit in [1] * degree + [0]:
+            if self._used == _WORD_BITS:
+                self._flush()
+            self._word |= bit << self._used
+            self._used += 1
+        self._zeros += 1
+
+    def finish(self) -> tuple[array, array]:
+        """Return the bit vector, and the number of 0 bits before each of its
+        words (and in all of it, last).
+        """
+        # The last word is padded with 1 bits, which select0 never reaches
+        self._word |= _WORD_MASK ^ ((1 << self._used) - 1)
+        self._used = _WORD_BITS
+        self._flush()
+        self._zero_ranks.append(self._zeros)
+        return self._words, self._zero_ranks
+
+    def _flush(self) -> None:
+        """Move the unfinished word to the finished words."""
+        self._zero_ranks.append(self._zeros - (self._used - self._word.bit_count()))
+        self._words.append(self._word)
+        self._word = self._used = 0
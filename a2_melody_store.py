@@ -0,0 +1,275 @@
+"""CSC148 Assignment 2: Melody store
+
+=== Module Description ===
+This file contains MelodyStore, a read-only Autocompleter for melodies whose
+prefix sequence is their interval sequence (as in the
+MelodyAutocompleteEngine). Rather than one Melody object per melody, it
+stores the melodies in columns: the pitches and durations of every note in
+two contiguous NumPy arrays, the interval sequences in a third, and the
+offset of each melody into them. A Melody object is only made for each
+melody that a query returns.
+
+Queries compare a prefix against the intervals of every melody at once, one
+interval position at a time, keeping the melodies that still match. This
+also allows matching with a tolerance: the melodies whose intervals are each
+within some number of semitones of the prefix's (see
+MelodyStore.autocomplete_within).
+"""
+from __future__ import annotations
+from array import array
+from typing import Any, Iterable
+
+import numpy as np
+
+from a2_melody import Melody
+from a2_autocompleter import FUZZY_PENALTY, Autocompleter, PrefixCursor
+from a2_validation import check_contracts
+
+
+@check_contracts
+class MelodyStore(Autocompleter):
+    """A read-only Autocompleter that stores melodies in NumPy arrays.
+
+    The melodies are numbered in non-increasing order of weight, so that a
+    filtered array of melody numbers is already sorted for autocomplete.
+
+    Representation Invariants:
+    - len(self._names) == len(self._weights) == len(self._note_starts) - 1
+    - self._note_starts[0] == 0
+    - len(self._pitches) == len(self._durations) == self._note_starts[-1]
+    - len(self._intervals) == len(self._pitches) - len(self._names)
+    """
+    # Private Instance Attributes:
+    # - _names:
+    #     The name of each melody.
+    # - _weights:
+    #     The weight of each melody, in non-increasing order.
+    # - _note_starts:
+    #     The notes of melody i are at _note_starts[i] to
+    #     _note_starts[i + 1] - 1 in _pitches and _durations.
+    # - _pitches, _durations:
+    #     The pitch and duration of every note.
+    # - _intervals:
+    #     The interval sequence of every melody, one after the other. The
+    #     intervals of melody i start at _note_starts[i] - i, since every
+    #     melody has one fewer interval than notes.
+    # - _interval_starts, _interval_counts:
+    #     The start and length of the interval sequence of each melody.
+    _names: list[str]
+    _weights: np.ndarray
+    _note_starts: np.ndarray
+    _pitches: np.ndarray
+    _durations: np.ndarray
+    _intervals: np.ndarray
+    _interval_starts: np.ndarray
+    _interval_counts: np.ndarray
+
+    def __init__(self) -> None:
+        """Initialize an empty MelodyStore."""
+        self._names = []
+        self._weights = np.zeros(0)
+        self._note_starts = np.zeros(1, dtype=np.int64)
+        self._pitches = self._durations = self._intervals = np.zeros(0, dtype=np.int8)
+        self._interval_starts = self._interval_counts = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[str, list[tuple[int, int]], float]]) -> MelodyStore:
+        """Return a MelodyStore containing a melody for each of the given
+        (name, notes, weight) rows, where notes is a list of (pitch,
+        duration) pairs.
+
+        Preconditions:
+        - every row has at least one note
+        - every weight > 0
+        """
+        names, weights, note_starts = [], array('d'), array('q', [0])
+        pitches, durations = array('q'), array('q')
+        for name, notes, weight in rows:
+            names.append(name)
+            weights.append(weight)
+            for pitch, duration in notes:
+                pitches.append(pitch)
+                durations.append(duration)
+            note_starts.append(len(pitches))
+
+        store = cls()
+        store._names = names
+        store._weights = np.frombuffer(weights, dtype=np.float64)
+        store._note_starts = np.frombuffer(note_starts, dtype=np.int64)
+        store._pitches = np.frombuffer(pitches, dtype=np.int64)
+        store._durations = np.frombuffer(durations, dtype=np.int64)
+        store._sort_by_weight()
+
+        # Every interval is a difference of consecutive pitches, except the
+        # differences across the boundary between two melodies
+        boundaries = store._note_starts[1:-1] - 1
+        store._intervals = _narrowest(np.delete(np.diff(store._pitches), boundaries))
+        store._pitches = _narrowest(store._pitches)
+        store._durations = _narrowest(store._durations)
+        n = len(names)
+        store._interval_starts = store._note_starts[:-1] - np.arange(n)
+        store._interval_counts = np.diff(store._note_starts) - 1
+        return store
+
+    def _sort_by_weight(self) -> None:
+        """Renumber the melodies of this store in non-increasing order of
+        weight (keeping the order of melodies of equal weight).
+        """
+        if np.all(self._weights[:-1] >= self._weights[1:]):
+            return
+        order = np.argsort(-self._weights, kind='stable')
+        lengths = np.diff(self._note_starts)[order]
+        note_starts = np.concatenate(([0], np.cumsum(lengths)))
+        # The new position of each note is a run of its melody's new start
+        notes = np.repeat(self._note_starts[:-1][order] - note_starts[:-1], lengths) \
+            + np.arange(note_starts[-1])
+        self._names = [self._names[i] for i in order]
+        self._weights = self._weights[order]
+        self._note_starts = note_starts
+        self._pitches = self._pitches[notes]
+        self._durations = self._durations[notes]
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this Autocompleter."""
+        return len(self._names)
+
+    def insert(self, value: Any, weight: float, prefix: list) -> None:
+        """Raise NotImplementedError, since a MelodyStore is read-only."""
+        raise NotImplementedError('MelodyStore is read-only')
+
+    def remove(self, prefix: list) -> None:
+        """Raise NotImplementedError, since a MelodyStore is read-only."""
+        raise NotImplementedError('MelodyStore is read-only')
+
+    def autocomplete(self, prefix: list,
+                     limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        The return value is a list of tuples (value, weight), and must be
+        sorted by non-increasing weight. You can decide how to break ties.
+
+        If limit is None, return *every* match for the given prefix.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        return self.autocomplete_within(prefix, 0, limit)
+
+    def autocomplete_within(self, prefix: list[int], tolerance: int | list[int],
+                            limit: int | None = None) -> list[tuple[Melody, float]]:
+        """Return up to <limit> (melody, weight) tuples for the melodies whose
+        first len(prefix) intervals are each within <tolerance> semitones of
+        the corresponding interval of <prefix>, sorted by non-increasing
+        weight.
+
+        <tolerance> is either one tolerance for every interval, or a list of
+        tolerances, one for each interval of <prefix>.
+
+        Preconditions:
+        - tolerance >= 0, or every element of tolerance >= 0
+        - tolerance is an int, or len(tolerance) == len(prefix)
+        - limit is None or limit > 0
+        """
+        tolerances = np.broadcast_to(np.asarray(tolerance), (len(prefix),))
+        matches = self.cursor_start()[0]
+        for depth, interval in enumerate(prefix):
+            matches = self._filter(matches, depth, interval, tolerances[depth])
+        return self.cursor_complete((matches, len(prefix)), limit)
+
+    def autocomplete_fuzzy(self, prefix: list, max_edits: int, limit: int | None = None,
+                           penalty: float = FUZZY_PENALTY) -> list[tuple[Any, float]]:
+        """Return up to <limit> values whose prefix sequence starts with a
+        sequence within <max_edits> edits of <prefix>, as
+        SimplePrefixTree.autocomplete_fuzzy does.
+
+        Preconditions:
+        - max_edits >= 0
+        - limit is None or limit > 0
+        - 0 < penalty <= 1
+        """
+        # Compute the edit distance from <prefix> to each start of every
+        # melody's intervals at once: row[:, i] is the distance from
+        # prefix[:i] to the first j intervals of each melody, for j = 0, 1, ...
+        # A melody's edits are the least row[:, -1] over every j it has.
+        n, k = len(self), len(prefix)
+        row = np.tile(np.arange(k + 1), (n, 1))
+        edits = row[:, k].copy()
+        for j in range(k + max_edits):
+            has_interval = self._interval_counts > j
+            interval = np.zeros(n, dtype=np.int64)
+            interval[has_interval] = self._intervals[self._interval_starts[has_interval] + j]
+            next_row = np.empty_like(row)
+            next_row[:, 0] = j + 1
+            for i in range(1, k + 1):
+                next_row[:, i] = np.minimum(np.minimum(row[:, i], next_row[:, i - 1]) + 1,
+                                            row[:, i - 1] + (interval != prefix[i - 1]))
+            row = np.where(has_interval[:, None], next_row, row)
+            edits = np.minimum(edits, row[:, k])
+
+        matches = np.flatnonzero(edits <= max_edits)
+        scores = self._weights[matches] * penalty ** edits[matches]
+        matches = matches[np.argsort(-scores, kind='stable')][:limit]
+        return [(self._melody(i), weight)
+                for i, weight in zip(matches.tolist(), self._weights[matches].tolist())]
+
+    def _filter(self, matches: np.ndarray, depth: int, interval: int,
+                tolerance: int) -> np.ndarray:
+        """Return the melodies in <matches> that have an interval at index
+        <depth>, within <tolerance> of <interval>, in the same order.
+        """
+        matches = matches[self._interval_counts[matches] > depth]
+        found = self._intervals[self._interval_starts[matches] + depth]
+        return matches[np.abs(found.astype(np.int64) - interval) <= tolerance]
+
+    def _melody(self, i: int) -> Melody:
+        """Return a new Melody object for melody <i> of this store."""
+        start, end = self._note_starts[i], self._note_starts[i + 1]
+        return Melody(self._names[i], list(zip(self._pitches[start:end].tolist(),
+                                               self._durations[start:end].tolist())))
+
+    ###########################################################################
+    # Cursors
+    ###########################################################################
+    def cursor(self) -> PrefixCursor:
+        """Return a cursor over this autocompleter, at the empty prefix."""
+        return PrefixCursor(self)
+
+    def cursor_start(self) -> tuple[np.ndarray, int]:
+        """Return the position of a cursor at the empty prefix.
+
+        A cursor position is (matches, depth): the increasing array of the
+        numbers of the melodies that match the cursor's prefix, and the
+        length of that prefix.
+        """
+        return np.arange(len(self)), 0
+
+    def cursor_step(self, position: tuple[np.ndarray, int],
+                    token: Any) -> tuple[np.ndarray, int] | None:
+        """Return the position of a cursor at <position> after <token> is
+        appended to its prefix, or None if no value matches the new prefix.
+        """
+        matches, depth = position
+        matches = self._filter(matches, depth, token, 0)
+        return (matches, depth + 1) if len(matches) > 0 else None
+
+    def cursor_complete(self, position: tuple[np.ndarray, int],
+                        limit: int | None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the prefix of a cursor at
+        <position>, as autocomplete does.
+        """
+        matches = position[0][:limit]
+        return [(self._melody(i), weight)
+                for i, weight in zip(matches.tolist(), self._weights[matches].tolist())]
+
+
+def _narrowest(values: np.ndarray) -> np.ndarray:
+    """Return <values> as an array of the smallest integer type that can
+    hold each of them.
+    """
+    if len(values) == 0:
+        return values.astype(np.int8)
+    low, high = values.min(), values.max()
+    for dtype in (np.int8, np.int16, np.int32):
+        if np.iinfo(dtype).min <= low and high <= np.iinfo(dtype).max:
+            return values.astype(dtype)
+    return values
@@ -5,8 +5,8 @@ Department of Computer Science,
 University of Toronto
 
 === Module Description ===
-This file contains the definition of an Abstract Data Type (Autocompleter) and two
-implementations of this interface, SimplePrefixTree and CompressedPrefixTree.
+This file contains two implementations of the Autocompleter Abstract Data Type
+(defined in a2_autocompleter), SimplePrefixTree and CompressedPrefixTree.
 You'll complete both of these subclasses over the course of this assignment.
 
 As usual, be sure not to change any parts of the given *public interface* in the
@@ -15,57 +15,26 @@ testing directly! You may, however, add new private attributes, methods, and
 top-level functions to this file.
 """
 from __future__ import annotations
-from typing import Any
-from python_ta.contracts import check_contracts
+import heapq
+from itertools import count, islice
+from typing import Any, Iterable, Iterator, Sequence
 
+from a2_autocompleter import FUZZY_PENALTY, Autocompleter, PrefixCursor, _fuzzy_roots, \
+    _merge_fuzzy
+from a2_validation import check_contracts
 
-################################################################################
-# The Autocompleter ADT
-################################################################################
-class Autocompleter:
-    """An abstract class representing the Autocompleter Abstract Data Type.
-    """
+# A non-leaf tree keeps a dict index of its non-leaf subtrees once it has more
+# than this many subtrees; below this, a linear scan over the edges is faster.
+_INDEX_THRESHOLD = 8
 
-    def __len__(self) -> int:
-        """Return the number of values stored in this Autocompleter."""
-        raise NotImplementedError
+# The stored root of a non-leaf subtree of a SimplePrefixTree. Such a subtree
+# only stores the last element of its root (in _edge); the rest of the root is
+# rebuilt from the edges on the path from the top of the tree when it is read.
+_FROM_PATH = object()
 
-    def insert(self, value: Any, weight: float, prefix: list) -> None:
-        """Insert the given value into this Autocompleter.
-
-        The value is inserted with the given weight, and is associated with
-        the prefix sequence <prefix>.
-
-        If the value has already been inserted into this autocompleter
-        (compare values using ==), then the given weight should be *added* to
-        the existing weight of this value.
-
-        Preconditions:
-        - weight > 0
-        - the given value is either:
-            1) not in this Autocompleter, or
-            2) was previously inserted with the SAME prefix sequence
-        """
-        raise NotImplementedError
-
-    def autocomplete(self, prefix: list,
-                     limit: int | None = None) -> list[tuple[Any, float]]:
-        """Return up to <limit> matches for the given prefix.
-
-        The return value is a list of tuples (value, weight), and must be
-        sorted by non-increasing weight. You can decide how to break ties.
-
-        If limit is None, return *every* match for the given prefix.
-
-        Preconditions:
-        - limit is None or limit > 0
-        """
-        raise NotImplementedError
-
-    def remove(self, prefix: list) -> None:
-        """Remove all values that match the given prefix.
-        """
-        raise NotImplementedError
+# The subtrees list shared by every leaf. It must never be mutated; trees that
+# can gain subtrees (i.e., every non-leaf tree) get their own list.
+_NO_SUBTREES = []
 
 
 ################################################################################
@@ -112,9 +81,42 @@ class SimplePrefixTree(Autocompleter):
       both can appear in the same self.subtrees list, and both have a weight
       attribute.
     """
-    root: Any
     weight: float
     subtrees: list[SimplePrefixTree]
+    # Private Instance Attributes:
+    # - _root:
+    #     The value behind the root property, or _FROM_PATH.
+    # - _parent:
+    #     The tree that has this tree as a subtree, if _root is _FROM_PATH.
+    # - _edge:
+    #     For a non-leaf subtree, the last element of its root (i.e., the token
+    #     that leads to it from its parent); None for leaves and for the root.
+    # - _index:
+    #     None, or a dict mapping the _edge of every non-leaf subtree of this
+    #     tree to that subtree. Only built for trees with many subtrees.
+    # - _top_k:
+    #     The size K of the cached completion lists, if enable_top_k_cache has
+    #     been called on this tree, and None otherwise. Only set on the tree
+    #     whose public methods are called (i.e., the root).
+    # - _version:
+    #     The number of times insert or remove has been called on this tree,
+    #     so that cursors can tell when it changes (see cursor_version). Only maintained on the
+    #     tree whose public methods are called.
+    # - _top:
+    #     For a non-leaf tree in a cached tree, the (value, weight) tuples of
+    #     the K heaviest leaves in this tree, sorted by non-increasing weight.
+    #     None if this tree has no cache.
+    _root: Any
+    _parent: SimplePrefixTree | None
+    _edge: Any
+    _index: dict[Any, SimplePrefixTree] | None
+    _top_k: int | None
+    _top: list[tuple[Any, float]] | None
+    _version: int
+
+    # Trees are stored in huge numbers, so they have no instance __dict__
+    __slots__: tuple[str, ...] = ('_root', 'weight', 'subtrees', '_parent', '_edge', '_index',
+                                  '_top_k', '_top', '_version')
 
     ###########################################################################
     # Part 1(a)
@@ -125,11 +127,46 @@ class SimplePrefixTree(Autocompleter):
         self.root = []
         self.weight = 0.0
         self.subtrees = []
+        self._parent = None
+        self._edge = None
+        self._index = None
+        self._top_k = None
+        self._top = None
+        self._version = 0
+
+    @classmethod
+    def _new_leaf(cls, value: Any, weight: float) -> SimplePrefixTree:
+        """Return a new leaf storing <value> with the given weight.
+
+        The leaf shares the (empty) subtrees list of every other leaf.
+        """
+        leaf = cls.__new__(cls)
+        leaf._root, leaf.weight, leaf.subtrees = value, weight, _NO_SUBTREES
+        leaf._parent = leaf._edge = leaf._index = leaf._top_k = leaf._top = None
+        return leaf
+
+    @property
+    def root(self) -> Any:
+        """The root of this prefix tree (see the class docstring)."""
+        if self._root is not _FROM_PATH:
+            return self._root
+
+        edges = []
+        tree, parent = self, self._parent
+        while tree._root is _FROM_PATH and parent is not None:
+            edges.append(tree._edge)
+            tree, parent = parent, parent._parent
+        edges.reverse()
+        return tree._root + edges
+
+    @root.setter
+    def root(self, value: Any) -> None:
+        self._root = value
 
     def is_empty(self) -> bool:
         """Return whether this simple prefix tree is empty."""
-        return (self.root == [] and self.weight == 0.0
-                and self.subtrees == [])
+        return (self.weight == 0.0 and self.subtrees == []
+                and self.root == [])
 
     def is_leaf(self) -> bool:
         """Return whether this simple prefix tree is a leaf."""
@@ -142,12 +179,15 @@ class SimplePrefixTree(Autocompleter):
         of regular trees from lecture!
         """
         # essence: number of words stored or inserted in the Tree
-
-        if self.is_leaf():  # Actual operator of the recursion
-            return 1
-        else:
-            # Accumulate the number of leaf values in each subtree
-            return sum(len(subtree) for subtree in self.subtrees)
+        num_leaves = 0
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            if tree.is_leaf():
+                num_leaves += 1
+            else:
+                stack.extend(tree.subtrees)
+        return num_leaves
 
     ###########################################################################
     # Extra helper methods
@@ -176,7 +216,7 @@ class SimplePrefixTree(Autocompleter):
     ###########################################################################
     # Add code for Parts 1(c), 2, and 3 here
     ###########################################################################
-    def insert(self, value: Any, weight: float, prefix: list) -> None:
+    def insert(self, value: Any, weight: float, prefix: Sequence) -> None:
         """Insert the given value into this Autocompleter.
 
         The value is inserted with the given weight, and is associated with
@@ -192,153 +232,509 @@ class SimplePrefixTree(Autocompleter):
             1) not in this Autocompleter, or
             2) was previously inserted with the SAME prefix sequence
         """
-        # Base case: we have reached the insertion point
-        if not prefix:  # prefix == [], self is the last internal node, ['c', 'a', 't']
-            self._create_leaf(value, weight)
-            self.weight += weight
+        self._insert(value, weight, prefix)
 
-        # Recursive case: Keep going until prefix becomes empty
-        elif prefix:  # prefix != []
-            next_tree = None
-            for subtree in self.subtrees:
-                # Find ['c','a'] == ['c','a','t'][0:len(pre.root)]
-                if subtree.root[-1] == prefix[0]:
-                    next_tree = subtree
-                    break
+        self._version += 1
+        if self._top_k is not None:
+            self._repair_top(prefix)
+
+    def _insert(self, value: Any, weight: float, prefix: Sequence) -> None:
+        """Insert the given value into this tree, without touching any cached
+        completion lists. See insert for details.
+        """
+        # Walk down to the tree whose root is <prefix>, creating the trees
+        # that are missing on the way
+        path = [self]
+        for token in prefix:
+            next_tree = path[-1]._child(token)
             if next_tree is None:  # Fail to find ['c']
                 # create one and append that to the subtree
                 next_tree = SimplePrefixTree()
-                next_tree.root = self.root + [prefix[0]]
-                self.subtrees.append(next_tree)
-                self.subtrees.sort(key=lambda t: t.weight, reverse=True)
-
-            next_tree.insert(value, weight, prefix[1:])
-
-            self.subtrees.sort(key=lambda t: t.weight, reverse=True)
+                next_tree._root, next_tree._parent = _FROM_PATH, path[-1]
+                next_tree._edge = token
+                path[-1]._add_subtree(next_tree)
+            path.append(next_tree)
 
-        # update weights
-        self._update_weight()
+        path[-1]._create_leaf(value, weight)
 
-    def _update_weight(self) -> None:
-        """Update the weight of this tree based on the weights of its subtrees."""
-        if self.is_leaf():
-            return None
-        else:
-            self.weight = sum(subtree.weight for subtree in self.subtrees)
-            return None
+        # Every leaf below the trees on the path gained <weight>, and nothing
+        # else changed; each of those trees may now overtake its siblings
+        for i in range(len(path) - 1, -1, -1):
+            path[i].weight += weight
+            if i > 0:
+                path[i - 1]._raise_subtree(path[i])
 
     def _create_leaf(self, value: Any, weight: float) -> None:
-        """Create a new leaf"""
-        # check all leaves
-        check_leaf = None
+        """Add <weight> to the leaf storing <value>, creating the leaf if it
+        does not exist yet. Does not update self.weight.
+        """
         for subtree in self.subtrees:  # self is the last internal node
             # this leaf already exists
             if subtree.is_leaf() and subtree.root == value:
-                check_leaf = subtree
-                subtree.weight += weight  # do nothing, just update weights
-        if check_leaf is None:  # after checking all leaves, find the leaf non-exist
-            leaf = SimplePrefixTree()
-            leaf.root = value
-            leaf.weight = weight
-            self.subtrees.append(leaf)
-        self.subtrees.sort(key=lambda t: t.weight, reverse=True)
+                subtree.weight += weight
+                self._raise_subtree(subtree)
+                return
+
+        self._add_subtree(self._new_leaf(value, weight))
+
+    def _child(self, token: Any) -> SimplePrefixTree | None:
+        """Return the non-leaf subtree whose root starts with self.root + [token],
+        or None if there is no such subtree.
+        """
+        if self._index is not None:
+            return self._index.get(token)
+        for subtree in self.subtrees:
+            if subtree._edge == token and not subtree.is_leaf():
+                return subtree
+        return None
+
+    def _add_subtree(self, subtree: SimplePrefixTree) -> None:
+        """Add the non-empty <subtree> to self.subtrees, keeping the subtrees
+        sorted and the index up to date. Does not update self.weight.
+        """
+        self.subtrees.append(subtree)
+        if self._index is not None:
+            if not subtree.is_leaf():
+                self._index[subtree._edge] = subtree
+        elif len(self.subtrees) > _INDEX_THRESHOLD:
+            self._index = {s._edge: s for s in self.subtrees if not s.is_leaf()}
+        self._raise_subtree(subtree, len(self.subtrees) - 1)
+
+    def _remove_subtree(self, subtree: SimplePrefixTree) -> None:
+        """Remove <subtree> from self.subtrees, keeping the index up to date.
+        Does not update self.weight.
+        """
+        self.subtrees.remove(subtree)
+        if self._index is not None and self._index.get(subtree._edge) is subtree:
+            del self._index[subtree._edge]
+
+    def _raise_subtree(self, subtree: SimplePrefixTree, i: int | None = None) -> None:
+        """Move <subtree>, whose weight has just increased, towards the front
+        of self.subtrees until the subtrees are sorted again.
+
+        <i> is the current position of <subtree> in self.subtrees, if known.
+        Only the subtrees that <subtree> overtakes are moved, so this is much
+        cheaper than sorting self.subtrees again.
+        """
+        subtrees = self.subtrees
+        if i is None:
+            i = subtrees.index(subtree)
+        while i > 0 and subtrees[i - 1].weight < subtree.weight:
+            subtrees[i] = subtrees[i - 1]
+            i -= 1
+        subtrees[i] = subtree
+
+    def _lower_subtree(self, subtree: SimplePrefixTree) -> None:
+        """Move <subtree>, whose weight has just decreased, towards the back
+        of self.subtrees until the subtrees are sorted again.
+        """
+        subtrees = self.subtrees
+        i = subtrees.index(subtree)
+        while i + 1 < len(subtrees) and subtrees[i + 1].weight > subtree.weight:
+            subtrees[i] = subtrees[i + 1]
+            i += 1
+        subtrees[i] = subtree
+
+    def _reindex(self) -> None:
+        """Rebuild the index of this tree's subtrees from scratch."""
+        if len(self.subtrees) > _INDEX_THRESHOLD:
+            self._index = {s._edge: s for s in self.subtrees if not s.is_leaf()}
+        else:
+            self._index = None
+
+    ###########################################################################
+    # Bulk loading
+    ###########################################################################
+    @classmethod
+    def from_items(cls, items: Iterable[tuple[Any, float, list]]) -> SimplePrefixTree:
+        """Return a new tree containing the given (value, weight, prefix) items.
+
+        The result is the same as inserting every item, in order, into an
+        empty tree: the weights of repeated values are added together. But
+        the tree is built in one pass over the sorted prefixes, so the weight
+        and the subtree order of each tree are computed exactly once.
+
+        Every item must satisfy the preconditions of insert, every value must
+        be hashable, and the prefix elements of all items must be comparable
+        with each other.
+        """
+        entries = _sorted_entries(items)
+        tree = cls()
+        if not entries:
+            return tree
+
+        # Each frame is (tree, parent, lo, hi, depth, closing): tree gets the
+        # entries in entries[lo:hi], which all share their first <depth>
+        # elements. A tree is "closed" (weighed and sorted) after all of its
+        # subtrees.
+        stack = [(tree, None, 0, len(entries), 0, False)]
+        while stack:
+            tree, parent, lo, hi, depth, closing = stack.pop()
+            if closing:
+                tree.weight = sum(child.weight for child in tree.subtrees)
+                tree.subtrees.sort(key=lambda child: child.weight, reverse=True)
+                tree._reindex()
+                continue
+
+            depth = tree._bulk_root(parent, (entries[lo][0], entries[hi - 1][0]), depth)
+            stack.append((tree, parent, lo, hi, depth, True))
+
+            # The sorted entries whose prefix is exactly tree.root come first,
+            # followed by one run of entries per next prefix element.
+            while lo < hi and len(entries[lo][0]) == depth:
+                tree.subtrees.append(cls._new_leaf(entries[lo][1], entries[lo][2]))
+                lo += 1
+            while lo < hi:
+                token = entries[lo][0][depth]
+                end = lo + 1
+                while end < hi and entries[end][0][depth] == token:
+                    end += 1
+                subtree = cls()
+                subtree._edge = token
+                tree.subtrees.append(subtree)
+                stack.append((subtree, tree, lo, end, depth + 1, False))
+                lo = end
+
+        return tree
+
+    def _bulk_root(self, parent: SimplePrefixTree | None,
+                   bounds: tuple[Sequence, Sequence], depth: int) -> int:
+        """Set the root of this tree, which from_items is building below
+        <parent> for the sorted prefixes from bounds[0] to bounds[1], whose
+        first <depth> elements are the same. Return the length of the root.
+        """
+        if parent is None:
+            # A list even if the prefixes are arrays (see a2_vocabulary), since
+            # the roots of the subtrees are built by adding lists of edges to it
+            self.root = list(bounds[0][:depth])
+        else:
+            self._root, self._parent = _FROM_PATH, parent
+        return depth
 
     ###########################################################################
     # Part 2: autocompletion
     ###########################################################################
-    def autocomplete(self, prefix: list,
+    def autocomplete(self, prefix: Sequence,
                      limit: int | None = None) -> list[tuple[Any, float]]:
-        results = []
-        if self._look_up_prefix(prefix) is False:
+        """Return up to <limit> matches for the given prefix.
+
+        The return value is a list of tuples (value, weight), and must be
+        sorted by non-increasing weight. You can decide how to break ties.
+
+        If limit is None, return *every* match for the given prefix.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        tree = self._look_up_prefix(prefix)
+        if tree is False:
+            return []
+        return self._complete(tree, limit)
+
+    def _complete(self, tree: SimplePrefixTree, limit: int | None) -> list[tuple[Any, float]]:
+        """Return up to <limit> of the heaviest leaves of <tree>, a subtree of
+        this tree, sorted by non-increasing weight.
+        """
+        if limit is not None and self._top_k is not None and limit <= self._top_k:
+            return tree._top[:limit]
+
+        # Only the first <limit> leaves are ever generated
+        return list(islice(tree._iter_best_first(), limit))
+
+    def iter_autocomplete(self, prefix: Sequence) -> Iterator[tuple[Any, float]]:
+        """Yield (value, weight) for every match for the given prefix, in
+        non-increasing order of weight, finding each one only when it is
+        asked for.
+
+        This tree must not be modified until the iterator is exhausted.
+        """
+        tree = self._locate(prefix)[1]
+        return iter(()) if tree is None else tree._iter_best_first()
+
+    def autocomplete_fuzzy(self, prefix: Sequence, max_edits: int, limit: int | None = None,
+                           penalty: float = FUZZY_PENALTY) -> list[tuple[Any, float]]:
+        """Return up to <limit> values whose prefix sequence starts with a
+        sequence within <max_edits> edits (insertions, deletions or
+        substitutions of one element) of <prefix>.
+
+        The return value is a list of tuples (value, weight). It is sorted
+        by non-increasing weight * penalty ** edits, where edits is the
+        fewest edits needed to turn <prefix> into the start of the value's
+        prefix sequence.
+
+        Preconditions:
+        - max_edits >= 0
+        - limit is None or limit > 0
+        - 0 < penalty <= 1
+        """
+        def children(tree: SimplePrefixTree) -> Iterator[tuple[list, SimplePrefixTree]]:
+            return ((tree._label_of(subtree), subtree) for subtree in tree.subtrees
+                    if not subtree.is_leaf())
+
+        def leaves(tree: SimplePrefixTree) -> Iterator[tuple[int, Any, float]]:
+            return ((id(value), value, weight) for value, weight in tree._iter_best_first())
+
+        if self.is_empty():
             return []
+        roots = _fuzzy_roots(self, self.root, prefix, max_edits, children)
+        return _merge_fuzzy([(edits, leaves(tree)) for edits, tree in roots], penalty, limit)
+
+    ###########################################################################
+    # Cursors
+    ###########################################################################
+    def cursor(self) -> PrefixCursor:
+        """Return a cursor over this tree, at the empty prefix."""
+        return PrefixCursor(self)
+
+    def cursor_version(self) -> int:
+        """Return the number of times insert or remove has been called on
+        this tree.
+        """
+        return self._version
+
+    def cursor_start(self) -> tuple[SimplePrefixTree, int]:
+        """Return the position of a cursor over this tree at the empty prefix.
 
-        self._look_up_prefix(prefix)._autocomplete_helper(results)
+        A cursor position in this tree is (tree, depth): the highest tree
+        whose root starts with the cursor's prefix, and the length of that
+        prefix.
+        """
+        return self, 0
 
-        return sorted(results[:limit if limit is not None else None],
-                      key=lambda x: x[1], reverse=True)
+    def cursor_step(self, position: tuple[SimplePrefixTree, int],
+                    token: Any) -> tuple[SimplePrefixTree, int] | None:
+        """Return the position of a cursor at <position> after <token> is
+        appended to its prefix, or None if no value matches the new prefix.
+        """
+        tree, depth = position
+        child = tree._child(token)
+        return None if child is None else (child, depth + 1)
+
+    def cursor_complete(self, position: tuple[SimplePrefixTree, int],
+                        limit: int | None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the prefix of a cursor at
+        <position>, as autocomplete does.
+        """
+        return self._complete(position[0], limit)
 
     def _look_up_prefix(self, prefix: list) -> SimplePrefixTree | bool:
         """This helper function helps find the SimplePrefixTree
         whose root is the same as the prefix.
         If the tree is not found, it should return False
-        else it should reach the SimplePrefixTree"""
-        # Base case: we have reached the point
-        if self.root == prefix:
-            return self
+        else it should reach the SimplePrefixTree
+        """
+        tree = self._locate(prefix)[1]
+        return False if tree is None else tree
 
-        # Recursive case: prefix is still longer than the root
-        for subtree in self.subtrees:
-            if len(subtree.root) <= len(prefix) and subtree.root == prefix[:len(subtree.root)]:
-                result = subtree._look_up_prefix(prefix)
-                if result:
-                    return result
-
-        return False
-
-    def _autocomplete_helper(self, results: list) -> None:
-        """This helper function will go on recurse the targeted SimplePrefixTree
-        to find the leaf and append the leaves to the output"""
-        if self.is_leaf():
-            results.append((self.root, self.weight))
-        else:  # if not self.is_leaf(), the recursion will go on
-            for subtree in self.subtrees:
-                subtree._autocomplete_helper(results)
+    def _locate(self, prefix: list) -> tuple[list[SimplePrefixTree], SimplePrefixTree | None]:
+        """Return the highest tree in this tree whose root starts with <prefix>
+        (so its leaves are exactly the values that match <prefix>), or None if
+        there is no such tree, together with the list of trees above it (or
+        above where it would be), from this tree downwards.
 
-    ###########################################################################
-    # Part 3: remove
-    ###########################################################################
-    def remove(self, prefix: list) -> None:
-        """Remove all values that match the given prefix.
-        Be careful about preserving all representation invariants
-        (e.g., updating weights, making sure there aren’t any empty subtrees)
+        This tree must not be a subtree of another tree.
         """
-        if self.is_empty() or self.is_leaf():
-            return
+        ancestors = []
+        tree = self
+        for token in prefix:
+            next_tree = tree._child(token)
+            if next_tree is None:
+                return ancestors, None
+            ancestors.append(tree)
+            tree = next_tree
+        return ancestors, tree
+
+    def _iter_best_first(self) -> Iterator[tuple[Any, float]]:
+        """Yield (value, weight) for every leaf in this tree, in non-increasing
+        order of weight.
+
+        This is a best-first search over the tree. The weight of a non-leaf
+        tree is the total weight of its leaves, so it is an upper bound on the
+        weight of any leaf below it; and because every subtrees list is sorted,
+        a subtree only needs to enter the heap once its previous sibling has
+        been popped. The heap therefore only ever holds one "frontier" entry
+        per sibling list, and the work done depends on how many leaves are
+        consumed rather than on the size of this tree.
+        """
+        tiebreak = count()
+        # Each entry is (-weight, tiebreak, siblings, i) for the tree siblings[i]
+        heap = [(-self.weight, next(tiebreak), [self], 0)]
+        while heap:
+            siblings, i = heapq.heappop(heap)[2:]
+            tree = siblings[i]
+            if i + 1 < len(siblings):
+                heapq.heappush(heap, (-siblings[i + 1].weight, next(tiebreak), siblings, i + 1))
+
+            if tree.is_leaf():
+                yield tree.root, tree.weight
+            elif tree.subtrees:
+                heapq.heappush(heap, (-tree.subtrees[0].weight, next(tiebreak),
+                                      tree.subtrees, 0))
 
-        elif not prefix:
-            self.root, self.weight, self.subtrees = [], 0.0, []
+    ###########################################################################
+    # Cached top-k completion lists
+    ###########################################################################
+    def enable_top_k_cache(self, k: int) -> None:
+        """Make every non-leaf tree in this tree keep a list of its <k>
+        heaviest leaves, so that autocomplete with limit <= k becomes a lookup.
 
-        elif not self.subtrees:
-            self.root, self.weight, self.subtrees = [], 0.0, []
+        insert and remove (called on this tree) keep the lists up to date by
+        refreshing only the trees on the path to the changed prefix.
 
+        Preconditions:
+        - k > 0
+        """
+        self._top_k = k
+        # Refresh children before their parents (reverse pre-order)
+        order = []
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            if not tree.is_leaf():
+                order.append(tree)
+                stack.extend(tree.subtrees)
+        for tree in reversed(order):
+            tree._refresh_top(k)
+
+    def disable_top_k_cache(self) -> None:
+        """Drop the cached completion lists from every tree in this tree."""
+        self._top_k = None
+        stack = [self]
+        while stack:
+            tree = stack.pop()
+            tree._top = None
+            stack.extend(tree.subtrees)
+
+    def _refresh_top(self, k: int) -> None:
+        """Recompute the cached completion list of this non-leaf tree from the
+        lists of its subtrees (which must already be up to date).
+        """
+        tiebreak = count()
+        best = []  # min-heap of (weight, tiebreak, value), at most k entries
         for subtree in self.subtrees:
-            if subtree.root == prefix[:len(subtree.root)]:
-                # If the full prefix matches, remove the subtree
-                if len(subtree.root) == len(prefix):
-                    subtree.root, subtree.subtrees = None, []
-                    self.weight -= subtree.weight
-                    self.subtrees.remove(subtree)
-                else:
-                    # Recursively call remove on the subtree
-                    subtree.remove(prefix)
-                    if not subtree.subtrees:  # If subtree.subtrees == [], remove it
-                        self.subtrees.remove(subtree)
+            # The subtrees are sorted, so no later subtree can beat the k-th best
+            if len(best) == k and subtree.weight <= best[0][0]:
                 break
+            if subtree.is_leaf():
+                candidates = [(subtree.root, subtree.weight)]
+            else:
+                candidates = subtree._top or []
+            for candidate, candidate_weight in candidates:
+                if len(best) < k:
+                    heapq.heappush(best, (candidate_weight, next(tiebreak), candidate))
+                elif candidate_weight > best[0][0]:
+                    heapq.heapreplace(best, (candidate_weight, next(tiebreak), candidate))
+                else:
+                    break
+        best.sort(reverse=True)
+        self._top = [(value, weight) for weight, _, value in best]
 
-        self._check_removable()
+    def _repair_top(self, prefix: list) -> None:
+        """Refresh the cached completion lists of the trees whose root is a
+        prefix of <prefix>, deepest first. These are the only trees whose
+        leaves can change when a value with this prefix is inserted.
+        """
+        ancestors, tree = self._locate(prefix)
+        if tree is not None:
+            tree._refresh_top(self._top_k)
+        for tree in reversed(ancestors):
+            tree._refresh_top(self._top_k)
+
+    def _label_of(self, subtree: SimplePrefixTree) -> list:
+        """Return the elements of the root of the non-leaf <subtree> that are
+        not in self.root.
+        """
+        return [subtree._edge]
 
-        # update weights
-        self._update_weight()
+    ###########################################################################
+    # Snapshots
+    ###########################################################################
+    def save(self, path: str) -> None:
+        """Write this tree to a snapshot file at <path>.
 
-    def _check_removable(self) -> None:
-        """This helper function recurse through the whole SimplePrefixTree to see
-        if any node should be removed. If it's removable, just remove it.
-        Otherwise, do nothing.
+        The snapshot stores a FrozenPrefixTree copy of this tree.
+        """
+        from a2_frozen_tree import FrozenPrefixTree
+        FrozenPrefixTree(self).save(path)
+
+    @staticmethod
+    def load(path: str) -> Autocompleter:
+        """Return the tree stored in the snapshot file at <path>.
+
+        Note that the tree is loaded as a (read-only) FrozenPrefixTree; see
+        FrozenPrefixTree.load.
+        """
+        from a2_frozen_tree import FrozenPrefixTree
+        return FrozenPrefixTree.load(path)
 
-        The removable node should have an empty subtree"""
-        # Base case: this node is removable
-        if self.is_leaf() or self.is_empty():
+    ###########################################################################
+    # Part 3: remove
+    ###########################################################################
+    def remove(self, prefix: Sequence) -> None:
+        """Remove all values that match the given prefix.
+        Be careful about preserving all representation invariants
+        (e.g., updating weights, making sure there aren’t any empty subtrees)
+        """
+        self._version += 1
+        ancestors, target = self._locate(prefix)
+        if target is None:
+            return
+        if target is self:
+            self._clear()
             return
 
-        # Recursive case: this node has a non-empty subtree
-        else:
-            for subtree in self.subtrees:
-                if not subtree.subtrees:  # subtree.subtrees = []
-                    if len(subtree.subtrees) == 1 and subtree.subtrees[0].is_leaf():
-                        self.subtrees.remove(subtree)
-                        subtree.root, subtree.weight = None, 0.0
+        ancestors[-1]._remove_subtree(target)
+
+        # Walk back up, removing the trees that were left without subtrees
+        # and re-weighing (and re-positioning) the others
+        changed = []
+        for i in range(len(ancestors) - 1, -1, -1):
+            tree = ancestors[i]
+            if not tree.subtrees:
+                if i == 0:
+                    self._clear()
+                    return
+                ancestors[i - 1]._remove_subtree(tree)
+                continue
+
+            tree.weight = sum(subtree.weight for subtree in tree.subtrees)
+            tree._compress()
+            if i > 0:
+                ancestors[i - 1]._lower_subtree(tree)
+            changed.append(tree)
+
+        if self._top_k is not None:
+            for tree in changed:
+                tree._refresh_top(self._top_k)
+
+    def _clear(self) -> None:
+        """Make this tree empty."""
+        self.root, self.weight, self.subtrees = [], 0.0, []
+        self._index = None
+        if self._top_k is not None:
+            self._top = []
+
+    def _compress(self) -> None:
+        """Restore the invariants that are specific to this kind of tree after
+        some values have been removed from this tree.
+
+        A SimplePrefixTree has no such invariants, so this does nothing.
+        """
 
-                subtree._check_removable()
+
+def _sorted_entries(items: Iterable[tuple[Any, float, list]]) -> list[tuple[list, Any, float]]:
+    """Return a (prefix, value, total weight) tuple for each distinct value in
+    the (value, weight, prefix) <items>, sorted by prefix. The prefix of a
+    repeated value is the one it was first given with.
+    """
+    totals, prefixes = {}, {}
+    for value, weight, prefix in items:
+        if value in totals:
+            totals[value] += weight
+        else:
+            totals[value], prefixes[value] = weight, prefix
+    return sorted(((prefixes[key], key, total) for key, total in totals.items()),
+                  key=lambda entry: entry[0])
 
 
 ################################################################################
@@ -358,6 +754,8 @@ class CompressedPrefixTree(SimplePrefixTree):
     """
     subtrees: list[CompressedPrefixTree]  # Note the different type annotation
 
+    __slots__: tuple[str, ...] = ()
+
     ###########################################################################
     # Add code for Part 6 here
     ###########################################################################
@@ -365,206 +763,192 @@ class CompressedPrefixTree(SimplePrefixTree):
         """When self is empty, create a CompressedPrefixTree like this:
         [prefix] -> value
         """
-        leaf = CompressedPrefixTree()
-        leaf.root, leaf.weight = value, weight
+        leaf = self._new_leaf(value, weight)
         self.root, self.weight = prefix, weight
         self.subtrees = [leaf]
 
-    def _create_leaf(self, value: Any, weight: float) -> None:
-        """When self.root == prefix, create a new leaf or just update the weight"""
-        # check all leaves
-        check_leaf = None
-        for subtree in self.subtrees:  # subtree = 'cat', self = ['c','a','t']
-            # this leaf already exists
-            if subtree.is_leaf() and subtree.root == value:
-                subtree.weight += weight  # do nothing, just update weights
-                check_leaf = subtree
-                break
-        if check_leaf is None:  # after checking all leaves, find the leaf non-exist
-            leaf = CompressedPrefixTree()
-            leaf.root, leaf.weight = value, weight
-            self.subtrees.append(leaf)
-        self.subtrees.sort(key=lambda t: t.weight, reverse=True)
-        self.weight += weight
-
     def _create_new_tree(self, value: Any, weight: float, prefix: list) -> None:
         """This helper function creates a new CompressedPrefixTree
         and append that tree to self"""
-        leaf = CompressedPrefixTree()
-        leaf.root, leaf.weight = value, weight
+        leaf = self._new_leaf(value, weight)
         sub = CompressedPrefixTree()
         sub.root, sub.weight = prefix, weight
         sub.subtrees = [leaf]
-        self.subtrees.append(sub)
-        self.subtrees.sort(key=lambda t: t.weight, reverse=True)
+        sub._edge = prefix[len(self.root)]
+        self._add_subtree(sub)
 
     def _create_parent_tree(self, value: Any, weight: float, prefix: list) -> None:
         """This helper function creates a new CompressedPrefixTree
         and self to the subtrees of that tree, or maybe merge"""
-        # create a copy of self
-        child = self.copy()
-        # create a parent tree
-        leaf = CompressedPrefixTree()
-        leaf.root, leaf.weight = value, weight
-        parent = CompressedPrefixTree()
-        parent.root, parent.weight = prefix, weight
-        parent.subtrees = [leaf]
-        parent.subtrees.append(child)
-        parent.subtrees.sort(key=lambda t: t.weight, reverse=True)
-
-        self.root, self.subtrees = parent.root, parent.subtrees
-        self._update_weight()
+        # self = ['c','a','t','h'], prefix = ['c','a','t']: split self into
+        # ['c','a','t'] -> ['c','a','t','h'], then add the leaf to ['c','a','t']
+        self._split(len(prefix))
+        self._create_leaf(value, weight)
+        self.weight += weight
 
     def _create_common_prefix_tree(self, overlapping: list, prefix: list,
                                    value: Any, weight: float) -> None:
         """This should create a new tree with a common prefix tree,
         and merge the two trees together
         """
-        # create a copy of self
-        right = self.copy()
-        # create a tree using prefix
-        leaf = CompressedPrefixTree()
-        leaf.root, leaf.weight = value, weight
-        left = CompressedPrefixTree()
-        left.root, left.weight = prefix, weight
-        left.subtrees = [leaf]
-        # create a tree with common prefix
-        common = CompressedPrefixTree()
-        common.root = overlapping
-        common.subtrees.append(right)
-        common.subtrees.append(left)
-        common.subtrees.sort(key=lambda t: t.weight, reverse=True)
-
-        self.root, self.subtrees = common.root, common.subtrees
-        self._update_weight()
-
-    def copy(self) -> CompressedPrefixTree:
-        """Returns an identical copy of """
-        new_tree = CompressedPrefixTree()
-        new_tree.root, new_tree.weight = self.root, self.weight
-
-        new_tree.subtrees = [subtree.copy() for subtree in self.subtrees]
-
-        return new_tree
-
-    def _overlapping_list(self, prefix: list) -> list:
-        """This should return a list
-        If the two lists don't having overlapping part, return []
-        else, return the overlapping part
-        """
-        overlapping = []
-        for i in range(min(len(self.root), len(prefix))):
-            if self.root[i] != prefix[i]:
-                return overlapping
-            overlapping.append(self.root[i])
-        return overlapping
-
-    def insert(self, value: Any, weight: float, prefix: list) -> None:
-
-        # case 0: self.is_empty
-        if self.is_empty():
-            self._create_empty(value, weight, prefix)
-            return
-
-        # case 1: ['c','a','t'] == ['c','a','t']
-        if self.root == prefix:
-            self._create_leaf(value, weight)  # create cat or just update weight
-            return
-
-        # one completely overlap another
-        # case 2: self.root = ['c','a'], prefix = ['c','a','t']
-        elif isinstance(self.root, list) and \
-                len(self.root) < len(prefix) and self.root == prefix[:len(self.root)]:
-            max_length = 0
-            best_subtree = None
-            for subtree in self.subtrees:
-                overlap_list = subtree._overlapping_list(prefix)
-                # if not subtree.is_leaf() and subtree.root == overlap_list:
-                if not subtree.is_leaf() and len(overlap_list) > len(self.root):
-                    if max_length < len(overlap_list):
-                        max_length = len(overlap_list)
-                        best_subtree = subtree
-
-            # if the best_subtree is found, go on inserting value into the tree
-            if best_subtree:
-                best_subtree.insert(value, weight, prefix)  # just recurse into one subtree
-                self.subtrees.sort(key=lambda t: t.weight, reverse=True)
-                self._update_weight()
-                return
-
-            # create one and append that to self
-            self._create_new_tree(value, weight, prefix)
-            self._update_weight()
-
-        # one completely overlap another
-        # case 3: self.root = ['c','a','t','h'], prefix = ['c','a','t']
-        elif isinstance(self.root, list) and \
-                len(self.root) > len(prefix) and self.root[:len(prefix)] == prefix:
-            self._create_parent_tree(value, weight, prefix)
-
-        # case 4: self.root = ['c','a','r'], prefix = ['c','a','t']
-        else:
-            overlap = []
-            for subtree in self.subtrees:
-                overlap = subtree._overlapping_list(prefix)
-            self._create_common_prefix_tree(overlap, prefix, value, weight)
-
-    #############################################################################
-    # Below is Part 6: autocomplete
-    #############################################################################
-
-    def autocomplete(self, prefix: list, limit: int | None = None) -> list[tuple[Any, float]]:
-        """
-        Return up to <limit> matches for the given prefix.
+        # self = ['c','a','r'], prefix = ['c','a','t']: split self into
+        # ['c','a'] -> ['c','a','r'], then add ['c','a','t'] to ['c','a']
+        self._split(len(overlapping))
+        self._create_new_tree(value, weight, prefix)
+        self.weight += weight
 
-        The return value is a list of tuples (value, weight), and must be sorted by
-        non-increasing weight. You can decide how to break ties.
+    def _split(self, length: int) -> None:
+        """Move the root and subtrees of this tree into a new subtree, and
+        shorten the root of this tree to its first <length> elements.
 
-        If limit is None, return every match for the given prefix.
+        The existing subtrees are relinked rather than copied, so this takes
+        O(length) time however large this tree is.
 
         Preconditions:
-        - limit is None or limit > 0
+        - 0 <= length < len(self.root)
         """
-        results = []
-        if self._look_up_prefix(prefix) is False:
-            return []
-
-        self._look_up_prefix(prefix)._autocomplete_helper(results)
+        child = CompressedPrefixTree()
+        child.root, child.weight, child.subtrees = self.root, self.weight, self.subtrees
+        child._index, child._top = self._index, self._top
+        child._edge = self.root[length]
+
+        self.root, self.subtrees = self.root[:length], [child]
+        self._index, self._top = None, None
+
+    def _bulk_root(self, parent: CompressedPrefixTree | None,
+                   bounds: tuple[Sequence, Sequence], depth: int) -> int:
+        """Set the root of this tree, which from_items is building below
+        <parent> for the sorted prefixes from bounds[0] to bounds[1], whose
+        first <depth> elements are the same. Return the length of the root.
+
+        A compressed tree's root is the longest prefix shared by all of its
+        values; since the prefixes are sorted, that is the longest prefix
+        shared by the first and the last of them.
+        """
+        first, last = bounds
+        while depth < min(len(first), len(last)) and first[depth] == last[depth]:
+            depth += 1
+        self.root = first[:depth]
+        return depth
+
+    def _label_of(self, subtree: CompressedPrefixTree) -> list:
+        """Return the elements of the root of the non-leaf <subtree> that are
+        not in self.root.
+        """
+        return subtree.root[len(self.root):]
 
-        # Sort and limit the results if necessary
-        return sorted(results[:limit if limit is not None else None],
-                      key=lambda x: x[1], reverse=True)
+    def _locate(self, prefix: list) -> tuple[list[CompressedPrefixTree],
+                                             CompressedPrefixTree | None]:
+        """Return the highest tree in this tree whose root starts with <prefix>
+        (so its leaves are exactly the values that match <prefix>), or None if
+        there is no such tree, together with the list of trees above it (or
+        above where it would be), from this tree downwards.
 
-    def _look_up_prefix(self, prefix: list) -> SimplePrefixTree | bool:
-        """This helper function helps find the right tree.
-        If the right tree does not exist, return False"""
-        # case 0: self.is_empty
-        if self.is_empty():
-            return False
+        This tree must not be a subtree of another tree.
+        """
+        ancestors = []
+        tree = self
+        while len(tree.root) < len(prefix):
+            if tree.root != prefix[:len(tree.root)]:
+                return ancestors, None
+            next_tree = tree._child(prefix[len(tree.root)])
+            if next_tree is None:
+                return ancestors, None
+            ancestors.append(tree)
+            tree = next_tree
+
+        if tree.root[:len(prefix)] != prefix:
+            return ancestors, None
+        return ancestors, tree
+
+    def cursor_step(self, position: tuple[CompressedPrefixTree, int],
+                    token: Any) -> tuple[CompressedPrefixTree, int] | None:
+        """Return the position of a cursor at <position> after <token> is
+        appended to its prefix, or None if no value matches the new prefix.
+
+        The cursor stays on the same tree while its prefix is shorter than
+        that tree's root.
+        """
+        tree, depth = position
+        if depth < len(tree.root):
+            return (tree, depth + 1) if tree.root[depth] == token else None
+        child = tree._child(token)
+        return None if child is None else (child, depth + 1)
+
+    def _compress(self) -> None:
+        """Merge this tree with its only subtree if that subtree is not a
+        leaf, since this tree's root would then be a compressible value.
+        """
+        if len(self.subtrees) == 1 and not self.subtrees[0].is_leaf():
+            child = self.subtrees[0]
+            self.root, self.subtrees = child.root, child.subtrees
+            self._index, self._top = child._index, child._top
 
-        # case 1: ['c','a','t'] == ['c','a','t']
-        elif self.root == prefix:
-            return self
+    def _overlapping_list(self, prefix: list) -> list:
+        """This should return a list
+        If the two lists don't having overlapping part, return []
+        else, return the overlapping part
+        """
+        # Find the length first and take one slice, rather than appending one
+        # element at a time, so that the result has the type of <prefix>
+        # (e.g. an array from a Vocabulary) without a per-element copy
+        root = self.root
+        length = 0
+        while length < min(len(root), len(prefix)) and root[length] == prefix[length]:
+            length += 1
+        return prefix[:length]
+
+    def _insert(self, value: Any, weight: float, prefix: list) -> None:
+        """Insert the given value into this tree, without touching any cached
+        completion lists. See insert for details.
+        """
+        ancestors = []
+        tree = self
+        while True:
+            # case 0: self.is_empty
+            if tree.is_empty():
+                tree._create_empty(value, weight, prefix)
+                break
 
-        # case 2: self.root = ['c','a'], prefix = ['c','a','t']
-        elif len(self.root) < len(prefix) and self.root == prefix[:len(self.root)]:
-            for subtree in self.subtrees:
-                # ['c','a','t'] or ['c','a','t','h']
-                if not subtree.is_leaf() and prefix == subtree.root[:len(prefix)]:
-                    return subtree
+            # case 1: ['c','a','t'] == ['c','a','t']
+            elif tree.root == prefix:
+                tree._create_leaf(value, weight)  # create cat or just update weight
+                tree.weight += weight
+                break
 
-                # ['c','a'] or ['c']
-                elif not subtree.is_leaf() and prefix[:len(subtree.root)] == subtree.root:
-                    return subtree._look_up_prefix(prefix)
+            # one completely overlap another
+            # case 2: self.root = ['c','a'], prefix = ['c','a','t']
+            elif len(tree.root) < len(prefix) and tree.root == prefix[:len(tree.root)]:
+                # go on inserting value into the subtree that shares the next
+                # element, if there is one
+                next_tree = tree._child(prefix[len(tree.root)])
+                if next_tree is not None:
+                    ancestors.append(tree)
+                    tree = next_tree
+                    continue
+
+                # create one and append that to self
+                tree._create_new_tree(value, weight, prefix)
+                tree.weight += weight
+                break
 
-            # ['c','a','t'] does not exist
-            return False
+            # one completely overlap another
+            # case 3: self.root = ['c','a','t','h'], prefix = ['c','a','t']
+            elif len(tree.root) > len(prefix) and tree.root[:len(prefix)] == prefix:
+                tree._create_parent_tree(value, weight, prefix)
+                break
 
-        # case 3: self.root = ['c','a','t','h'], prefix = ['c','a','t']
-        elif len(self.root) > len(prefix) and self.root[:len(prefix)] == prefix:
-            return self
+            # case 4: self.root = ['c','a','r'], prefix = ['c','a','t']
+            else:
+                overlap = tree._overlapping_list(prefix)
+                tree._create_common_prefix_tree(overlap, prefix, value, weight)
+                break
 
-        return False
+        # Every tree we went through gained <weight>
+        for parent in reversed(ancestors):
+            parent.weight += weight
+            parent._raise_subtree(tree)
+            tree = parent
 
 
 if __name__ == '__main__':
@@ -584,6 +968,18 @@ if __name__ == '__main__':
     # "Ctrl + /" or "⌘ + /".
     import python_ta
     python_ta.check_all(config={
+        'extra-imports': ['heapq', 'itertools', 'a2_autocompleter', 'a2_frozen_tree',
+                          'a2_validation'],
         'max-line-length': 100,
-        'max-nested-blocks': 4
+        'max-nested-blocks': 4,
+        # E9959: python_ta treats the __slots__ of SimplePrefixTree and of its
+        #   subclass as one variable, so it reports the first as reassigned
+        #   before use.
+        # R9711: python_ta 2.13.1 expects a return statement in generators
+        #   (_iter_best_first) too.
+        # R0902: a tree's links and caches are slots of the tree itself, so
+        #   that the (very many) trees stay small.
+        # C0415: save and load import a2_frozen_tree when they are called,
+        #   since a2_frozen_tree imports this module.
+        'disable': ['E9959', 'R9711', 'R0902', 'C0415']
     })
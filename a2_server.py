@@ -0,0 +1,394 @@
+"""CSC148 Assignment 2: Autocomplete server
+
+=== Module Description ===
+This file contains an asyncio server that answers autocomplete queries for
+one or more autocomplete engines over a Unix or TCP socket, a matching
+client, and a load generator.
+
+The protocol is line-based: each request and each response is one JSON
+object followed by a newline. A request is
+
+    {"id": 1, "engine": "words", "prefix": "ca", "limit": 5}
+
+where "limit" is optional, and "prefix" is a string for the text engines or
+a list of ints for melody engines. The response is
+
+    {"id": 1, "results": [["cat", 3.0], ["car", 2.0]]}
+
+or {"id": 1, "error": "..."} if the request could not be answered. A request
+{"id": 2, "op": "stats"} returns the server's counters instead. Responses on
+one connection may arrive in a different order than their requests.
+
+Identical requests (same engine, prefix and limit) that are waiting at the
+same time are answered by a single query, and all the queries received
+during one iteration of the event loop are answered together in one batch.
+
+The server stops reading a connection's requests while max_in_flight of them
+are unanswered, and waits for each response to be sent before counting it
+as answered. So a client that sends requests faster than it reads the
+responses is slowed down, rather than making the server buffer the
+responses without bound.
+
+Run this module to start a server, or to generate load against one:
+
+    python a2_server.py serve --tcp 127.0.0.1:8765 \\
+        --engine words=letter:compressed:data/texts/sample_words.txt
+    python a2_server.py load --tcp 127.0.0.1:8765 --engine words \\
+        --prefixes a ca the --concurrency 50 --requests 10000
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import time
+from itertools import count
+from typing import Any
+
+
+################################################################################
+# Server
+################################################################################
+class AutocompleteServer:
+    """An asyncio server that answers autocomplete queries for some engines.
+
+    Instance Attributes:
+    - engines: the engines this server answers queries for, by name
+    - stats: counters of the requests received (see handle_request)
+    - max_in_flight: the most requests from one connection that can be
+      waiting for their responses at once
+    """
+    # Private Instance Attributes:
+    # - _pending:
+    #     The future for the answer to each distinct query that has been
+    #     received but not answered yet, keyed by (engine, prefix, limit).
+    # - _batch:
+    #     The queries in _pending that will be answered in the next batch.
+    engines: dict[str, Any]
+    stats: dict[str, int]
+    max_in_flight: int
+    _pending: dict[tuple, asyncio.Future]
+    _batch: list[tuple[tuple, Any, Any, int | None]]
+
+    def __init__(self, engines: dict[str, Any], max_in_flight: int = 64) -> None:
+        """Initialize a server for the given engines.
+
+        Preconditions:
+        - max_in_flight >= 1
+        """
+        self.engines = engines
+        self.stats = {'requests': 0, 'coalesced': 0, 'queries': 0, 'batches': 0, 'errors': 0}
+        self.max_in_flight = max_in_flight
+        self._pending = {}
+        self._batch = []
+
+    async def start_unix(self, path: str) -> asyncio.AbstractServer:
+        """Start serving on the Unix socket at <path>, and return the
+        asyncio server.
+        """
+        return await asyncio.start_unix_server(self._handle_connection, path)
+
+    async def start_tcp(self, host: str, port: int) -> asyncio.AbstractServer:
+        """Start serving on the TCP socket at <host>:<port>, and return the
+        asyncio server.
+        """
+        return await asyncio.start_server(self._handle_connection, host, port)
+
+    async def handle_request(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Return the response to <request>."""
+        response = {'id': request.get('id')}
+        if request.get('op', 'autocomplete') == 'stats':
+            response['stats'] = dict(self.stats)
+            return response
+
+        self.stats['requests'] += 1
+        try:
+            # Shielded, so that a cancelled request does not cancel the
+            # other requests that share its answer
+            results = await asyncio.shield(
+                self._query(request['engine'], request['prefix'], request.get('limit')))
+        except Exception as error:
+            self.stats['errors'] += 1
+            response['error'] = f'{type(error).__name__}: {error}'
+        else:
+            response['results'] = results
+        return response
+
+    def _query(self, name: str, prefix: Any, limit: int | None) -> asyncio.Future:
+        """Return a future for the answer to the given query.
+
+        If the same query is already waiting for its answer, return its
+        future; otherwise add the query to the next batch.
+        """
+        engine = self.engines[name]
+        key = (name, tuple(prefix) if isinstance(prefix, list) else prefix, limit)
+        if key in self._pending:
+            self.stats['coalesced'] += 1
+            return self._pending[key]
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        if not self._batch:
+            asyncio.get_running_loop().call_soon(self._run_batch)
+        self._batch.append((key, engine, prefix, limit))
+        return future
+
+    def _run_batch(self) -> None:
+        """Answer every query in the current batch."""
+        batch, self._batch = self._batch, []
+        self.stats['batches'] += 1
+        for key, engine, prefix, limit in batch:
+            future = self._pending.pop(key)
+            self.stats['queries'] += 1
+            try:
+                future.set_result(engine.autocomplete(prefix, limit))
+            except Exception as error:
+                future.set_exception(error)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        """Answer the requests sent on one connection, until it is closed.
+
+        At most self.max_in_flight requests are answered at once; the next
+        request is only read once one of them has been sent its response.
+        """
+        tasks = set()
+        in_flight = asyncio.Semaphore(self.max_in_flight)
+
+        def finish(task: asyncio.Task) -> None:
+            tasks.discard(task)
+            in_flight.release()
+
+        try:
+            while True:
+                await in_flight.acquire()
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self._respond(line, writer))
+                tasks.add(task)
+                task.add_done_callback(finish)
+            if tasks:
+                await asyncio.wait(tasks)
+        finally:
+            writer.close()
+
+    async def _respond(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        """Write the response to the request in <line> to <writer>, and wait
+        until it has been sent (or the connection has been lost).
+        """
+        try:
+            request = json.loads(line)
+        except ValueError as error:
+            response = {'id': None, 'error': f'invalid request: {error}'}
+        else:
+            if isinstance(request, dict):
+                response = await self.handle_request(request)
+            else:
+                response = {'id': None, 'error': 'invalid request: not a JSON object'}
+        writer.write(json.dumps(response, default=str).encode('utf-8') + b'\n')
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass  # the client has gone, so there is no one to respond to
+
+
+################################################################################
+# Client
+################################################################################
+class AutocompleteClient:
+    """A client for an AutocompleteServer, which can have any number of
+    requests waiting for their responses at once.
+    """
+    # Private Instance Attributes:
+    # - _reader, _writer: the streams of the connection to the server
+    # - _ids: the ids of the requests
+    # - _waiting: the future for the response to each request, by id
+    # - _receiver: the task that receives the responses
+    _reader: asyncio.StreamReader
+    _writer: asyncio.StreamWriter
+    _ids: count
+    _waiting: dict[int, asyncio.Future]
+    _receiver: asyncio.Task
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Initialize a client that uses the given connection.
+        Use connect_unix or connect_tcp to create a client.
+        """
+        self._reader, self._writer = reader, writer
+        self._ids = count()
+        self._waiting = {}
+        self._receiver = asyncio.create_task(self._receive())
+
+    @classmethod
+    async def connect_unix(cls, path: str) -> AutocompleteClient:
+        """Return a client connected to the server on the Unix socket at <path>."""
+        return cls(*await asyncio.open_unix_connection(path))
+
+    @classmethod
+    async def connect_tcp(cls, host: str, port: int) -> AutocompleteClient:
+        """Return a client connected to the server at <host>:<port>."""
+        return cls(*await asyncio.open_connection(host, port))
+
+    async def autocomplete(self, engine: str, prefix: Any,
+                           limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return the server's matches for <prefix> in the given engine.
+
+        Raise RuntimeError if the server could not answer the request.
+        """
+        response = await self._request({'engine': engine, 'prefix': prefix, 'limit': limit})
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return [tuple(match) for match in response['results']]
+
+    async def stats(self) -> dict[str, int]:
+        """Return the server's counters."""
+        return (await self._request({'op': 'stats'}))['stats']
+
+    async def close(self) -> None:
+        """Close the connection to the server."""
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._receiver.cancel()
+
+    async def _request(self, request: dict[str, Any]) -> dict[str, Any]:
+        """Send <request> and return its response."""
+        request['id'] = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[request['id']] = future
+        self._writer.write(json.dumps(request).encode('utf-8') + b'\n')
+        return await future
+
+    async def _receive(self) -> None:
+        """Hand each response from the server to the request it answers."""
+        while line := await self._reader.readline():
+            response = json.loads(line)
+            future = self._waiting.pop(response['id'], None)
+            if future is not None and not future.done():
+                future.set_result(response)
+        for future in self._waiting.values():
+            future.set_exception(ConnectionError('the server closed the connection'))
+        self._waiting.clear()
+
+
+################################################################################
+# Load generator
+################################################################################
+async def generate_load(connect: Any, engine: str, prefixes: list,
+                        n_requests: int = 10000, concurrency: int = 50,
+                        limit: int | None = 10) -> dict[str, float]:
+    """Send <n_requests> queries for the given prefixes (in turn) to the
+    given engine, from <concurrency> clients that each wait for a response
+    before sending their next request, and return the throughput and
+    latency percentiles.
+
+    <connect> is a coroutine function that returns a new AutocompleteClient.
+
+    Raise ValueError if <prefixes> is empty, or <n_requests> or <concurrency>
+    is less than 1.
+    """
+    if not prefixes:
+        raise ValueError('generate_load needs at least one prefix')
+    if n_requests < 1 or concurrency < 1:
+        raise ValueError(f'n_requests and concurrency must be at least 1, '
+                         f'not {n_requests} and {concurrency}')
+    clients = [await connect() for _ in range(concurrency)]
+    latencies = []
+    requests = iter(range(n_requests))
+
+    async def run(client: AutocompleteClient) -> None:
+        for i in requests:
+            start = time.perf_counter()
+            await client.autocomplete(engine, prefixes[i % len(prefixes)], limit)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run(client) for client in clients))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'requests_per_s': len(latencies) / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] * 1e3,
+        'p99_ms': latencies[min(len(latencies) - 1, len(latencies) * 99 // 100)] * 1e3,
+    }
+
+
+################################################################################
+# Command line
+################################################################################
+def _load_engine(spec: str) -> tuple[str, Any]:
+    """Return the name and the engine described by <spec>, which has the
+    form name=kind:autocompleter:file, where kind is letter, sentence or
+    melody (e.g. words=letter:compressed:data/texts/sample_words.txt).
+    """
+    import a2_autocomplete_engines
+
+    name, description = spec.split('=', 1)
+    kind, autocompleter, path = description.split(':', 2)
+    engine_class = {
+        'letter': a2_autocomplete_engines.LetterAutocompleteEngine,
+        'sentence': a2_autocomplete_engines.SentenceAutocompleteEngine,
+        'melody': a2_autocomplete_engines.MelodyAutocompleteEngine,
+    }[kind]
+    return name, engine_class({'file': path, 'autocompleter': autocompleter,
+                               'validation': 'off'})
+
+
+def _connector(args: argparse.Namespace) -> Any:
+    """Return a coroutine function that connects a new client to the socket
+    given on the command line.
+    """
+    if args.unix:
+        return lambda: AutocompleteClient.connect_unix(args.unix)
+    host, port = args.tcp.rsplit(':', 1)
+    return lambda: AutocompleteClient.connect_tcp(host, int(port))
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    """Run a server as described on the command line, until cancelled."""
+    server = AutocompleteServer(dict(_load_engine(spec) for spec in args.engine))
+    if args.unix:
+        asyncio_server = await server.start_unix(args.unix)
+    else:
+        host, port = args.tcp.rsplit(':', 1)
+        asyncio_server = await server.start_tcp(host, int(port))
+    print(f'Serving {", ".join(server.engines)} on {args.unix or args.tcp}')
+    async with asyncio_server:
+        await asyncio_server.serve_forever()
+
+
+async def _load(args: argparse.Namespace) -> None:
+    """Generate load as described on the command line, and print the results."""
+    prefixes = [json.loads(p) if args.json_prefixes else p for p in args.prefixes]
+    results = await generate_load(_connector(args), args.engine, prefixes,
+                                  args.requests, args.concurrency, args.limit)
+    print(json.dumps(results))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Autocomplete server and load generator.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve = commands.add_parser('serve', help='run a server')
+    serve.add_argument('--engine', action='append', required=True,
+                       help='name=kind:autocompleter:file (may be repeated)')
+    load = commands.add_parser('load', help='generate load against a server')
+    load.add_argument('--engine', required=True, help='the name of the engine to query')
+    load.add_argument('--prefixes', nargs='+', required=True, help='the prefixes to query')
+    load.add_argument('--json-prefixes', action='store_true',
+                      help='parse each prefix as JSON (e.g. for melody interval lists)')
+    load.add_argument('--requests', type=int, default=10000)
+    load.add_argument('--concurrency', type=int, default=50)
+    load.add_argument('--limit', type=int, default=10)
+    for command in (serve, load):
+        socket = command.add_mutually_exclusive_group(required=True)
+        socket.add_argument('--unix', metavar='PATH', help='a Unix socket path')
+        socket.add_argument('--tcp', metavar='HOST:PORT', help='a TCP address')
+    arguments = parser.parse_args()
+
+    try:
+        asyncio.run(_serve(arguments) if arguments.command == 'serve' else _load(arguments))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,214 @@
+"""CSC148 Assignment 2: Sharded autocompleter
+
+=== Module Description ===
+This file contains ShardedAutocompleter, an Autocompleter that spreads its
+values over several prefix trees, each stored and searched in its own worker
+process. This lets one autocompleter use the memory and CPU time of several
+processes.
+
+Each value is stored in the shard chosen by the first key_length elements of
+its prefix. An operation on a prefix with at least key_length elements only
+involves that prefix's shard; an operation on a shorter prefix is sent to
+every shard, and their answers are merged.
+"""
+from __future__ import annotations
+import heapq
+import multiprocessing
+from itertools import islice
+from multiprocessing.connection import Connection
+from typing import Any, Iterable
+
+from a2_prefix_tree import Autocompleter, CompressedPrefixTree
+from a2_validation import check_contracts
+
+
+@check_contracts
+class ShardedAutocompleter(Autocompleter):
+    """An Autocompleter whose values are partitioned between prefix trees in
+    worker processes, by the first few elements of their prefixes.
+
+    Values and prefix elements must be picklable, since they are sent to
+    the worker processes. Call close (or use a with statement) to stop the
+    worker processes.
+
+    Instance Attributes:
+    - key_length: the number of prefix elements that determine a value's shard
+
+    Representation Invariants:
+    - self.key_length >= 1
+    - len(self._connections) == len(self._processes)
+    """
+    # Private Instance Attributes:
+    # - _connections: the connection to the worker process of each shard
+    # - _processes: the worker process of each shard
+    key_length: int
+    _connections: list[Connection]
+    _processes: list[multiprocessing.Process]
+
+    def __init__(self, num_shards: int, tree_class: type = CompressedPrefixTree,
+                 key_length: int = 1) -> None:
+        """Initialize an empty autocompleter with <num_shards> shards, each
+        of which is a <tree_class> in a new worker process.
+
+        Preconditions:
+        - num_shards >= 1
+        - key_length >= 1
+        """
+        self.key_length = key_length
+        self._connections, self._processes = [], []
+        for _ in range(num_shards):
+            connection, worker_connection = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_serve_shard,
+                                              args=(worker_connection, tree_class),
+                                              daemon=True)
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+
+    def __enter__(self) -> ShardedAutocompleter:
+        """Return this autocompleter."""
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        """Stop the worker processes."""
+        self.close()
+
+    def close(self) -> None:
+        """Stop the worker processes. This autocompleter cannot be used
+        afterwards.
+        """
+        for connection in self._connections:
+            connection.send(('close', ()))
+            connection.close()
+        for process in self._processes:
+            process.join()
+        self._connections, self._processes = [], []
+
+    def __len__(self) -> int:
+        """Return the number of values stored in this Autocompleter."""
+        return sum(self._call_all('__len__', ()))
+
+    def insert(self, value: Any, weight: float, prefix: list) -> None:
+        """Insert the given value into this Autocompleter.
+
+        The value is inserted with the given weight, and is associated with
+        the prefix sequence <prefix>.
+
+        If the value has already been inserted into this autocompleter
+        (compare values using ==), then the given weight should be *added* to
+        the existing weight of this value.
+
+        Preconditions:
+        - weight > 0
+        - the given value is either:
+            1) not in this Autocompleter, or
+            2) was previously inserted with the SAME prefix sequence
+        """
+        self._call(self._shard_of(prefix), 'insert', (value, weight, prefix))
+
+    def insert_many(self, items: Iterable[tuple[Any, float, list]]) -> None:
+        """Insert each of the given (value, weight, prefix) items, in order.
+
+        Each shard receives its items in one message, and the shards insert
+        them in parallel.
+        """
+        batches = [[] for _ in self._connections]
+        for item in items:
+            batches[self._shard_of(item[2])].append(item)
+        shards = [shard for shard, batch in enumerate(batches) if batch]
+        for shard in shards:
+            self._connections[shard].send(('insert_many', (batches[shard],)))
+        self._receive(shards)
+
+    def autocomplete(self, prefix: list,
+                     limit: int | None = None) -> list[tuple[Any, float]]:
+        """Return up to <limit> matches for the given prefix.
+
+        The return value is a list of tuples (value, weight), and must be
+        sorted by non-increasing weight. You can decide how to break ties.
+
+        If limit is None, return *every* match for the given prefix.
+
+        If <prefix> is shorter than self.key_length, every shard is asked
+        for its best <limit> matches, and the sorted answers are merged.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        if len(prefix) >= self.key_length:
+            return self._call(self._shard_of(prefix), 'autocomplete', (prefix, limit))
+
+        answers = self._call_all('autocomplete', (prefix, limit))
+        return list(islice(heapq.merge(*answers, key=lambda match: match[1], reverse=True),
+                           limit))
+
+    def remove(self, prefix: list) -> None:
+        """Remove all values that match the given prefix.
+        """
+        if len(prefix) >= self.key_length:
+            self._call(self._shard_of(prefix), 'remove', (prefix,))
+        else:
+            self._call_all('remove', (prefix,))
+
+    def _shard_of(self, prefix: list) -> int:
+        """Return the shard that stores the values with the given prefix.
+
+        Preconditions:
+        - len(prefix) >= self.key_length, or <prefix> is the prefix of a value
+        """
+        return hash(tuple(prefix[:self.key_length])) % len(self._connections)
+
+    def _call(self, shard: int, method: str, args: tuple) -> Any:
+        """Return the result of calling <method> with <args> on the tree of
+        the given shard.
+        """
+        self._connections[shard].send((method, args))
+        return self._receive([shard])[0]
+
+    def _call_all(self, method: str, args: tuple) -> list:
+        """Return the results of calling <method> with <args> on the tree of
+        every shard, in shard order. The shards run the calls in parallel.
+        """
+        for connection in self._connections:
+            connection.send((method, args))
+        return self._receive(range(len(self._connections)))
+
+    def _receive(self, shards: Iterable[int]) -> list:
+        """Return the reply of each of the given shards, in order.
+
+        Raise the exception raised by a shard's call, if there is one (after
+        receiving every reply, so that the connections stay in step).
+        """
+        replies = [self._connections[shard].recv() for shard in shards]
+        for ok, result in replies:
+            if not ok:
+                raise result
+        return [result for _, result in replies]
+
+
+def _serve_shard(connection: Connection, tree_class: type) -> None:
+    """Run the worker process of a shard: keep a <tree_class>, call the
+    methods requested on <connection> on it, and send back their results,
+    until asked to close.
+
+    Each request is a (method name, args) tuple, and each reply is either
+    (True, result) or (False, the exception that was raised).
+    """
+    tree = tree_class()
+    while True:
+        method, args = connection.recv()
+        if method == 'close':
+            connection.close()
+            return
+        try:
+            if method == 'insert_many':
+                for item in args[0]:
+                    tree.insert(*item)
+                result = None
+            else:
+                result = getattr(tree, method)(*args)
+        except Exception as error:
+            connection.send((False, error))
+        else:
+            connection.send((True, result))
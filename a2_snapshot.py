@@ -0,0 +1,208 @@
+"""CSC148 Assignment 2: Snapshot files
+
+=== Module Description ===
+This file contains the binary snapshot format used to save built
+autocompleters to disk, and to load them back without rebuilding them.
+
+A snapshot stores a FrozenPrefixTree. All integers are little-endian.
+
+    header:   magic (8 bytes), format version (uint16),
+              flags (uint16), number of sections (uint32)
+    sections: one table entry per section: name (8 bytes, NUL-padded),
+              offset from the start of the file (uint64), length (uint64);
+              followed by the section contents, each aligned to 8 bytes.
+
+The array columns of the tree are stored exactly as they are laid out in
+memory, so that loading a snapshot only has to memory-map the file and take
+typed views of it. The FLAG_BIG_ENDIAN flag records the byte order of the
+machine that wrote the arrays; a snapshot can only be loaded on a machine
+with the same byte order.
+
+The tokens and values of the tree are stored as encoded object sequences:
+a count n (uint64), n + 1 offsets (uint64) into the data that follows, and
+the data itself. Each object is a one-byte tag followed by its encoding:
+
+    b's': a str, in UTF-8
+    b'i': an int, as an int64
+    b'm': a Melody: the length of its name in bytes (uint32), the name
+          in UTF-8, then one (pitch, duration) pair of int32s per note
+
+The optional 'meta' section holds a JSON object (used by the engines).
+"""
+from __future__ import annotations
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from typing import Any
+
+from a2_frozen_tree import FrozenPrefixTree
+
+MAGIC = b'A2SNAPSH'
+FORMAT_VERSION = 2
+FLAG_BIG_ENDIAN = 1
+
+_HEADER = struct.Struct('<8sHHI')
+_ENTRY = struct.Struct('<8sQQ')
+_UINT64 = struct.Struct('<Q')
+
+# The array columns of a FrozenPrefixTree, with the name of the section that
+# stores each of them and its array typecode
+_ARRAY_SECTIONS = {
+    'labels': ('labels', 'I'),
+    'label_starts': ('lstarts', 'I'),
+    'best': ('best', 'd'),
+    'value_ids': ('valueids', 'i'),
+    'louds': ('louds', 'Q'),
+    'zero_ranks': ('zranks', 'I'),
+}
+
+
+################################################################################
+# Writing
+################################################################################
+def write_snapshot(tree: FrozenPrefixTree, path: str,
+                   meta: dict[str, Any] | None = None) -> None:
+    """Write <tree> to a snapshot file at <path>, with the optional JSON
+    object <meta>.
+    """
+    columns = tree._columns()
+    sections = {section: array(code, columns[name]).tobytes()
+                for name, (section, code) in _ARRAY_SECTIONS.items()}
+    sections['tokens'] = _encode_sequence(columns['tokens'])
+    sections['values'] = _encode_sequence(columns['values'])
+    if meta is not None:
+        sections['meta'] = json.dumps(meta).encode('utf-8')
+
+    flags = FLAG_BIG_ENDIAN if sys.byteorder == 'big' else 0
+    offset = _align(_HEADER.size + _ENTRY.size * len(sections))
+    table, contents = [], []
+    for name, data in sections.items():
+        table.append(_ENTRY.pack(name.encode('ascii'), offset, len(data)))
+        contents.append(data + bytes(_align(len(data)) - len(data)))
+        offset += _align(len(data))
+
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(sections)) + b''.join(table)
+    with open(path, 'wb') as f:
+        f.write(header + bytes(_align(len(header)) - len(header)))
+        for data in contents:
+            f.write(data)
+
+
+def _align(n: int) -> int:
+    """Return the smallest multiple of 8 that is >= n."""
+    return (n + 7) // 8 * 8
+
+
+def _encode_sequence(objects: list) -> bytes:
+    """Return the encoded object sequence for <objects>."""
+    encoded = [_encode_object(obj) for obj in objects]
+    offsets = [0]
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    return struct.pack(f'<{len(offsets) + 1}Q', len(objects), *offsets) + b''.join(encoded)
+
+
+def _encode_object(obj: Any) -> bytes:
+    """Return the tagged encoding of <obj>.
+
+    Raise TypeError if <obj> cannot be stored in a snapshot.
+    """
+    if isinstance(obj, str):
+        return b's' + obj.encode('utf-8')
+    elif isinstance(obj, int):
+        return b'i' + struct.pack('<q', obj)
+
+    from a2_melody import Melody
+    if isinstance(obj, Melody):
+        name = obj.name.encode('utf-8')
+        notes = [n for note in obj.notes for n in note]
+        return b'm' + struct.pack('<I', len(name)) + name \
+            + struct.pack(f'<{len(notes)}i', *notes)
+    raise TypeError(f'cannot store a {type(obj).__name__} in a snapshot')
+
+
+################################################################################
+# Reading
+################################################################################
+def read_snapshot(path: str) -> tuple[FrozenPrefixTree, dict[str, Any] | None]:
+    """Return the tree stored in the snapshot file at <path>, and its meta
+    object (or None if it has none).
+
+    The file is memory-mapped: the arrays of the returned tree are views of
+    the file, and values are only decoded when they are accessed.
+
+    Raise ValueError if <path> is not a snapshot that this version can read.
+    """
+    with open(path, 'rb') as f:
+        buffer = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    if len(buffer) < _HEADER.size:
+        raise ValueError(f'{path} is not a snapshot file')
+    magic, version, flags, count = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a snapshot file')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'{path} has snapshot format version {version}, '
+                         f'but only version {FORMAT_VERSION} is supported')
+    if bool(flags & FLAG_BIG_ENDIAN) != (sys.byteorder == 'big'):
+        raise ValueError(f'{path} was written on a machine with a different byte order')
+
+    sections = {}
+    for i in range(count):
+        name, offset, length = _ENTRY.unpack_from(buffer, _HEADER.size + i * _ENTRY.size)
+        sections[name.rstrip(b'\0').decode('ascii')] = buffer[offset:offset + length]
+
+    columns = {name: sections[section].cast(code)
+               for name, (section, code) in _ARRAY_SECTIONS.items()}
+    columns['tokens'] = list(EncodedSequence(sections['tokens']))
+    columns['token_ids'] = {token: i for i, token in enumerate(columns['tokens'])}
+    columns['values'] = EncodedSequence(sections['values'])
+    meta = json.loads(bytes(sections['meta'])) if 'meta' in sections else None
+    return FrozenPrefixTree._from_columns(columns), meta
+
+
+class EncodedSequence(Sequence):
+    """A read-only sequence of objects stored in an encoded object sequence,
+    which decodes each object when it is accessed.
+    """
+    # Private Instance Attributes:
+    # - _buffer: the encoded object sequence
+    # - _length: the number of objects in the sequence
+    _buffer: memoryview
+    _length: int
+
+    def __init__(self, buffer: memoryview) -> None:
+        """Initialize a sequence of the objects encoded in <buffer>."""
+        self._buffer = buffer
+        self._length = _UINT64.unpack_from(buffer)[0]
+
+    def __len__(self) -> int:
+        """Return the number of objects in this sequence."""
+        return self._length
+
+    def __getitem__(self, i: int) -> Any:
+        """Return the object at index <i> of this sequence."""
+        if not 0 <= i < self._length:
+            raise IndexError('sequence index out of range')
+        start, end = struct.unpack_from('<2Q', self._buffer, 8 * (i + 1))
+        data_start = 8 * (self._length + 2)
+        return _decode_object(self._buffer[data_start + start:data_start + end])
+
+
+def _decode_object(data: memoryview) -> Any:
+    """Return the object with the tagged encoding <data>."""
+    tag, body = bytes(data[:1]), data[1:]
+    if tag == b's':
+        return str(body, 'utf-8')
+    elif tag == b'i':
+        return struct.unpack('<q', body)[0]
+    elif tag == b'm':
+        from a2_melody import Melody
+        name_length = struct.unpack_from('<I', body)[0]
+        name = str(body[4:4 + name_length], 'utf-8')
+        numbers = struct.unpack(f'<{(len(body) - 4 - name_length) // 4}i', body[4 + name_length:])
+        return Melody(name, list(zip(numbers[::2], numbers[1::2])))
+    raise ValueError(f'unknown object tag {tag!r} in snapshot')
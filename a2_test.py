@@ -0,0 +1,581 @@
+"""CSC148 Assignment 2: Tests
+
+=== Module Description ===
+This file contains pytest tests for the contract validation levels and the
+autocomplete engines. The validation tests use the real python_ta, and are
+skipped when A2_VALIDATION=off (since the classes are then not
+instrumented).
+"""
+from __future__ import annotations
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+from typing import Iterator
+
+import pytest
+
+from a2_autocomplete_engines import LetterAutocompleteEngine, SentenceAutocompleteEngine
+from a2_cache import PrefixResultCache
+from a2_federated import FederatedAutocompleteEngine
+from a2_frozen_tree import FrozenPrefixTree
+from a2_prefix_tree import SimplePrefixTree, CompressedPrefixTree
+from a2_server import AutocompleteClient, AutocompleteServer, generate_load
+from a2_sharded import ShardedAutocompleter
+from a2_validation import check_contracts, set_validation_level, validation_level
+from a2_word_index import WordIndex
+
+instrumented = pytest.mark.skipif(os.environ.get('A2_VALIDATION') == 'off',
+                                  reason='the classes are not instrumented')
+
+
+@pytest.fixture
+def level() -> Iterator[None]:
+    """Restore the validation level after a test changes it."""
+    original = validation_level()
+    yield
+    set_validation_level(original)
+
+
+@check_contracts
+class _TreeUser:
+    """A class whose method calls a public method of a prefix tree, like an
+    engine does.
+    """
+    tree: SimplePrefixTree
+
+    def __init__(self) -> None:
+        """Initialize with an empty tree."""
+        self.tree = SimplePrefixTree()
+
+    def complete(self, limit: int) -> list:
+        """Return the tree's matches for the empty prefix."""
+        return self.tree.autocomplete([], limit)
+
+
+################################################################################
+# Prefix trees
+################################################################################
+def _check_structure(tree: SimplePrefixTree) -> None:
+    """Check that every non-leaf tree in <tree> has non-empty subtrees, in
+    non-increasing order of weight, whose weights add up to its own; and, if
+    <tree> is compressed, that none of them has a single non-leaf subtree.
+    """
+    stack = [tree]
+    while stack:
+        subtree = stack.pop()
+        if subtree.is_empty() or subtree.is_leaf():
+            continue
+        weights = [child.weight for child in subtree.subtrees]
+        assert weights == sorted(weights, reverse=True)
+        assert all(weight > 0 for weight in weights)
+        assert subtree.weight == pytest.approx(sum(weights))
+        if isinstance(tree, CompressedPrefixTree):
+            assert len(subtree.subtrees) > 1 or subtree.subtrees[0].is_leaf()
+        stack.extend(subtree.subtrees)
+
+
+def _check_matches(tree: SimplePrefixTree, entries: list[list], prefix: list,
+                   limit: int | None) -> None:
+    """Check that tree.autocomplete(prefix, limit) returns the heaviest of the
+    [value, weight, prefix] <entries> that match <prefix>, in non-increasing
+    order of weight. Values of equal weight may come in any order.
+    """
+    matches = sorted(((value, weight) for value, weight, value_prefix in entries
+                      if value_prefix[:len(prefix)] == prefix),
+                     key=lambda match: match[1], reverse=True)
+    expected = matches if limit is None else matches[:limit]
+    results = tree.autocomplete(prefix, limit)
+    assert [weight for _, weight in results] == [weight for _, weight in expected]
+    assert len({value for value, _ in results}) == len(results)
+    assert set(results) <= set(matches)
+
+
+@pytest.mark.parametrize('tree_class', [SimplePrefixTree, CompressedPrefixTree])
+@pytest.mark.parametrize('seed', range(3))
+def test_tree_matches_list_model(tree_class: type, seed: int) -> None:
+    """A prefix tree gives the same answers as a list of [value, weight,
+    prefix] entries searched by brute force, over random inserts and removes.
+
+    Each prefix has two values and the weights are small ints, so there are
+    many ties, and the tree's weights and compression are checked after every
+    remove.
+    """
+    rng = random.Random(seed)
+    tree = tree_class()
+    entries = []
+    for _ in range(150):
+        if rng.random() < 0.75:
+            prefix = [rng.choice('abc') for _ in range(rng.randint(0, 4))]
+            value = ''.join(prefix) + rng.choice('!#')
+            weight = float(rng.randint(1, 3))
+            tree.insert(value, weight, prefix)
+            entry = next((entry for entry in entries if entry[0] == value), None)
+            if entry is None:
+                entries.append([value, weight, prefix])
+            else:
+                entry[1] += weight
+        else:
+            prefix = [rng.choice('abc') for _ in range(rng.randint(0, 2))]
+            tree.remove(prefix)
+            entries = [entry for entry in entries if entry[2][:len(prefix)] != prefix]
+
+        _check_structure(tree)
+        assert len(tree) == len(entries)
+        assert tree.weight == pytest.approx(sum(weight for _, weight, _ in entries))
+        for limit in (None, 1, 2, 5):
+            _check_matches(tree, entries,
+                           [rng.choice('abc') for _ in range(rng.randint(0, 3))], limit)
+
+    tree.remove([])
+    assert tree.is_empty() and tree.root == [] and tree.subtrees == [] and len(tree) == 0
+
+
+################################################################################
+# Validation levels
+################################################################################
+@instrumented
+def test_full_checks_preconditions(level: None) -> None:
+    """The full level checks the preconditions of every public call."""
+    set_validation_level('full')
+    with pytest.raises(AssertionError):
+        SimplePrefixTree().autocomplete([], 0)
+
+
+@instrumented
+def test_full_checks_calls_from_other_classes(level: None) -> None:
+    """A call to a tree made inside another class's method is checked."""
+    set_validation_level('full')
+    with pytest.raises(AssertionError):
+        _TreeUser().complete(0)
+
+
+@instrumented
+def test_full_checks_invariants(level: None) -> None:
+    """The full level checks the representation invariants after each call."""
+    set_validation_level('full')
+    cursor = CompressedPrefixTree().cursor()
+    cursor.prefix.append('a')  # breaks len(_positions) == len(prefix) + 1
+    with pytest.raises(AssertionError):
+        cursor.push('b')
+
+
+@instrumented
+def test_full_accepts_loaded_snapshot(level: None, tmp_path: os.PathLike) -> None:
+    """A tree loaded from a snapshot satisfies its attribute annotations."""
+    set_validation_level('full')
+    tree = CompressedPrefixTree()
+    tree.insert('cat', 2.0, list('cat'))
+    tree.insert('car', 1.0, list('car'))
+    path = os.path.join(tmp_path, 'tree.snap')
+    FrozenPrefixTree(tree).save(path)
+
+    loaded = FrozenPrefixTree.load(path)
+    assert loaded.autocomplete(list('ca')) == [('cat', 2.0), ('car', 1.0)]
+    assert len(loaded) == 2
+
+
+@instrumented
+def test_sampled_checks_some_calls(level: None) -> None:
+    """The sampled level checks one in every N calls."""
+    set_validation_level('sampled', 2)
+    tree = SimplePrefixTree()
+    failures = 0
+    for _ in range(4):
+        try:
+            tree.autocomplete([], 0)
+        except AssertionError:
+            failures += 1
+    assert failures == 2
+
+
+@instrumented
+def test_off_checks_nothing(level: None) -> None:
+    """The off level checks no calls."""
+    set_validation_level('off')
+    assert SimplePrefixTree().autocomplete([], 0) == []
+
+
+@instrumented
+def test_engine_level_is_its_own(level: None, tmp_path: os.PathLike) -> None:
+    """An engine's 'validation' config applies to its calls and to the calls
+    it makes to its tree, not to the rest of the process.
+    """
+    set_validation_level('full')
+    path = os.path.join(tmp_path, 'letters.txt')
+    with open(path, 'w') as file:
+        file.write('cat\ncar\n')
+    engine = LetterAutocompleteEngine({'file': path, 'autocompleter': 'simple',
+                                       'validation': 'off'})
+
+    assert validation_level() == 'full'
+    assert engine.autocomplete('ca', 0) == []
+    with pytest.raises(AssertionError):
+        engine.autocompleter.autocomplete(list('ca'), 0)
+
+    set_validation_level('off')
+    engine = LetterAutocompleteEngine({'file': path, 'autocompleter': 'simple',
+                                       'validation': 'full'})
+    with pytest.raises(AssertionError):
+        engine.autocomplete('ca', 0)
+
+
+################################################################################
+# Snapshots
+################################################################################
+@pytest.mark.parametrize('tree_class', [SimplePrefixTree, CompressedPrefixTree])
+@pytest.mark.parametrize('size', [0, 1, 60])
+def test_frozen_tree_matches_source(tree_class: type, size: int,
+                                    tmp_path: os.PathLike) -> None:
+    """A FrozenPrefixTree built from a tree, and one loaded from a (version 2)
+    snapshot of it, give the same autocomplete and autocomplete_fuzzy answers
+    as the tree, including when it is empty or a single leaf.
+
+    The weights are random floats, so that no two answers tie and the order
+    of the results is the same.
+    """
+    rng = random.Random(size)
+    tree = tree_class()
+    for _ in range(size):
+        prefix = [rng.choice('abc') for _ in range(rng.randint(0, 4))]
+        tree.insert(''.join(prefix) + rng.choice('!#'), rng.uniform(1, 100), prefix)
+    path = os.path.join(tmp_path, 'tree.snap')
+    FrozenPrefixTree(tree).save(path)
+
+    prefixes = [[rng.choice('abcz') for _ in range(rng.randint(0, 4))] for _ in range(30)]
+    for frozen in (FrozenPrefixTree(tree), FrozenPrefixTree.load(path)):
+        assert len(frozen) == len(tree)
+        for prefix in prefixes:
+            for limit in (None, 1, 3):
+                assert frozen.autocomplete(prefix, limit) == tree.autocomplete(prefix, limit)
+                assert frozen.autocomplete_fuzzy(prefix, 1, limit) \
+                    == tree.autocomplete_fuzzy(prefix, 1, limit)
+
+
+def test_save_rejects_dawg(tmp_path: os.PathLike) -> None:
+    """An engine whose autocompleter is not a prefix tree cannot be saved."""
+    path = os.path.join(tmp_path, 'letters.txt')
+    with open(path, 'w') as file:
+        file.write('cat car cart\n')
+    engine = LetterAutocompleteEngine({'file': path, 'autocompleter': 'dawg'})
+
+    with pytest.raises(ValueError):
+        engine.save(os.path.join(tmp_path, 'engine.snap'))
+    assert not os.path.exists(os.path.join(tmp_path, 'engine.snap'))
+
+
+################################################################################
+# Result cache
+################################################################################
+@pytest.mark.parametrize('autocompleter', ['simple', 'compressed'])
+def test_cached_engine_sees_mutations(autocompleter: str, tmp_path: os.PathLike) -> None:
+    """An engine with a result cache returns fresh results after an insert or
+    a remove, for the prefix that changed and for the prefixes around it.
+    """
+    path = os.path.join(tmp_path, 'letters.txt')
+    with open(path, 'w') as file:
+        file.write('cat\ncat\ncar\ndog\n')
+    engine = LetterAutocompleteEngine({'file': path, 'autocompleter': autocompleter,
+                                       'result_cache': 8})
+    for prefix in ('', 'c', 'ca', 'cat'):
+        engine.autocomplete(prefix, 2)
+
+    engine.insert('cab', 3.0)
+    assert engine.autocomplete('ca', 2) == [('cab', 3.0), ('cat', 2.0)]
+    assert engine.autocomplete('', 2) == [('cab', 3.0), ('cat', 2.0)]
+    engine.remove('ca')
+    assert engine.autocomplete('c', 2) == []
+    assert engine.autocomplete('cat', 2) == []
+    assert engine.autocomplete('', 2) == [('dog', 1.0)]
+
+
+def test_cached_results_are_copies(tmp_path: os.PathLike) -> None:
+    """Changing a list returned by an engine with a result cache does not
+    change the results it returns later.
+    """
+    path = os.path.join(tmp_path, 'letters.txt')
+    with open(path, 'w') as file:
+        file.write('cat\ncar\n')
+    engine = LetterAutocompleteEngine({'file': path, 'autocompleter': 'simple',
+                                       'result_cache': 8})
+    first = engine.autocomplete('ca')
+    expected = list(first)
+    first.clear()
+    second = engine.autocomplete('ca')
+    assert second == expected
+    second.append(('dog', 1.0))
+    assert engine.autocomplete('ca') == expected
+    assert engine.result_cache.hits == 2
+
+
+def test_cache_invalidates_prefixes_and_extensions() -> None:
+    """After an insert, the results for the prefixes of its prefix sequence
+    are forgotten; after a remove, those for its extensions are too.
+    """
+    cache = PrefixResultCache(10)
+    for prefix in ([], ['c'], ['c', 'a'], ['c', 'a', 't'], ['d']):
+        cache.put(prefix, None, [('x', 1.0)])
+        cache.put(prefix, 2, [('x', 1.0)])
+
+    cache.invalidate(['c', 'a'], extensions=False)
+    assert [prefix for prefix in ([], ['c'], ['c', 'a'], ['c', 'a', 't'], ['d'])
+            if cache.get(prefix, None) is not None] == [['c', 'a', 't'], ['d']]
+    assert cache.invalidations == 6
+
+    cache.invalidate(['c'], extensions=True)
+    assert cache.get(['c', 'a', 't'], 2) is None
+    assert cache.get(['d'], 2) == [('x', 1.0)]
+    assert len(cache) == 2
+
+
+def test_cache_evicts_least_recently_used() -> None:
+    """A full cache forgets the result that was used least recently."""
+    cache = PrefixResultCache(2)
+    cache.put(['a'], None, [('a', 1.0)])
+    cache.put(['b'], None, [('b', 1.0)])
+    cache.get(['a'], None)
+    cache.put(['c'], None, [('c', 1.0)])
+
+    assert cache.get(['b'], None) is None
+    assert cache.get(['a'], None) == [('a', 1.0)]
+    assert cache.get(['c'], None) == [('c', 1.0)]
+    assert cache.evictions == 1 and len(cache) == 2
+
+
+################################################################################
+# Word index
+################################################################################
+@pytest.mark.parametrize('autocompleter', ['simple', 'compressed'])
+def test_anywhere_after_mutations_with_interning(autocompleter: str,
+                                                 tmp_path: os.PathLike) -> None:
+    """autocomplete_anywhere sees the strings inserted and removed since the
+    engine was built, when the prefix sequences are interned.
+    """
+    path = os.path.join(tmp_path, 'sentences.csv')
+    with open(path, 'w') as file:
+        file.write('how to tie a tie,20\nhow to cook,5\ntie dye,3\n')
+    engine = SentenceAutocompleteEngine({'file': path, 'autocompleter': autocompleter,
+                                         'intern_tokens': True, 'word_index': True})
+
+    engine.insert('tie a bow', 1.0)
+    assert engine.autocomplete_anywhere('tie', 5) == [('how to tie a tie', 20.0),
+                                                      ('tie dye', 3.0), ('tie a bow', 1.0)]
+    engine.remove('how')
+    assert engine.autocomplete_anywhere('tie', 5) == [('tie dye', 3.0), ('tie a bow', 1.0)]
+
+
+def test_word_index_insert_and_remove() -> None:
+    """A word index sees the sentences inserted and removed since it was
+    built, both before and after its posting lists are rebuilt.
+    """
+    index = WordIndex([('how to tie a tie', 20.0, []), ('tie dye', 3.0, [])])
+    index.insert('tie dye', 30.0)
+    index.insert('a tie rack', 4.0)
+    index.remove(['how'])
+    expected = [('tie dye', 33.0), ('a tie rack', 4.0)]
+    assert index.search(['tie']) == expected
+    assert len(index) == 2
+
+    for i in range(100):  # enough to rebuild the posting lists
+        index.insert(f'word{i}', 1.0)
+    assert index.search(['tie']) == expected
+    assert index.search(['word99']) == [('word99', 1.0)]
+    assert len(index) == 102
+
+
+################################################################################
+# Sharded autocompleter
+################################################################################
+class _FailingRemoveTree(SimplePrefixTree):
+    """A tree whose remove always fails, to test how errors in a shard reach
+    the caller.
+    """
+
+    def remove(self, prefix: list) -> None:
+        """Raise ValueError."""
+        raise ValueError(f'cannot remove {prefix}')
+
+
+def _check_same(sharded: ShardedAutocompleter, tree: SimplePrefixTree) -> None:
+    """Check that <sharded> and <tree> give the same answers for every prefix
+    of up to three letters, with and without a limit.
+    """
+    prefixes = [[]] + [[a] for a in 'abc'] + [[a, b] for a in 'abc' for b in 'abc'] \
+        + [[a, b, c] for a in 'abc' for b in 'abc' for c in 'abc']
+    for prefix in prefixes:
+        assert sharded.autocomplete(prefix) == tree.autocomplete(prefix)
+        assert sharded.autocomplete(prefix, 3) == tree.autocomplete(prefix, 3)
+
+
+def test_sharded_matches_one_tree() -> None:
+    """A ShardedAutocompleter gives the same answers as one SimplePrefixTree
+    with the same values, whether a prefix is routed to one shard or sent to
+    every shard and merged.
+    """
+    rng = random.Random(14)
+    words = {''.join(rng.choice('abc') for _ in range(rng.randint(1, 5))) for _ in range(200)}
+    items = [(word, rng.uniform(1, 100), list(word)) for word in sorted(words)]
+    tree = SimplePrefixTree()
+    with ShardedAutocompleter(3, key_length=2) as sharded:
+        sharded.insert_many(items[:100])
+        for item in items:
+            tree.insert(*item)
+        for item in items[100:]:
+            sharded.insert(*item)
+        _check_same(sharded, tree)
+
+        for prefix in (['a', 'b'], ['c'], ['b', 'a', 'c']):
+            sharded.remove(prefix)
+            tree.remove(prefix)
+        assert len(sharded) == len(tree)
+        _check_same(sharded, tree)
+
+
+def test_sharded_raises_shard_errors() -> None:
+    """An exception raised in a shard's worker process is raised by the call
+    that caused it, and the autocompleter can still be used afterwards.
+    """
+    with ShardedAutocompleter(2, _FailingRemoveTree) as sharded:
+        sharded.insert('cat', 1.0, list('cat'))
+        with pytest.raises(ValueError):
+            sharded.remove([])
+        assert sharded.autocomplete([]) == [('cat', 1.0)]
+
+
+def test_sharded_close_stops_workers() -> None:
+    """Leaving a with statement stops every worker process cleanly."""
+    before = set(multiprocessing.active_children())
+    with ShardedAutocompleter(3) as sharded:
+        sharded.insert('cat', 1.0, list('cat'))
+        workers = [process for process in multiprocessing.active_children()
+                   if process not in before]
+        assert len(workers) == 3
+    assert all(not worker.is_alive() and worker.exitcode == 0 for worker in workers)
+
+
+################################################################################
+# Federated engine
+################################################################################
+def test_federated_matches_merged_sources() -> None:
+    """A federated engine returns, for each value matching the prefix in any
+    source, its highest weight times its source's multiplier, sorted by
+    non-increasing weight and cut off at the limit.
+    """
+    rng = random.Random(25)
+    engine = FederatedAutocompleteEngine()
+    best = {}  # maps each value to its expected weight and its prefix
+    for name, multiplier in (('a', 1.0), ('b', 2.5), ('c', 0.3)):
+        tree = CompressedPrefixTree()
+        for _ in range(40):
+            prefix = [rng.choice('abc') for _ in range(rng.randint(0, 3))]
+            value = ''.join(prefix) + rng.choice('!#')
+            weight = rng.uniform(1, 100)
+            tree.insert(value, weight, prefix)
+        for value, weight in tree.autocomplete([]):
+            if value not in best or weight * multiplier > best[value][0]:
+                best[value] = (weight * multiplier, list(value[:-1]))
+        engine.add_source(name, tree, multiplier)
+
+    for prefix in ([], ['a'], ['b', 'c'], ['c', 'c', 'c']):
+        matches = sorted(((value, weight) for value, (weight, value_prefix) in best.items()
+                          if value_prefix[:len(prefix)] == prefix),
+                         key=lambda match: match[1], reverse=True)
+        for limit in (None, 1, 4):
+            expected = matches if limit is None else matches[:limit]
+            assert engine.autocomplete(prefix, limit) == expected
+
+
+def test_federated_keeps_highest_weight() -> None:
+    """A value in several sources is returned once, with the highest of its
+    multiplied weights, which changes with set_multiplier.
+    """
+    first, second = SimplePrefixTree(), SimplePrefixTree()
+    first.insert('cat', 2.0, list('cat'))
+    first.insert('car', 1.5, list('car'))
+    second.insert('cat', 1.0, list('cat'))
+    engine = FederatedAutocompleteEngine()
+    engine.add_source('first', first)
+    engine.add_source('second', second, 3.0)
+
+    assert engine.autocomplete(list('ca')) == [('cat', 3.0), ('car', 1.5)]
+    assert engine.autocomplete(list('ca'), 1) == [('cat', 3.0)]
+    engine.set_multiplier('second', 0.5)
+    assert engine.autocomplete(list('ca')) == [('cat', 2.0), ('car', 1.5)]
+    with pytest.raises(ValueError):
+        engine.add_source('first', second)
+
+
+def test_federated_replace_source() -> None:
+    """replace_source swaps in a new autocompleter for one source, returns
+    the old one and keeps its multiplier unless given a new one.
+    """
+    old, new = SimplePrefixTree(), CompressedPrefixTree()
+    old.insert('dog', 1.0, list('dog'))
+    new.insert('door', 2.0, list('door'))
+    other = SimplePrefixTree()
+    other.insert('dot', 3.0, list('dot'))
+    engine = FederatedAutocompleteEngine()
+    engine.add_source('words', old, 2.0)
+    engine.add_source('other', other)
+
+    assert engine.replace_source('words', new) is old
+    assert engine.source('words') == (new, 2.0)
+    assert engine.autocomplete(list('do')) == [('door', 4.0), ('dot', 3.0)]
+    assert engine.replace_source('words', old, 5.0) is new
+    assert engine.autocomplete(list('do')) == [('dog', 5.0), ('dot', 3.0)]
+    assert engine.source_names() == ['words', 'other']
+    with pytest.raises(KeyError):
+        engine.replace_source('missing', new)
+
+
+################################################################################
+# Server
+################################################################################
+def test_server_coalesces_identical_requests(tmp_path: os.PathLike) -> None:
+    """Identical requests that arrive together are answered by one query,
+    and every one of them gets the answer.
+    """
+    path = os.path.join(tmp_path, 'letters.txt')
+    with open(path, 'w') as file:
+        file.write('cat\ncat\ncar\ndog\n')
+    server = AutocompleteServer({'words': LetterAutocompleteEngine(
+        {'file': path, 'autocompleter': 'compressed'})})
+    socket_path = os.path.join(tmp_path, 'server.sock')
+
+    async def run() -> tuple[list[dict], dict[str, int]]:
+        asyncio_server = await server.start_unix(socket_path)
+        async with asyncio_server:
+            # Sent in one write, so that the server reads them together
+            reader, writer = await asyncio.open_unix_connection(socket_path)
+            requests = [{'id': i, 'engine': 'words', 'prefix': 'ca', 'limit': 5}
+                        for i in range(5)]
+            writer.write(b''.join(json.dumps(request).encode() + b'\n'
+                                  for request in requests))
+            responses = [json.loads(await reader.readline()) for _ in requests]
+            writer.close()
+
+            client = await AutocompleteClient.connect_unix(socket_path)
+            stats = await client.stats()
+            await client.close()
+        return responses, stats
+
+    responses, stats = asyncio.run(run())
+    assert sorted(response['id'] for response in responses) == list(range(5))
+    assert all(response['results'] == [['cat', 2.0], ['car', 1.0]] for response in responses)
+    assert stats['requests'] == 5
+    assert stats['coalesced'] == 4
+    assert stats['queries'] == 1
+
+
+def test_generate_load_rejects_empty_load() -> None:
+    """generate_load raises ValueError, without connecting, if it has no
+    prefixes or no requests to send.
+    """
+    async def connect() -> AutocompleteClient:
+        raise AssertionError('generate_load should not connect')
+
+    with pytest.raises(ValueError):
+        asyncio.run(generate_load(connect, 'words', [], 10))
+    with pytest.raises(ValueError):
+        asyncio.run(generate_load(connect, 'words', ['a'], 0))
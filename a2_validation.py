@@ -0,0 +1,292 @@
+"""CSC148 Assignment 2: Validation levels
+
+=== Module Description ===
+This file contains the check_contracts decorator used by the classes in this
+assignment. It applies python_ta.contracts.check_contracts to the public
+methods of a class (and __init__ and __len__), and after each call checks the
+class's representation invariants and attribute type annotations, as
+python_ta's class decorator does, at one of three validation levels:
+
+- 'full': on every call to a public method (other than the calls made while
+  another method of the same class is running)
+- 'sampled': on one in every N of those calls
+- 'off': never
+
+The process-wide level is chosen with the A2_VALIDATION environment variable
+(default 'full'), and N with A2_VALIDATION_EVERY (default 100); both can be
+changed while running with set_validation_level.
+
+An instance can also choose its own level: the engines take one from the
+'validation' key of their config. A class whose instances do this has a
+_validation_level attribute, which is None for the instances that use the
+process-wide level. The level of an instance also applies to the calls made
+while one of its methods is running, e.g. by an engine to its tree.
+
+If A2_VALIDATION is 'off' when the classes are defined, they are not
+instrumented at all (so they run at full speed, and python_ta is never
+imported), and no level other than 'off' can be chosen. Otherwise python_ta
+is imported when the first check is due.
+
+An annotation may name a class through a module that its own module only
+imports when it is needed, as a string (e.g. 'a2_melody.Melody'); that
+module is imported when the annotation is first checked.
+"""
+from __future__ import annotations
+import functools
+import importlib
+import os
+import sys
+import typing
+from types import FunctionType
+from typing import Any, Callable
+
+LEVELS = ('full', 'sampled', 'off')
+
+# The attribute that holds the level of an instance that chooses its own
+_LEVEL_ATTRIBUTE = '_validation_level'
+
+
+def _environment_level() -> str:
+    """Return the level chosen by the A2_VALIDATION environment variable.
+
+    Raise ValueError if it is not a validation level.
+    """
+    level = os.environ.get('A2_VALIDATION', 'full')
+    if level not in LEVELS:
+        raise ValueError(f'A2_VALIDATION must be one of {LEVELS}, not {level!r}')
+    return level
+
+
+_ENV_LEVEL = _environment_level()
+
+# Whether the classes defined from now on are instrumented
+_INSTRUMENTED = _ENV_LEVEL != 'off'
+
+
+class _Settings:
+    """The validation state of this process.
+
+    Instance Attributes:
+    - level: the process-wide validation level
+    - every: the 'sampled' level checks one in every <every> calls
+    - calls: the number of calls made at the 'sampled' level since the last
+      checked one
+    - active: the classes with an instrumented call in progress (on any
+      instance). Calls made while another call on the same class is in
+      progress (e.g. by a tree's method to the public methods of its
+      subtrees) are neither counted nor checked; calls to other classes
+      (e.g. by an engine to its tree) are.
+    - owner: the instance with its own level (see the module description)
+      whose call is in progress, or None if there is no such call
+    - annotations: the attribute type annotations of each class whose
+      instances have been checked, including its superclasses'
+    """
+    level: str
+    every: int
+    calls: int
+    active: set[type]
+    owner: Any
+    annotations: dict[type, dict[str, Any]]
+
+    def __init__(self, level: str, every: int) -> None:
+        """Initialize the settings of a process with the given level."""
+        self.level = level
+        self.every = every
+        self.calls = 0
+        self.active = set()
+        self.owner = None
+        self.annotations = {}
+
+
+_SETTINGS = _Settings(_ENV_LEVEL, int(os.environ.get('A2_VALIDATION_EVERY', '100')))
+
+
+def check_level(level: str) -> None:
+    """Raise ValueError if <level> is not a validation level, or if it is not
+    'off' but the classes were defined with validation turned off.
+    """
+    if level not in LEVELS:
+        raise ValueError(f'validation level must be one of {LEVELS}, not {level!r}')
+    if level != 'off' and not _INSTRUMENTED:
+        raise ValueError('validation was turned off by A2_VALIDATION=off '
+                         'when the classes were defined')
+
+
+def validation_level() -> str:
+    """Return the process-wide validation level."""
+    return _SETTINGS.level
+
+
+def set_validation_level(level: str, every: int | None = None) -> None:
+    """Set the process-wide validation level to <level>. If <every> is given,
+    the 'sampled' level checks one in every <every> public method calls.
+
+    Raise ValueError if <level> cannot be chosen (see check_level).
+    """
+    check_level(level)
+    _SETTINGS.level = level
+    if every is not None:
+        _SETTINGS.every = every
+
+
+def check_contracts(cls: type) -> type:
+    """Instrument the public methods of <cls> (and __init__ and __len__) so
+    that they check the contracts of <cls> at the current validation level.
+    """
+    if not _INSTRUMENTED:
+        return cls
+
+    own_level = hasattr(cls, _LEVEL_ATTRIBUTE)
+    for name, method in list(vars(cls).items()):
+        if isinstance(method, FunctionType) \
+                and (not name.startswith('_') or name in ('__init__', '__len__')):
+            setattr(cls, name, _instrument(method, own_level))
+    return cls
+
+
+def _instrument(method: Callable, own_level: bool) -> Callable:
+    """Return a version of <method> that checks its contracts, and the
+    invariants and attribute types of the instance it is called on, when they
+    are due to be checked at the current validation level.
+
+    <own_level> is whether the instances of the method's class have a
+    _validation_level attribute.
+    """
+    checked = None
+
+    @functools.wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        nonlocal checked
+        settings = _SETTINGS
+        outer = settings.owner
+        if outer is None and not own_level:
+            owner, level = None, settings.level
+        else:
+            owner = self if outer is None else outer
+            level = getattr(owner, _LEVEL_ATTRIBUTE) or settings.level
+        # Nothing to check or to record, e.g. a call at the 'off' level
+        if level == 'off' and owner is outer:
+            return method(self, *args, **kwargs)
+        cls = type(self)
+        if cls in settings.active:
+            return method(self, *args, **kwargs)
+
+        due = level == 'full'
+        if level == 'sampled':
+            settings.calls += 1
+            due = settings.calls >= settings.every
+            if due:
+                settings.calls = 0
+        if due and checked is None:
+            from python_ta.contracts import check_contracts as check_function
+            method.__annotations__.update(_type_hints(method))
+            checked = check_function(method)
+
+        settings.active.add(cls)
+        settings.owner = owner
+        try:
+            result = (checked if due else method)(self, *args, **kwargs)
+        finally:
+            settings.active.discard(cls)
+            settings.owner = outer
+        if due:
+            _check_instance(self)
+        return result
+
+    return wrapper
+
+
+def _check_instance(instance: Any) -> None:
+    """Raise AssertionError if <instance> violates a representation invariant
+    or an attribute type annotation of its class.
+    """
+    from python_ta.contracts import validate_invariants
+    from typeguard import CollectionCheckStrategy, TypeCheckError, check_type
+
+    cls = type(instance)
+    _set_invariants(cls)
+    validate_invariants(instance if hasattr(instance, '__dict__') else _Marked(instance))
+
+    if cls not in _SETTINGS.annotations:
+        _SETTINGS.annotations[cls] = _type_hints(cls)
+    for name, annotation in _SETTINGS.annotations[cls].items():
+        if not hasattr(instance, name):
+            continue  # e.g. a slot that this instance does not use
+        try:
+            check_type(getattr(instance, name), annotation,
+                       collection_check_strategy=CollectionCheckStrategy.ALL_ITEMS)
+        except TypeCheckError:
+            raise AssertionError(f'{cls.__name__} attribute {name} did not match its '
+                                 f'type annotation {annotation}') from None
+
+
+def _type_hints(obj: Any) -> dict[str, Any]:
+    """Return the type annotations of the function or class <obj>, evaluated.
+
+    The modules that they name but that are not imported in their own module
+    (see the module description) are imported.
+    """
+    # For a class, its own module's names are looked up as well as those of
+    # the module of each superclass that an annotation comes from
+    names = dict(vars(sys.modules[obj.__module__])) if isinstance(obj, type) else {}
+    while True:
+        try:
+            return typing.get_type_hints(obj, localns=names)
+        except NameError as error:
+            if error.name in names:
+                raise
+            names[error.name] = importlib.import_module(error.name)
+
+
+def _set_invariants(cls: type) -> None:
+    """Give <cls> the __representation_invariants__ attribute that
+    python_ta.contracts.validate_invariants reads, if it does not have it yet:
+    the representation invariants of <cls> and its superclasses that are
+    valid Python expressions, with their compiled code.
+
+    (python_ta's class decorator sets this attribute, but also replaces the
+    class's __setattr__, which these classes do not want.)
+    """
+    if '__representation_invariants__' in vars(cls):
+        return
+    from python_ta.contracts import parse_assertions
+
+    invariants = []
+    for klass in reversed(cls.__mro__):
+        for invariant in parse_assertions(klass, parse_token='Representation Invariant'):
+            try:
+                invariants.append((invariant, compile(invariant, '<string>', 'eval')))
+            except SyntaxError:
+                continue  # a description rather than an expression
+    setattr(cls, '__representation_invariants__', invariants)
+
+
+class _Marked:
+    """A stand-in for an instance of a class with __slots__ (e.g. a prefix
+    tree), for validate_invariants.
+
+    validate_invariants marks the instance it checks with an attribute, which
+    such an instance cannot have, so the stand-in takes the mark. Everything
+    else, including its class, is the instance's; the values of its slots are
+    copied into the stand-in's __dict__, so that they appear in the message
+    of a failed check.
+    """
+    __slots__: tuple[str, ...] = ('_instance', '__dict__')
+    _instance: Any
+
+    def __init__(self, instance: Any) -> None:
+        """Initialize a stand-in for <instance>."""
+        self._instance = instance
+        for klass in type(instance).__mro__:
+            for name in getattr(klass, '__slots__', ()):
+                if hasattr(instance, name):
+                    self.__dict__[name] = getattr(instance, name)
+
+    @property
+    def __class__(self) -> type:
+        """The class of the instance."""
+        return type(self._instance)
+
+    def __getattr__(self, name: str) -> Any:
+        """Return the attribute <name> of the instance."""
+        return getattr(self._instance, name)
@@ -0,0 +1,94 @@
+"""CSC148 Assignment 2: Token vocabulary
+
+=== Module Description ===
+This file contains Vocabulary, which interns the elements of prefix
+sequences (characters, words or intervals) as small integers, so that the
+engines can give their prefix trees compact array('I') prefix sequences
+instead of lists of objects (see the 'intern_tokens' config key of each
+engine).
+
+An array stores each element in 4 bytes instead of a reference to a separate
+object, so the trees no longer keep every copy of a repeated word alive
+(the words of each sentence are separate string objects), and slicing or
+comparing two roots works on their buffers directly. Characters and small
+intervals are already shared by Python, so they gain little.
+"""
+from __future__ import annotations
+from array import array
+from typing import Any, Iterable
+
+from a2_validation import check_contracts
+
+# The id of every token that has not been interned. No interned token has
+# this id, so a prefix sequence containing it matches nothing.
+UNKNOWN_ID = 0xFFFFFFFF
+
+
+@check_contracts
+class Vocabulary:
+    """A mapping between tokens and the integers 0, 1, 2, ..., in the order
+    the tokens were first interned.
+
+    Representation Invariants:
+    - len(self._tokens) == len(self._ids)
+    - len(self._tokens) < UNKNOWN_ID
+    """
+    # Private Instance Attributes:
+    # - _tokens:
+    #     The interned tokens; the id of a token is its index in this list.
+    # - _ids:
+    #     Maps each interned token to its id.
+    _tokens: list
+    _ids: dict[Any, int]
+
+    def __init__(self, tokens: Iterable = ()) -> None:
+        """Initialize a vocabulary of the given tokens, with ids in order.
+
+        Preconditions:
+        - the given tokens are distinct and hashable
+        """
+        self._tokens = list(tokens)
+        self._ids = {token: i for i, token in enumerate(self._tokens)}
+
+    def __len__(self) -> int:
+        """Return the number of tokens in this vocabulary."""
+        return len(self._tokens)
+
+    def tokens(self) -> list:
+        """Return the tokens of this vocabulary, in order of id."""
+        return list(self._tokens)
+
+    def intern(self, tokens: Iterable) -> array:
+        """Return the ids of <tokens>, adding the tokens that are not in this
+        vocabulary yet.
+        """
+        ids = self._ids
+        encoded = array('I')
+        for token in tokens:
+            token_id = ids.get(token)
+            if token_id is None:
+                token_id = ids[token] = len(self._tokens)
+                self._tokens.append(token)
+            encoded.append(token_id)
+        return encoded
+
+    def lookup(self, tokens: Iterable) -> array:
+        """Return the ids of <tokens>, with UNKNOWN_ID for each token that is
+        not in this vocabulary.
+        """
+        ids = self._ids
+        return array('I', [ids.get(token, UNKNOWN_ID) for token in tokens])
+
+    def lookup_token(self, token: Any) -> int:
+        """Return the id of <token>, or UNKNOWN_ID if it is not in this
+        vocabulary.
+        """
+        return self._ids.get(token, UNKNOWN_ID)
+
+    def decode(self, ids: Iterable[int]) -> list:
+        """Return the tokens with the given ids.
+
+        Preconditions:
+        - every id is the id of a token in this vocabulary
+        """
+        return [self._tokens[token_id] for token_id in ids]
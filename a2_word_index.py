@@ -0,0 +1,314 @@
+"""CSC148 Assignment 2: Word index
+
+=== Module Description ===
+This file contains WordIndex, an inverted index from words to the sentences
+that contain them, which the SentenceAutocompleteEngine can use to match a
+prefix anywhere in a sentence rather than only at its start (see the
+'word_index' config key of that engine).
+
+Sentences are numbered in non-increasing order of weight, so a posting list
+(the sorted ids of the sentences that contain a word) is also sorted by
+weight, and the first matches found are the heaviest: a query stops as soon
+as it has <limit> of them. Each posting list is stored as the differences
+between consecutive ids, in a variable-length byte encoding (7 bits per
+byte, with the high bit set on every byte but the last).
+
+Since inserting a sentence or changing its weight would renumber the
+sentences after it, changes are not written into the posting lists: an
+inserted sentence is kept in a small list of pending sentences that each
+query scans, and a removed one is skipped by each query. Once the changes
+are more than a fraction of the index (see _REBUILD_FRACTION), the posting
+lists are rebuilt, so that each change costs O(1) rebuilt sentences,
+amortized.
+"""
+from __future__ import annotations
+import heapq
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import Iterable, Iterator
+
+from a2_validation import check_contracts
+
+# The most words a prefix can start for its merged posting list to be added to
+# those of the whole words of a query
+_NARROW_PREFIX = 8
+
+# The posting lists are rebuilt once the sentences inserted or removed since
+# they were built are more than this fraction of the indexed sentences (or
+# more than _MIN_REBUILD of them, for a small index)
+_REBUILD_FRACTION = 0.125
+_MIN_REBUILD = 64
+
+
+@check_contracts
+class WordIndex:
+    """An inverted index of weighted sentences, for finding the sentences
+    that contain a sequence of words.
+
+    Representation Invariants:
+    - len(self._sentences) == len(self._weights)
+    - len(self._posting_starts) == len(self._words) + 1
+    - all(0 <= i < len(self._sentences) for i in self._removed)
+    - all(weight > 0 for weight in self._pending.values())
+    """
+    # Private Instance Attributes:
+    # - _sentences:
+    #     The indexed sentences, in non-increasing order of weight. A
+    #     sentence's id is its index in this list.
+    # - _weights:
+    #     The weight of each sentence, by id.
+    # - _words:
+    #     The distinct words in the sentences, in sorted order. A word's id
+    #     is its index in this list.
+    # - _word_ids:
+    #     Maps each word in _words to its id.
+    # - _postings:
+    #     The encoded posting lists of all the words, by word id.
+    # - _posting_starts:
+    #     The posting list of word i is
+    #     _postings[_posting_starts[i]:_posting_starts[i + 1]].
+    # - _removed:
+    #     The ids of the sentences that have been removed, or whose weight
+    #     has changed, since the posting lists were built.
+    # - _pending:
+    #     Maps each sentence inserted since the posting lists were built (or
+    #     whose weight has changed since then) to its weight.
+    _sentences: list[str]
+    _weights: array
+    _words: list[str]
+    _word_ids: dict[str, int]
+    _postings: bytes
+    _posting_starts: array
+    _removed: set[int]
+    _pending: dict[str, float]
+
+    def __init__(self, items: Iterable[tuple[str, float, list[str]]]) -> None:
+        """Initialize an index of the sentences in the given (sentence,
+        weight, words) items. The weights of repeated sentences are added
+        together.
+
+        Preconditions:
+        - the words of each item are sentence.split()
+        """
+        totals = {}
+        for sentence, weight, _ in items:
+            totals[sentence] = totals.get(sentence, 0.0) + weight
+        self._build(totals)
+
+    def _build(self, totals: dict[str, float]) -> None:
+        """Build the posting lists of the sentences in <totals>, which maps
+        each sentence to its weight, replacing any sentences indexed so far.
+        """
+        self._sentences = sorted(totals, key=totals.get, reverse=True)
+        self._weights = array('d', (totals[sentence] for sentence in self._sentences))
+
+        postings = {}
+        for sentence_id, sentence in enumerate(self._sentences):
+            for word in set(sentence.split()):
+                postings.setdefault(word, []).append(sentence_id)
+        self._words = sorted(postings)
+        self._word_ids = {word: i for i, word in enumerate(self._words)}
+
+        encoded = bytearray()
+        self._posting_starts = array('Q', [0])
+        for word in self._words:
+            _encode_postings(postings[word], encoded)
+            self._posting_starts.append(len(encoded))
+        self._postings = bytes(encoded)
+        self._removed, self._pending = set(), {}
+
+    def __len__(self) -> int:
+        """Return the number of sentences in this index."""
+        return len(self._sentences) - len(self._removed) + len(self._pending)
+
+    def insert(self, sentence: str, weight: float) -> None:
+        """Add <weight> to the weight of <sentence>, adding it to this index
+        if it is not in it yet.
+
+        Preconditions:
+        - weight > 0
+        """
+        if sentence not in self._pending:
+            sentence_id = self._find(sentence)
+            if sentence_id != -1:
+                self._removed.add(sentence_id)
+                weight += self._weights[sentence_id]
+        self._pending[sentence] = self._pending.get(sentence, 0.0) + weight
+        self._rebuild_if_stale()
+
+    def remove(self, words: list[str]) -> None:
+        """Remove the sentences whose first words are <words> (every
+        sentence, if <words> is empty).
+        """
+        n = len(words)
+        self._pending = {sentence: weight for sentence, weight in self._pending.items()
+                         if sentence.split()[:n] != words}
+        candidates = self._containing(words) if words else range(len(self._sentences))
+        self._removed.update(sentence_id for sentence_id in candidates
+                             if self._sentences[sentence_id].split()[:n] == words)
+        self._rebuild_if_stale()
+
+    def search(self, words: list[str], limit: int | None = None) -> list[tuple[str, float]]:
+        """Return up to <limit> (sentence, weight) tuples for the sentences
+        that contain <words> as consecutive words, where the last word only
+        has to be the start of a word of the sentence. They are sorted by
+        non-increasing weight.
+
+        If <words> is empty, every sentence matches.
+
+        Preconditions:
+        - limit is None or limit > 0
+        """
+        matches = self._search_built(words)
+        if self._pending:
+            pending = sorted(((sentence, weight) for sentence, weight in self._pending.items()
+                              if not words or _contains_phrase(sentence.split(), words[:-1],
+                                                               words[-1])),
+                             key=lambda match: match[1], reverse=True)
+            matches = heapq.merge(matches, pending, key=lambda match: match[1], reverse=True)
+        return list(islice(matches, limit))
+
+    def _search_built(self, words: list[str]) -> Iterator[tuple[str, float]]:
+        """Yield (sentence, weight) for the sentences in the posting lists
+        that match <words> (see search) and have not been removed, in
+        non-increasing order of weight.
+        """
+        if not words:
+            ids = iter(range(len(self._sentences)))
+        else:
+            ids = self._matching_ids(words)
+        removed = self._removed
+        return ((self._sentences[i], self._weights[i]) for i in ids if i not in removed)
+
+    def _matching_ids(self, words: list[str]) -> Iterator[int]:
+        """Yield the ids of the sentences in the posting lists that contain
+        the non-empty <words>, as search matches them, in increasing order.
+        """
+        *whole, last = words
+        lists = []
+        for word in dict.fromkeys(whole):
+            if word not in self._word_ids:
+                return iter(())
+            lists.append(self._postings_of(self._word_ids[word]))
+        # Merging the posting lists of every word that starts with <last> is
+        # only worth it when there is no other list to drive the search, or
+        # when few words start with it (so it is cheap, and likely short)
+        first, end = self._prefix_range(last)
+        if not lists or end - first <= _NARROW_PREFIX:
+            lists.append(self._prefix_postings(first, end))
+
+        # The candidates contain the words, in increasing order of id (so
+        # decreasing weight); keep those that contain the phrase
+        return (sentence_id for sentence_id in _intersect(lists)
+                if _contains_phrase(self._sentences[sentence_id].split(), whole, last))
+
+    def _find(self, sentence: str) -> int:
+        """Return the id of <sentence> in the posting lists, or -1 if it is
+        not in them or has been removed.
+        """
+        for sentence_id in self._containing(sentence.split()):
+            if self._sentences[sentence_id] == sentence and sentence_id not in self._removed:
+                return sentence_id
+        return -1
+
+    def _containing(self, words: list[str]) -> Iterable[int]:
+        """Return the ids of the sentences in the posting lists that contain
+        each of the non-empty <words>, in increasing order.
+        """
+        if not all(word in self._word_ids for word in words):
+            return ()
+        return _intersect([self._postings_of(self._word_ids[word])
+                           for word in dict.fromkeys(words)])
+
+    def _rebuild_if_stale(self) -> None:
+        """Rebuild the posting lists if too many sentences have been inserted
+        or removed since they were built.
+        """
+        changes = len(self._removed) + len(self._pending)
+        if changes > max(_MIN_REBUILD, _REBUILD_FRACTION * len(self._sentences)):
+            totals = {sentence: weight
+                      for sentence_id, (sentence, weight)
+                      in enumerate(zip(self._sentences, self._weights))
+                      if sentence_id not in self._removed}
+            totals.update(self._pending)
+            self._build(totals)
+
+    def _postings_of(self, word_id: int) -> Iterator[int]:
+        """Yield the ids of the sentences that contain the word <word_id>, in
+        increasing order.
+        """
+        return _decode_postings(self._postings, self._posting_starts[word_id],
+                                self._posting_starts[word_id + 1])
+
+    def _prefix_range(self, prefix: str) -> tuple[int, int]:
+        """Return (first, end) such that the words that start with <prefix>
+        are _words[first:end].
+        """
+        first = bisect_left(self._words, prefix)
+        end = first
+        while end < len(self._words) and self._words[end].startswith(prefix):
+            end += 1
+        return first, end
+
+    def _prefix_postings(self, first: int, end: int) -> Iterator[int]:
+        """Yield the ids of the sentences that contain one of the words
+        _words[first:end], in increasing order.
+        """
+        previous = -1
+        for sentence_id in heapq.merge(*(self._postings_of(i) for i in range(first, end))):
+            if sentence_id != previous:
+                yield sentence_id
+                previous = sentence_id
+
+
+def _encode_postings(ids: list[int], encoded: bytearray) -> None:
+    """Append the encoding of the increasing list <ids> to <encoded>."""
+    previous = 0
+    for sentence_id in ids:
+        gap = sentence_id - previous
+        while gap >= 0x80:
+            encoded.append(gap & 0x7F | 0x80)
+            gap >>= 7
+        encoded.append(gap)
+        previous = sentence_id
+
+
+def _decode_postings(encoded: bytes, start: int, end: int) -> Iterator[int]:
+    """Yield the ids in the posting list encoded in encoded[start:end]."""
+    sentence_id, gap, shift = 0, 0, 0
+    for byte in memoryview(encoded)[start:end]:
+        gap |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            sentence_id += gap
+            yield sentence_id
+            gap, shift = 0, 0
+
+
+def _intersect(lists: list[Iterator[int]]) -> Iterator[int]:
+    """Yield the ids that are in every one of the increasing iterators
+    <lists>, in increasing order.
+    """
+    try:
+        current = [next(ids) for ids in lists]
+        while True:
+            highest = max(current)
+            for i, ids in enumerate(lists):
+                while current[i] < highest:
+                    current[i] = next(ids)
+            if current.count(highest) == len(current):
+                yield highest
+                current = [next(ids) for ids in lists]
+    except StopIteration:
+        return
+
+
+def _contains_phrase(tokens: list[str], whole: list[str], last: str) -> bool:
+    """Return whether <tokens> contains the words <whole> followed by a word
+    that starts with <last>, as consecutive words.
+    """
+    n = len(whole)
+    return any(tokens[i:i + n] == whole and tokens[i + n].startswith(last)
+               for i in range(len(tokens) - n))